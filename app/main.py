@@ -1,176 +1,327 @@
+import asyncio
+import contextlib
 import requests
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from typing import Optional, Dict, List, Any
-from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from fastapi.responses import JSONResponse, Response
 from app.services.gemini_service import generate_product_text
 from app.services.elevenlabs_service import generate_voice_from_text
-from app.models.request_models import ProductTextRequest, SyncedNarrationRequest, AudioProcessRequest
+from app.models.request_models import (
+    ApprovedScriptRequest,
+    AudioProcessRequest,
+    NarrationRegenerationRequest,
+    ProductTextRequest,
+    SessionDelta,
+    SyncedNarrationRequest,
+)
 from app.models.dom_event_models import RecordingSession, ProcessRecordingResponse
-from app.services.dom_event_service import process_dom_events, extract_text_from_events, group_events_by_step
-from app.services.synced_narration_service import generate_synced_narration, generate_step_by_step_narration
+from app.services.dom_event_service import build_process_recording_payload, columnar_instructions
+from app.services.event_coalescing_service import coalesce_session
+from app.services.response_encoding_service import encode_response
+from app.services.retrieval_service import add_approved_script
+from app.services.synced_narration_service import (
+    generate_concurrent_step_narration,
+    generate_step_by_step_narration,
+    generate_synced_narration,
+)
+from app.services.audio_pipeline_service import process_audio_request
+from app.services.audio_serving_service import audio_response, resolve_audio_path
+from app.services.batch_service import BatchStreamingResponse, stream_batch_results
+from app.services.memory_service import (
+    MemoryAdmissionMiddleware,
+    MemoryBudgetError,
+    memory_stats,
+    reserved_bytes,
+    session_ref_reservation,
+)
+from app.services.node_forwarder import NODE_FORWARD_ENABLED, outbox_stats, run_outbox_dispatcher
+from app.services.profiling_service import profile_call, profiling_requested, start_periodic_profiler
+from app.services.prompt_cache_service import prompt_cache_stats
+from app.services.regeneration_service import regenerate_narration, remember_narration
+from app.services.session_store import SessionNotFoundError, append_events, load_session, session_summary, store_session
+from app.services.storage_service import list_session_artifacts
+from app.services.upload_service import read_recording_multipart
+from app.services.warmup_service import readiness, run_warmup
 import os
-import time
-from pathlib import Path
 
 NODE_SERVER_URL = os.getenv("NODE_SERVER_URL")  
 
-app = FastAPI(title="ProductAI Backend", version="2.0.0")
 
-
-@app.post("/audio-full-process")
-async def full_process(payload: AudioProcessRequest):
-
-    try:
-        print(f"[Python] ===== FULL PROCESSING PIPELINE STARTED =====")
-        print(f"[Python] Raw text length: {len(payload.text)}")
-
-        has_new_format = payload.deepgramData is not None
-        has_old_format = payload.deepgramResponse is not None
-        print(f"[Python] Format detected: {'NEW (deepgramData)' if has_new_format else 'OLD (deepgramResponse)' if has_old_format else 'UNKNOWN'}")
-
-        words = payload.words
-        print(f"[Python] Deepgram words: {len(words)} words")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_periodic_profiler()
+    warmup = asyncio.create_task(run_warmup(app))
+    dispatcher = asyncio.create_task(run_outbox_dispatcher()) if NODE_FORWARD_ENABLED else None
+    yield
+    for task in (warmup, dispatcher):
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
 
 
-        # ----------------------------------------------------------------------
-        # 👇 RAG FIX — Safe legacy wrapper for raw domEvents
-        # ----------------------------------------------------------------------
-        session = payload.get_session_or_create()
+app = FastAPI(title="ProductAI Backend", version="2.0.0", lifespan=lifespan)
+app.add_middleware(MemoryAdmissionMiddleware)
 
-        if session:
-            print(f"[Python] DOM events: {len(session.events)} events")
 
-        elif payload.domEvents:
-            print(f"[Python] DOM events (raw): {len(payload.domEvents)} events (no RecordingSession)")
+def _memory_budget_error(e: MemoryBudgetError) -> HTTPException:
+    headers = {"Retry-After": "5"} if e.status_code == 503 else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
 
-            try:
-                session_id = payload.metadata.get("sessionId", "legacy_session")
-
-                session = RecordingSession(
-                    sessionId=session_id,
-                    events=payload.domEvents,
-                    startTime=payload.metadata.get("startTime") or 0,
-                    endTime=payload.metadata.get("endTime") or 0,
-                    url=payload.metadata.get("url") or "unknown",
-                    viewport=payload.metadata.get("viewport") or {"width": 0, "height": 0}
-                )
-
-                print(f"[Python] ✅ Wrapped raw domEvents into RecordingSession "
-                      f"(sessionId={session.sessionId}, events={len(session.events)})")
-
-            except Exception as wrap_error:
-                print(f"[Python] ❌ Failed to wrap raw domEvents:", wrap_error)
-                session = None
-
-        else:
-            print(f"[Python] No DOM events available")
 
-        # ----------------------------------------------------------------------
+@app.post("/audio-full-process")
+async def full_process(payload: AudioProcessRequest, request: Request):
 
+    try:
+        profile = profiling_requested(request.headers, request.query_params)
+        async with session_ref_reservation(payload.sessionRef, reserved_bytes(request.scope)):
+            response_data = await asyncio.to_thread(process_audio_request, payload, profile)
+        return JSONResponse(response_data)
 
-        print(f"[Python] Recordings path: {payload.recordingsPath}")
+    except MemoryBudgetError as e:
+        raise _memory_budget_error(e)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown sessionRef: {payload.sessionRef}")
+    except Exception as e:
+        error_msg = f"Processing failed: {str(e)}"
+        print(f"[Python] ❌ ERROR: {error_msg}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=error_msg)
 
-        print(f"[Python] Step 1: Generating production-ready script...")
-        from app.services.script_generation_service import generate_product_script
 
-        script_result = generate_product_script(
-            raw_text=payload.text,
-            word_timings=words,
-            session=session
+@app.post("/batch/audio-full-process")
+async def batch_full_process(request: Request):
+    """
+    Process an NDJSON stream of AudioProcessRequest payloads.
+
+    Streams back one NDJSON line per item as it completes:
+    {"index": <input line>, "success": true, "result": {...}}
+    {"index": <input line>, "success": false, "error": "..."}
+    {"index": null, "success": false, "error": "..."} if the body could not be read
+    """
+    body_read = asyncio.Event()
+    return BatchStreamingResponse(
+        stream_batch_results(request.stream(), body_read),
+        body_read=body_read,
+        media_type="application/x-ndjson"
+    )
+
+
+@app.post("/synced-narration")
+async def synced_narration(payload: SyncedNarrationRequest):
+    """
+    Narration synced with the recording's DOM events.
+
+    narration_type:
+    - "continuous": one paragraph for the whole recording
+    - "step_by_step": one prompt, "Step N:" lines parsed back out
+    - "concurrent_steps": one concurrent request per step, structured per
+      step with start/end times
+    """
+    if payload.narration_type == "concurrent_steps":
+        result = await asyncio.to_thread(
+            generate_concurrent_step_narration, payload.raw_text, payload.session, payload.words
         )
+        await asyncio.to_thread(remember_narration, payload.raw_text, payload.session, payload.words, result["steps"])
+    elif payload.narration_type == "step_by_step":
+        result = await asyncio.to_thread(generate_step_by_step_narration, payload.raw_text, payload.session)
+    elif payload.narration_type in (None, "continuous"):
+        result = await asyncio.to_thread(generate_synced_narration, payload.raw_text, payload.session)
+    else:
+        raise HTTPException(status_code=422, detail=f"Unknown narration_type: {payload.narration_type}")
+
+    return JSONResponse(result)
+
+
+@app.post("/synced-narration/regenerate")
+async def regenerate_synced_narration(payload: NarrationRegenerationRequest, request: Request):
+    """
+    Re-narrate a recording after a transcript edit and/or a trim.
+
+    Takes the `steps` of the previous concurrent_steps (or regeneration)
+    result; only steps whose actions or transcript changed go to Gemini, and
+    with `recordingsPath` only changed sentences go to TTS.
+    """
+    try:
+        async with session_ref_reservation(payload.sessionRef, reserved_bytes(request.scope)):
+            result = await asyncio.to_thread(regenerate_narration, payload)
+    except MemoryBudgetError as e:
+        raise _memory_budget_error(e)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown sessionRef: {payload.sessionRef}")
+    except Exception as e:
+        print(f"[Regeneration] ❌ ERROR: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Regeneration failed: {str(e)}")
+    return JSONResponse(result)
 
-        if not script_result.get("success"):
-            error_msg = script_result.get('error', 'Unknown error')
-            print(f"[Python] ❌ Script generation failed: {error_msg}")
-            raise Exception(f"Script generation failed: {error_msg}")
 
-        production_script = script_result["script"]
-        print(f"\n[Python] ✅ STEP 1 COMPLETE - Script Generated")
-        print(f"[Python]   - Script length: {len(production_script)} characters")
-        print(f"[Python]   - Script preview: {production_script[:150]}...")
-        print(f"[Python]   - Timing analysis: {script_result.get('timing_analysis', {})}")
+async def _stored_session(session_ref: str, raw_delta: bytes) -> RecordingSession:
+    """A stored session with the optional JSON SessionDelta body merged in."""
+    try:
+        session = (await asyncio.to_thread(load_session, session_ref))["session"]
+    except SessionNotFoundError:
+        session = None
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown sessionRef: {session_ref}")
+    if raw_delta.strip():
+        session = append_events(session, SessionDelta.model_validate_json(raw_delta).events)
+    return session
+
+
+async def _read_recording_request(request: Request):
+    """
+    Parse /process-recording input: either a JSON RecordingSession body, or
+    multipart with the session as a JSON `session` field plus optional
+    `video`/`audio` files, spooled to disk while the body streams in (see
+    upload_service). JSON is validated straight from bytes.
+
+    With `?sessionRef=<sessionId>`, the session comes from the session store
+    and the body (or `session` field) is an optional SessionDelta.
+
+    Returns:
+        (session, video MediaFileRef, audio MediaFileRef, whether the session
+        differs from the stored one)
+    """
+    content_type = request.headers.get("content-type", "")
+    session_ref = request.query_params.get("sessionRef")
+
+    if content_type.startswith("multipart/form-data"):
+        raw_session, uploads = await read_recording_multipart(request)
+        video = uploads.get("video")
+        audio = uploads.get("audio")
+        if session_ref:
+            raw_delta = raw_session or b""
+            session = await _stored_session(session_ref, raw_delta)
+            return session, video, audio, bool(raw_delta.strip()) or video is not None or audio is not None
+        if raw_session is None:
+            raise HTTPException(status_code=422, detail="Missing 'session' form field")
+        return RecordingSession.model_validate_json(raw_session), video, audio, True
+
+    body = await request.body()
+    if session_ref:
+        return await _stored_session(session_ref, body), None, None, bool(body.strip())
+    return RecordingSession.model_validate_json(body), None, None, True
 
 
-        print(f"\n[Python] ===== STEP 2: AUDIO GENERATION =====")
-        print(f"[Python] Converting script to audio using ElevenLabs...")
-        print(f"[Python]   - Text length: {len(production_script)} characters")
+@app.post("/process-recording", response_model=ProcessRecordingResponse)
+async def process_recording(request: Request):
+    try:
+        # With ?sessionRef=, the stored session's memory is held for the whole request
+        async with session_ref_reservation(request.query_params.get("sessionRef"), reserved_bytes(request.scope)):
+            return await _process_recording(request)
+    except MemoryBudgetError as e:
+        raise _memory_budget_error(e)
 
-        try:
-            audio_bytes = generate_voice_from_text(production_script)
-            print(f"[Python] ✅ Audio generated successfully")
-            print(f"[Python]   - Audio size: {len(audio_bytes)} bytes ({len(audio_bytes) / 1024:.2f} KB)")
-        except Exception as e:
-            print(f"[Python] ❌ Audio generation failed: {str(e)}")
-            raise
 
+async def _process_recording(request: Request):
+    try:
+        session, video, audio, changed = await _read_recording_request(request)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
 
-        print(f"\n[Python] ===== STEP 3: SAVING AUDIO FILE =====")
-        timestamp = int(time.time() * 1000)
-        session_id = payload.metadata.get("sessionId", "unknown")
-        filename = f"processed_audio_{session_id}_{timestamp}.mp3"
+    try:
+        # Uploads are already spooled to disk (chunked, hashed): pass references downstream
+        if video:
+            session.videoPath = video.path
+        if audio:
+            session.audioPath = audio.path
+        if changed:
+            # Later calls can send ?sessionRef=<sessionId> instead of the session
+            await asyncio.to_thread(store_session, session.sessionId, session)
+
+        # Opt-in: frontend replay normally wants every raw event
+        coalescing_stats = None
+        if request.query_params.get("coalesce", "").lower() in ("1", "true"):
+            session, coalescing_stats = coalesce_session(session)
+
+        # Bulk conversion to plain dicts, serialized once; returning a Response
+        # skips FastAPI's re-validation against response_model
+        if profiling_requested(request.headers, request.query_params):
+            payload, profile_path = await asyncio.to_thread(
+                profile_call, f"/process-recording {session.sessionId}", build_process_recording_payload, session
+            )
+            payload["metadata"]["profile"] = profile_path
+        else:
+            payload = await asyncio.to_thread(build_process_recording_payload, session)
+        payload["metadata"]["eventCoalescing"] = coalescing_stats
+        payload["metadata"]["hasVideo"] = video is not None
+        payload["metadata"]["hasAudio"] = audio is not None
+        payload["metadata"]["video"] = video.model_dump() if video else None
+        payload["metadata"]["audio"] = audio.model_dump() if audio else None
+
+        if request.query_params.get("layout") == "columnar":
+            payload["instructions"] = columnar_instructions(payload["instructions"])
+
+        # Negotiated format/compression; large bodies are serialized as they stream
+        return await asyncio.to_thread(
+            encode_response, payload,
+            request.headers.get("accept", ""), request.headers.get("accept-encoding", "")
+        )
 
-        print(f"[Python]   - Session ID: {session_id}")
-        print(f"[Python]   - Filename: {filename}")
-        print(f"[Python]   - Recordings path: {payload.recordingsPath}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process recording: {str(e)}")
 
-        recordings_path = Path(payload.recordingsPath)
-        recordings_path.mkdir(parents=True, exist_ok=True)
-        print(f"[Python]   - Directory created/verified: {recordings_path}")
 
-        file_path = recordings_path / filename
+@app.api_route("/audio/{session_id}/{filename}", methods=["GET", "HEAD"])
+async def serve_audio(session_id: str, filename: str, request: Request):
+    """
+    A generated audio file of the session, with Range, ETag/If-None-Match
+    and HEAD support (see audio_serving_service).
+    """
+    path = await asyncio.to_thread(resolve_audio_path, session_id, filename)
+    response = await asyncio.to_thread(audio_response, path, request.headers) if path else None
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"No audio {filename} for session {session_id}")
+    return response
 
-        with open(file_path, "wb") as f:
-            f.write(audio_bytes)
 
-        print(f"[Python] ✅ Audio file saved successfully")
-        print(f"[Python]   - Full path: {file_path}")
-        print(f"[Python]   - File size: {len(audio_bytes)} bytes")
+@app.get("/sessions/{session_id}")
+async def stored_session(session_id: str):
+    """What the session store holds for a session (sizes, event count, time range)."""
+    summary = await asyncio.to_thread(session_summary, session_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+    return {"session_id": session_id, **summary}
 
 
-        print(f"\n[Python] ===== STEP 4: PREPARING RESPONSE =====")
+@app.get("/sessions/{session_id}/artifacts")
+async def session_artifacts(session_id: str):
+    artifacts = await asyncio.to_thread(list_session_artifacts, session_id)
+    return {"session_id": session_id, "artifacts": artifacts}
 
-        response_data = {
-            "success": True,
-            "script": production_script,
-            "raw_text": payload.text,
-            "processed_audio_filename": filename,
-            "audio_size_bytes": len(audio_bytes),
-            "timing_analysis": script_result.get("timing_analysis", {}),
-            "dom_context_used": script_result.get("dom_context_used", False),
-            "session_id": session_id,
-        }
 
-        print(f"[Python]   - DOM context used: {response_data['dom_context_used']}")
-        print(f"\n[Python] ===== ✅ ALL PROCESSING COMPLETE ✅ =====")
+@app.post("/retrieval/approved-scripts")
+async def approve_script(payload: ApprovedScriptRequest):
+    """Index an approved script so future prompts for the same product can reuse it."""
+    added = await asyncio.to_thread(add_approved_script, payload.url, payload.script)
+    return {"success": True, "documents_added": added}
 
-        return JSONResponse(response_data)
 
-    except Exception as e:
-        error_msg = f"Processing failed: {str(e)}"
-        print(f"[Python] ❌ ERROR: {error_msg}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=error_msg)
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until this worker has finished warming up."""
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
+@app.get("/memory")
+async def worker_memory():
+    """This worker's memory budget: reserved bytes, queue and admission counters."""
+    return memory_stats()
 
-@app.post("/process-recording", response_model=ProcessRecordingResponse)
-async def process_recording(
-    session: RecordingSession,
-    video: Optional[UploadFile] = File(None),
-    audio: Optional[UploadFile] = File(None)
-):
-    try:
-        response = process_dom_events(session)
-        extracted_text = extract_text_from_events(session.events)
-        grouped_steps = group_events_by_step(session.events)
 
-        response.metadata["extractedText"] = extracted_text
-        response.metadata["groupedSteps"] = grouped_steps
-        response.metadata["hasVideo"] = video is not None
-        response.metadata["hasAudio"] = audio is not None
+@app.get("/node-outbox")
+async def node_outbox():
+    """Deliveries to Node by status (shared by all workers)."""
+    return await asyncio.to_thread(outbox_stats)
 
-        return response
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process recording: {str(e)}")
+@app.get("/prompt-cache")
+async def prompt_cache():
+    """This worker's Gemini context caching: cached prefixes, calls and prompt tokens."""
+    return prompt_cache_stats()
@@ -50,6 +50,7 @@ class InteractionEvent(BaseModel):
     target: Optional[EventTarget] = None  # None for scroll/step_change events
     value: Optional[str] = None  # For input events: current field value
     metadata: EventMetadata
+    endTimestamp: Optional[int] = None  # Set when several events were coalesced into this one
 
 
 class RecordingSession(BaseModel):
@@ -65,6 +66,16 @@ class RecordingSession(BaseModel):
     processedAt: Optional[datetime] = None
 
 
+class MediaFileRef(BaseModel):
+    """Reference to an uploaded media file spooled to disk"""
+    path: str
+    filename: Optional[str] = None
+    contentType: Optional[str] = None
+    sizeBytes: int
+    sha256: str
+    deduplicated: bool = False  # True if an identical file was already stored
+
+
 class FrontendInstruction(BaseModel):
     """Instruction for frontend to apply visual effects"""
     timestamp: int  # Milliseconds since recording start
@@ -74,6 +85,7 @@ class FrontendInstruction(BaseModel):
     bbox: Optional[BoundingBox] = None  # For visual highlighting
     selector: Optional[str] = None  # CSS selector for element targeting
     confidence: float = Field(default=1.0, ge=0.0, le=1.0)  # Confidence score
+    endTimestamp: Optional[int] = None  # End of a coalesced scroll span / typing run
 
 
 class ProcessRecordingResponse(BaseModel):
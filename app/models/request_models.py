@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-from app.models.dom_event_models import RecordingSession
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Dict, Any, Literal
+from app.models.dom_event_models import InteractionEvent, RecordingSession
 
 
 class ProductTextRequest(BaseModel):
@@ -11,7 +11,57 @@ class SyncedNarrationRequest(BaseModel):
     """Request model for generating synced narration with DOM events context"""
     raw_text: str
     session: RecordingSession
-    narration_type: Optional[str] = "continuous"  # "continuous" or "step_by_step"
+    narration_type: Optional[str] = "continuous"  # "continuous", "step_by_step" or "concurrent_steps"
+    words: Optional[List[Dict[str, Any]]] = None  # Deepgram word timings, to split the transcript by step
+
+
+class ApprovedScriptRequest(BaseModel):
+    """An approved narration script, indexed for retrieval on the same product URL"""
+    url: str
+    script: str
+
+
+class AudioTarget(BaseModel):
+    """One voice/format rendition of the script (Deepgram aura voice model)"""
+    voice: str = Field("aura-2-thalia-en", pattern=r"^[a-z0-9-]+$")  # Also part of the artifact filename
+    format: Literal["mp3", "wav"] = "mp3"
+    bit_rate: int = 32000      # mp3 only
+    sample_rate: int = 24000   # wav only
+
+
+class RecordingTrim(BaseModel):
+    """A cut from the recording, in milliseconds from its start"""
+    start_ms: int
+    end_ms: int
+
+
+class NarrationRegenerationRequest(BaseModel):
+    """
+    An edit to an already narrated recording: the edited transcript (and
+    word timings) and/or a trim, with the previous per-step result to reuse.
+
+    With sessionRef, whatever is left out (session, raw_text, words,
+    previous_steps) comes from the session store.
+    """
+    raw_text: str = ""
+    session: Optional[RecordingSession] = None          # As narrated before (untrimmed)
+    words: Optional[List[Dict[str, Any]]] = None        # Deepgram word timings (raw_text edits are aligned onto them)
+    previous_steps: List[Dict[str, Any]] = []           # "steps" of the earlier concurrent_steps/regeneration result
+    trim: Optional[RecordingTrim] = None
+    recordingsPath: Optional[str] = None                # Also re-render the narration audio into this path
+    targets: List[AudioTarget] = []                     # Voices/formats to render (default: one mp3)
+    sessionRef: Optional[str] = None                    # sessionId of a stored session
+
+    @model_validator(mode="after")
+    def _session_or_ref(self):
+        if self.sessionRef is None and (self.session is None or "raw_text" not in self.model_fields_set):
+            raise ValueError("raw_text and session are required unless sessionRef is given")
+        return self
+
+
+class SessionDelta(BaseModel):
+    """Changes to a stored session: events recorded since it was stored"""
+    events: List[InteractionEvent] = []
 
 
 class AudioProcessRequest(BaseModel):
@@ -28,7 +78,7 @@ class AudioProcessRequest(BaseModel):
     - deepgramData (with words, sentences, paragraphs)
     - session (RecordingSession object)
     """
-    text: str  # Raw transcript from Deepgram
+    text: str = ""  # Raw transcript from Deepgram (required unless sessionRef is given)
     
     # Accept BOTH field names for backward compatibility
     deepgramResponse: Optional[Dict[str, Any]] = None  # From Node.js (old format)
@@ -38,8 +88,20 @@ class AudioProcessRequest(BaseModel):
     domEvents: List[Dict[str, Any]] = []               # From Node.js (old format)
     session: Optional[RecordingSession] = None         # New format
     
-    recordingsPath: str  # Path where Node.js stores recordings
+    recordingsPath: str = ""  # Path where Node.js stores recordings (required unless sessionRef is given)
     metadata: Dict[str, Any] = {}  # Additional metadata (sessionId, etc.)
+    targets: List[AudioTarget] = []  # Several voices/formats from one script (see voice_fanout_service)
+
+    # Reference a stored session instead of resending it (see session_store);
+    # fields sent along override the stored ones
+    sessionRef: Optional[str] = None
+    eventsDelta: List[InteractionEvent] = []  # Events recorded since, merged into the stored session
+
+    @model_validator(mode="after")
+    def _payload_or_ref(self):
+        if self.sessionRef is None and not {"text", "recordingsPath"} <= self.model_fields_set:
+            raise ValueError("text and recordingsPath are required unless sessionRef is given")
+        return self
     
     @property
     def words(self) -> List[Dict[str, Any]]:
@@ -0,0 +1,47 @@
+"""
+Multi-process entry point for the ProductAI backend.
+
+Runs uvicorn with a pre-forked pool of worker processes. Every worker loads
+its own Gemini/TTS clients; script, audio and session caches are shared
+between workers through the on-disk SQLite store in shared_cache.
+
+Usage:
+    python -m app.serve
+    WEB_CONCURRENCY=8 PORT=8000 python -m app.serve
+"""
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+from app.services.shared_cache import SHARED_CACHE_PATH, get_connection
+
+load_dotenv()
+
+
+def default_worker_count() -> int:
+    """
+    One worker per core: the CPU-bound stages (timing analysis, RAG context,
+    event conversion) scale with cores, and provider waits are already
+    overlapped inside each worker's event loop.
+    """
+    return max(1, os.cpu_count() or 1)
+
+
+def main() -> None:
+    workers = int(os.getenv("WEB_CONCURRENCY") or default_worker_count())
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+
+    # Create the shared cache (and switch it to WAL) once before forking,
+    # so workers never race on schema creation.
+    get_connection()
+
+    print(f"[Serve] Starting {workers} worker(s) on {host}:{port}")
+    print(f"[Serve] Shared cache: {SHARED_CACHE_PATH}")
+
+    uvicorn.run("app.main:app", host=host, port=port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
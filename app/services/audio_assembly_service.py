@@ -0,0 +1,258 @@
+"""
+Timing-aligned audio assembly.
+
+Instead of one continuous TTS clip that drifts away from the video, each
+script sentence is synthesized separately and placed on a silent track at
+the offset where the presenter originally spoke:
+
+1. Sentences are distributed over the speaking segments from
+   analyze_word_timings (proportionally to their length)
+2. Each sentence start may snap to a nearby DOM action (click, type, step)
+3. Clips that don't fit before the next one are sped up within bounds,
+   otherwise the following clips are pushed back
+4. The track is exactly as long as the recording
+
+All clips are precomputed PCM buffers streamed into the output file in a
+single linear pass, with the silence between them written in fixed-size
+chunks: memory holds the clips, never a track as long as the recording.
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from pydub.utils import audioop
+
+from app.models.dom_event_models import RecordingSession
+from app.services.audio_postprocess_service import (
+    SAMPLE_RATE,
+    SAMPLE_WIDTH,
+    frame_size_bytes,
+    trim_silence,
+)
+from app.services.elevenlabs_service import chunk_by_sentence, synthesize_pcm
+
+MAX_SPEEDUP = float(os.getenv("ALIGNMENT_MAX_SPEEDUP", "1.15"))
+EVENT_SNAP_SECONDS = float(os.getenv("ALIGNMENT_EVENT_SNAP_SECONDS", "1.0"))
+TTS_PARALLELISM = int(os.getenv("ALIGNMENT_TTS_PARALLELISM", "4"))
+
+_SILENCE = bytes(64 * 1024)
+
+
+def plan_sentence_slots(
+    sentences: List[str],
+    speaking_segments: List[Dict[str, Any]],
+    total_duration: float,
+    session: Optional[RecordingSession] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Compute a target start offset (seconds) for every sentence.
+
+    Sentences are mapped onto speaking segments by cumulative text length vs
+    cumulative segment word count, then laid out back to back inside their
+    segment. Without segments they are spread evenly over the recording.
+    """
+    if not sentences:
+        return []
+
+    total_chars = sum(len(s) for s in sentences) or 1
+    slots = []
+
+    if speaking_segments:
+        total_words = sum(seg.get("word_count", 0) for seg in speaking_segments) or len(speaking_segments)
+        boundaries = []
+        cumulative = 0
+        for seg in speaking_segments:
+            cumulative += seg.get("word_count", 0) or (total_words / len(speaking_segments))
+            boundaries.append(cumulative / total_words)
+
+        segment_index = 0
+        chars_before = 0
+        for sentence in sentences:
+            position = chars_before / total_chars
+            while segment_index < len(speaking_segments) - 1 and position >= boundaries[segment_index]:
+                segment_index += 1
+            chars_before += len(sentence)
+
+            segment = speaking_segments[segment_index]
+            segment_start = boundaries[segment_index - 1] if segment_index else 0.0
+            segment_span = boundaries[segment_index] - segment_start
+            within = (position - segment_start) / segment_span if segment_span > 0 else 0.0
+            within = min(max(within, 0.0), 1.0)
+            target = segment["start"] + within * (segment["end"] - segment["start"])
+            slots.append({"sentence": sentence, "target_start": target, "segment": segment_index})
+    else:
+        chars_before = 0
+        for sentence in sentences:
+            slots.append({
+                "sentence": sentence,
+                "target_start": total_duration * chars_before / total_chars,
+                "segment": None,
+            })
+            chars_before += len(sentence)
+
+    if session and session.events:
+        _snap_to_events(slots, session)
+
+    return slots
+
+
+def _snap_to_events(slots: List[Dict[str, Any]], session: RecordingSession) -> None:
+    """Move each sentence start onto the closest significant DOM action in range."""
+    anchors = sorted(
+        event.timestamp / 1000.0
+        for event in session.events
+        if event.type in ("click", "type", "step_change")
+    )
+    if not anchors:
+        return
+
+    anchor_index = 0
+    for slot in slots:
+        target = slot["target_start"]
+        while anchor_index < len(anchors) - 1 and anchors[anchor_index + 1] <= target:
+            anchor_index += 1
+        candidates = anchors[anchor_index:anchor_index + 2]
+        closest = min(candidates, key=lambda anchor: abs(anchor - target))
+        if abs(closest - target) <= EVENT_SNAP_SECONDS:
+            slot["target_start"] = closest
+            slot["snapped_to_event"] = True
+
+
+def _trim_clip(pcm: bytes) -> bytes:
+    """Strip the silence TTS adds around each sentence so placement is exact."""
+    frame_bytes = frame_size_bytes()
+    frames = (pcm[i:i + frame_bytes] for i in range(0, len(pcm), frame_bytes))
+    return b"".join(trim_silence(frames, padding_frames=1))
+
+
+def _speed_up(pcm: bytes, factor: float) -> bytes:
+    """Shorten a clip by `factor` (>1) by resampling. Slight pitch shift."""
+    target_rate = int(SAMPLE_RATE / factor)
+    converted, _ = audioop.ratecv(pcm, SAMPLE_WIDTH, 1, SAMPLE_RATE, target_rate, None)
+    return converted
+
+
+def _write_silence(out: BinaryIO, length: int) -> None:
+    while length > 0:
+        chunk = min(length, len(_SILENCE))
+        out.write(_SILENCE[:chunk])
+        length -= chunk
+
+
+def assemble_track(
+    slots: List[Dict[str, Any]],
+    clips: List[bytes],
+    total_duration: float,
+    out: BinaryIO,
+) -> Dict[str, Any]:
+    """
+    Write a silent track of exactly `total_duration` seconds to `out` (raw
+    PCM), with clips placed at their target offsets.
+
+    Returns:
+        Dictionary with where each clip ended up and the track duration
+    """
+    bytes_per_second = SAMPLE_RATE * SAMPLE_WIDTH
+    total_bytes = int(total_duration * SAMPLE_RATE) * SAMPLE_WIDTH
+
+    placements = []
+    cursor = 0
+
+    for i, (slot, clip) in enumerate(zip(slots, clips)):
+        start = min(max(int(slot["target_start"] * SAMPLE_RATE) * SAMPLE_WIDTH, cursor), total_bytes)
+        next_target = (
+            int(slots[i + 1]["target_start"] * SAMPLE_RATE) * SAMPLE_WIDTH
+            if i + 1 < len(slots) else total_bytes
+        )
+        available = max(next_target - start, 0)
+
+        speedup = 1.0
+        if clip and len(clip) > available:
+            # Already behind schedule when available is 0: catch up at max speed
+            speedup = min(len(clip) / available, MAX_SPEEDUP) if available else MAX_SPEEDUP
+            clip = _speed_up(clip, speedup)
+
+        end = min(start + len(clip), total_bytes)
+        # Clips never overlap (start >= cursor), so the file is written front to back
+        _write_silence(out, start - cursor)
+        if end > start:
+            out.write(clip[: end - start])
+
+        placements.append({
+            "sentence": slot["sentence"],
+            "target_start": slot["target_start"],
+            "start": start / bytes_per_second,
+            "end": end / bytes_per_second,
+            "speedup": round(speedup, 3),
+            "truncated": start + len(clip) > total_bytes,
+            "snapped_to_event": slot.get("snapped_to_event", False),
+        })
+        cursor = end
+
+    _write_silence(out, total_bytes - cursor)
+    return {"placements": placements, "duration_seconds": total_duration}
+
+
+def placement_summary(placements: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Counts of sentences that could not be placed as planned."""
+    return {
+        "sentences": len(placements),
+        "pushed_back": sum(1 for p in placements if p["start"] - p["target_start"] > 0.05),
+        "sped_up": sum(1 for p in placements if p["speedup"] > 1),
+        "truncated": sum(1 for p in placements if p["truncated"]),
+    }
+
+
+def recording_duration(
+    session: Optional[RecordingSession],
+    speaking_segments: List[Dict[str, Any]],
+) -> float:
+    """Duration the assembled track has to match, in seconds."""
+    if session and session.endTime > session.startTime:
+        return (session.endTime - session.startTime) / 1000.0
+    if speaking_segments:
+        return speaking_segments[-1]["end"]
+    return 0.0
+
+
+def synthesize_aligned_track(
+    script: str,
+    speaking_segments: List[Dict[str, Any]],
+    pcm_path: str,
+    session: Optional[RecordingSession] = None,
+) -> Dict[str, Any]:
+    """
+    Synthesize every sentence (in parallel) and assemble them into a raw PCM
+    track at `pcm_path`, aligned with the original recording.
+
+    Returns:
+        Dictionary with the placements, their summary and the track duration
+    """
+    sentences = chunk_by_sentence(script)
+    total_duration = recording_duration(session, speaking_segments)
+    print(f"[Alignment] Assembling {len(sentences)} sentences over {total_duration:.1f}s "
+          f"({len(speaking_segments)} speaking segments)")
+
+    # Each TTS call runs in a copy of this context (capture/replay recorder)
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=TTS_PARALLELISM) as pool:
+        pcms = pool.map(
+            lambda sentence: context.copy().run(synthesize_pcm, sentence, sample_rate=SAMPLE_RATE),
+            sentences,
+        )
+        clips = [_trim_clip(pcm) for pcm in pcms]
+
+    if total_duration <= 0:
+        # Nothing to align against - play the sentences back to back
+        total_duration = sum(len(c) for c in clips) / (SAMPLE_RATE * SAMPLE_WIDTH)
+
+    slots = plan_sentence_slots(sentences, speaking_segments, total_duration, session)
+    with open(pcm_path, "wb") as out:
+        result = assemble_track(slots, clips, total_duration, out)
+    del clips
+
+    result["summary"] = summary = placement_summary(result["placements"])
+    print(f"[Alignment] ✅ Track assembled: {summary['pushed_back']} sentence(s) pushed back, "
+          f"{summary['sped_up']} sped up, {summary['truncated']} truncated")
+    return result
@@ -0,0 +1,560 @@
+"""
+Audio pipeline service - the stages behind /audio-full-process.
+
+The pipeline is split into stages so callers can wrap each one with their
+own scheduling (the single-request endpoint runs them back to back, the
+batch endpoint runs them under per-provider concurrency caps):
+
+1. Resolve the RecordingSession (new format, legacy raw domEvents or a
+   `sessionRef` to the session store)
+2. Generate the production script (Gemini)
+3. Convert the script to audio (TTS, optionally time-aligned and post-processed),
+   or with `targets`, render it once per voice/format target
+4. Save the audio file(s) and build the response
+"""
+import contextvars
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from app.models.dom_event_models import RecordingSession
+from app.models.request_models import AudioProcessRequest, AudioTarget
+from app.services.audio_assembly_service import synthesize_aligned_track
+from app.services.audio_postprocess_service import BACKGROUND_MUSIC_PATH, SAMPLE_RATE, postprocess_pcm_file
+from app.services.capture_service import capture_request
+from app.services.elevenlabs_service import generate_voice_from_text, synthesize_pcm_to_file
+from app.services.node_forwarder import NODE_FORWARD_ENABLED, enqueue_audio_delivery
+from app.services.profiling_service import profile_current_thread, save_request_profile
+from app.services.script_generation_service import build_draft_script, generate_product_script
+from app.services.session_store import append_events, load_session, store_session
+from app.services.storage_service import store_artifact_file, write_artifact
+from app.services.voice_fanout_service import save_renditions
+
+AUDIO_POSTPROCESS_ENABLED = os.getenv("AUDIO_POSTPROCESS_ENABLED", "0") == "1"
+AUDIO_ALIGNMENT_ENABLED = os.getenv("AUDIO_ALIGNMENT_ENABLED", "0") == "1"
+SPECULATIVE_DRAFT_ENABLED = os.getenv("SPECULATIVE_DRAFT_ENABLED", "0") == "1"
+SCRIPT_DEADLINE_SECONDS = float(os.getenv("SCRIPT_DEADLINE_SECONDS", "8"))
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "32"))
+
+# Shared pool: abandoned LLM calls finish here without holding up the request
+_speculation_pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculation")
+# Running estimate of TTS time, updated by draft and LLM audio stages alike
+_tts_seconds_estimate = 2.0
+_tts_estimate_lock = threading.Lock()
+
+
+class AudioFile(NamedTuple):
+    """
+    Finished audio left on disk by the audio stage (post-processed or
+    aligned WAV). save_audio_file moves it into the recordings path, so a
+    long WAV is never read into memory.
+    """
+    path: str
+    size_bytes: int
+
+
+# MP3 bytes from plain TTS, or a WAV file from post-processing/alignment
+Audio = Union[bytes, AudioFile]
+
+
+def audio_size(audio: Audio) -> int:
+    return audio.size_bytes if isinstance(audio, AudioFile) else len(audio)
+
+
+def discard_audio(audio: Optional[Audio]) -> None:
+    """Remove the file of audio that will not be saved (e.g. an unused draft)."""
+    if isinstance(audio, AudioFile):
+        try:
+            os.remove(audio.path)
+        except FileNotFoundError:
+            pass
+
+
+def _audio_sha256(audio: Audio) -> str:
+    if not isinstance(audio, AudioFile):
+        return hashlib.sha256(audio).hexdigest()
+    digest = hashlib.sha256()
+    with open(audio.path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _new_wav_file(prefix: str) -> str:
+    """Temp path for a finished WAV, kept until save_audio_file moves it."""
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=".wav")
+    os.close(fd)
+    return path
+
+
+def hydrate_request(payload: AudioProcessRequest) -> None:
+    """
+    Fill a `sessionRef` request from the session store: whatever the request
+    left out comes from the stored session, and `eventsDelta` is merged into
+    its events. Raises SessionNotFoundError.
+    """
+    stored = load_session(payload.sessionRef)
+    sent = payload.model_fields_set
+
+    if "text" not in sent:
+        payload.text = stored["transcript"] or ""
+    if "recordingsPath" not in sent:
+        payload.recordingsPath = stored["recordings_path"] or ""
+    if payload.deepgramData is None and payload.deepgramResponse is None:
+        payload.deepgramData = stored["deepgram"]
+    if payload.session is None and not payload.domEvents:
+        payload.session = stored["session"]
+    if payload.session is not None and payload.eventsDelta:
+        payload.session = append_events(payload.session, payload.eventsDelta)
+    payload.metadata.setdefault("sessionId", payload.sessionRef)
+
+    if not payload.recordingsPath:
+        raise ValueError(f"No recordingsPath sent or stored for session {payload.sessionRef}")
+    print(f"[Python] Session {payload.sessionRef} loaded from the session store "
+          f"({len(payload.session.events) if payload.session else 0} events, "
+          f"{len(payload.eventsDelta)} new)")
+
+
+def remember_request(payload: AudioProcessRequest, session: Optional[RecordingSession]) -> None:
+    """
+    Store what the request carried in the session store, so later requests
+    can send `sessionRef` instead. Parts loaded from the store are not
+    written back.
+    """
+    session_id = payload.metadata.get("sessionId") or (session.sessionId if session else None)
+    if not session_id:
+        return
+
+    sent = payload.model_fields_set if payload.sessionRef else None
+    deepgram = None
+    if sent is None or sent & {"deepgramData", "deepgramResponse"}:
+        # Normalized to the new format; the raw Deepgram response is not kept
+        deepgram = {"words": payload.words, "sentences": payload.sentences, "paragraphs": payload.paragraphs}
+
+    store_session(
+        session_id,
+        session=session if sent is None or sent & {"session", "domEvents", "eventsDelta"} else None,
+        transcript=payload.text if sent is None or "text" in sent else None,
+        deepgram=deepgram,
+        recordings_path=payload.recordingsPath if sent is None or "recordingsPath" in sent else None,
+    )
+
+
+def resolve_session(payload: AudioProcessRequest) -> Optional[RecordingSession]:
+    """
+    Get the RecordingSession for a request, wrapping legacy raw domEvents
+    into a RecordingSession when no session object was sent.
+    """
+    session = payload.get_session_or_create()
+
+    if session:
+        print(f"[Python] DOM events: {len(session.events)} events")
+
+    elif payload.domEvents:
+        print(f"[Python] DOM events (raw): {len(payload.domEvents)} events (no RecordingSession)")
+
+        try:
+            session_id = payload.metadata.get("sessionId", "legacy_session")
+
+            session = RecordingSession(
+                sessionId=session_id,
+                events=payload.domEvents,
+                startTime=payload.metadata.get("startTime") or 0,
+                endTime=payload.metadata.get("endTime") or 0,
+                url=payload.metadata.get("url") or "unknown",
+                viewport=payload.metadata.get("viewport") or {"width": 0, "height": 0}
+            )
+
+            print(f"[Python] ✅ Wrapped raw domEvents into RecordingSession "
+                  f"(sessionId={session.sessionId}, events={len(session.events)})")
+
+        except Exception as wrap_error:
+            print(f"[Python] ❌ Failed to wrap raw domEvents:", wrap_error)
+            session = None
+
+    else:
+        print(f"[Python] No DOM events available")
+
+    return session
+
+
+def run_script_stage(
+    payload: AudioProcessRequest,
+    session: Optional[RecordingSession]
+) -> Dict[str, Any]:
+    """
+    Generate the production-ready script. Raises if generation failed.
+    """
+    print(f"[Python] Step 1: Generating production-ready script...")
+
+    script_result = generate_product_script(
+        raw_text=payload.text,
+        word_timings=payload.words,
+        session=session
+    )
+
+    if not script_result.get("success"):
+        error_msg = script_result.get('error', 'Unknown error')
+        print(f"[Python] ❌ Script generation failed: {error_msg}")
+        raise Exception(f"Script generation failed: {error_msg}")
+
+    production_script = script_result["script"]
+    print(f"\n[Python] ✅ STEP 1 COMPLETE - Script Generated")
+    print(f"[Python]   - Script length: {len(production_script)} characters")
+    print(f"[Python]   - Script preview: {production_script[:150]}...")
+    print(f"[Python]   - Timing analysis: {script_result.get('timing_analysis', {})}")
+
+    return script_result
+
+
+def release_transcript_inputs(payload: AudioProcessRequest) -> None:
+    """
+    Drop the raw Deepgram data and legacy DOM events from the request once
+    the script exists; only the audio stage and the response remain, and
+    they need neither.
+    """
+    payload.deepgramData = None
+    payload.deepgramResponse = None
+    payload.domEvents = []
+
+
+def run_audio_stage(
+    script_result: Dict[str, Any],
+    session: Optional[RecordingSession] = None
+) -> Audio:
+    """
+    Convert the production script to audio: MP3 bytes, or an AudioFile when
+    post-processing or alignment produced a WAV on disk.
+    """
+    production_script = script_result["script"]
+    print(f"\n[Python] ===== STEP 2: AUDIO GENERATION =====")
+    print(f"[Python] Converting script to audio using ElevenLabs...")
+    print(f"[Python]   - Text length: {len(production_script)} characters")
+
+    try:
+        if AUDIO_ALIGNMENT_ENABLED:
+            audio = _synthesize_aligned(script_result, session)
+        elif AUDIO_POSTPROCESS_ENABLED:
+            audio = _synthesize_postprocessed(production_script)
+        else:
+            audio = generate_voice_from_text(production_script)
+        size = audio_size(audio)
+        print(f"[Python] ✅ Audio generated successfully")
+        print(f"[Python]   - Audio size: {size} bytes ({size / 1024:.2f} KB)")
+    except Exception as e:
+        print(f"[Python] ❌ Audio generation failed: {str(e)}")
+        raise
+
+    return audio
+
+
+def _timed_audio_stage(
+    script_result: Dict[str, Any],
+    session: Optional[RecordingSession]
+) -> Audio:
+    """run_audio_stage, feeding the TTS duration estimate used for deadlines."""
+    global _tts_seconds_estimate
+    start = time.monotonic()
+    audio = run_audio_stage(script_result, session)
+    elapsed = time.monotonic() - start
+    with _tts_estimate_lock:
+        _tts_seconds_estimate = 0.8 * _tts_seconds_estimate + 0.2 * elapsed
+    return audio
+
+
+def _tts_estimate() -> float:
+    with _tts_estimate_lock:
+        return _tts_seconds_estimate
+
+
+def _submit_speculative(fn, *args) -> Future:
+    # Run in a copy of this context, so capture/replay still applies
+    return _speculation_pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def run_speculative_stages(
+    payload: AudioProcessRequest,
+    session: Optional[RecordingSession]
+) -> Tuple[Dict[str, Any], Audio]:
+    """
+    Script + audio stages with a speculative local draft.
+
+    The Gemini script is requested in the background while a draft script
+    (transcript minus fillers) is built locally and synthesized right away.
+    The LLM script ships if it arrives early enough for its own TTS to
+    finish by SCRIPT_DEADLINE_SECONDS (judged with a running estimate of
+    TTS time); otherwise, or if it fails, the draft ships. An abandoned LLM
+    call still completes in the background and fills the script cache.
+    """
+    start = time.monotonic()
+    llm_future = _submit_speculative(run_script_stage, payload, session)
+
+    draft_result = build_draft_script(payload.text, payload.words, session)
+    if not draft_result["script"].strip():
+        print(f"[Speculation] Empty draft, waiting for the LLM script")
+        script_result = llm_future.result()
+        release_transcript_inputs(payload)
+        return script_result, _timed_audio_stage(script_result, session)
+
+    draft_audio_future = _submit_speculative(_timed_audio_stage, draft_result, session)
+
+    tts_estimate = _tts_estimate()
+    llm_cutoff = start + SCRIPT_DEADLINE_SECONDS - tts_estimate
+    reason = None
+    try:
+        script_result = llm_future.result(timeout=max(0.0, llm_cutoff - time.monotonic()))
+    except FutureTimeoutError:
+        reason = "llm_deadline"
+    except Exception as e:
+        print(f"[Speculation] ⚠️  LLM script failed, shipping draft: {str(e)}")
+        reason = "llm_error"
+
+    if reason is None:
+        # The background call is done with the request: its inputs can go
+        release_transcript_inputs(payload)
+        # The draft audio is not shipped: skip its TTS if it hasn't started,
+        # otherwise drop its file once it exists
+        if draft_audio_future.cancel():
+            print(f"[Speculation] Draft TTS cancelled before it started")
+        else:
+            draft_audio_future.add_done_callback(
+                lambda future: discard_audio(future.result()) if future.exception() is None else None
+            )
+        audio = _timed_audio_stage(script_result, session)
+        shipped = "llm"
+    else:
+        script_result = draft_result
+        audio = draft_audio_future.result()
+        shipped = "draft"
+
+    elapsed = time.monotonic() - start
+    print(f"[Speculation] Shipping {shipped} script after {elapsed:.2f}s "
+          f"(deadline {SCRIPT_DEADLINE_SECONDS:.1f}s, TTS estimate {tts_estimate:.2f}s)")
+    script_result["speculation"] = {
+        "shipped": shipped,
+        "reason": reason,
+        "elapsed_seconds": round(elapsed, 3),
+        "deadline_seconds": SCRIPT_DEADLINE_SECONDS,
+    }
+    return script_result, audio
+
+
+def _synthesize_postprocessed(production_script: str) -> AudioFile:
+    """
+    Synthesize PCM to a temp file, then trim, normalize and mix it into a
+    WAV file frame by frame. The WAV stays on disk.
+    """
+    wav_path = _new_wav_file("productai_tts_")
+    try:
+        with tempfile.TemporaryDirectory(prefix="productai_tts_") as tmp_dir:
+            raw_path = os.path.join(tmp_dir, "narration.pcm")
+            synthesize_pcm_to_file(production_script, raw_path, sample_rate=SAMPLE_RATE)
+            postprocess_pcm_file(raw_path, wav_path)
+    except BaseException:
+        discard_audio(AudioFile(wav_path, 0))
+        raise
+    return AudioFile(wav_path, os.path.getsize(wav_path))
+
+
+def _synthesize_aligned(
+    script_result: Dict[str, Any],
+    session: Optional[RecordingSession]
+) -> AudioFile:
+    """
+    Per-sentence TTS placed at the original speaking offsets, as a WAV as
+    long as the recording. Post-processing (without trimming, which would
+    break the alignment) runs on the assembled track when enabled.
+    """
+    wav_path = _new_wav_file("productai_align_")
+    try:
+        with tempfile.TemporaryDirectory(prefix="productai_align_") as tmp_dir:
+            raw_path = os.path.join(tmp_dir, "aligned.pcm")
+            track = synthesize_aligned_track(
+                script_result["script"],
+                script_result.get("speaking_segments", []),
+                raw_path,
+                session
+            )
+            # Reported in the response: sentences that did not fit where planned
+            script_result["alignment"] = track["summary"]
+
+            postprocess_pcm_file(raw_path, wav_path, trim=False, normalize=AUDIO_POSTPROCESS_ENABLED,
+                                 background_path=BACKGROUND_MUSIC_PATH if AUDIO_POSTPROCESS_ENABLED else None)
+    except BaseException:
+        discard_audio(AudioFile(wav_path, 0))
+        raise
+    return AudioFile(wav_path, os.path.getsize(wav_path))
+
+
+def save_audio_file(payload: AudioProcessRequest, audio: Audio) -> str:
+    """
+    Write the audio into the request's recordings path (atomically, with
+    disk space check and artifact indexing). An AudioFile is moved there,
+    not read.
+
+    Returns:
+        The generated filename
+    """
+    print(f"\n[Python] ===== STEP 3: SAVING AUDIO FILE =====")
+    timestamp = int(time.time() * 1000)
+    session_id = payload.metadata.get("sessionId", "unknown")
+    is_file = isinstance(audio, AudioFile)
+    extension = "wav" if is_file or audio[:4] == b"RIFF" else "mp3"
+    filename = f"processed_audio_{session_id}_{timestamp}.{extension}"
+
+    print(f"[Python]   - Session ID: {session_id}")
+    print(f"[Python]   - Filename: {filename}")
+    print(f"[Python]   - Recordings path: {payload.recordingsPath}")
+
+    if is_file:
+        file_path = store_artifact_file(audio.path, payload.recordingsPath, filename, session_id)
+    else:
+        file_path = write_artifact(payload.recordingsPath, filename, audio, session_id)
+
+    print(f"[Python] ✅ Audio file saved successfully")
+    print(f"[Python]   - Full path: {file_path}")
+    print(f"[Python]   - File size: {audio_size(audio)} bytes")
+
+    return filename
+
+
+def run_fanout_stage(
+    payload: AudioProcessRequest,
+    script_result: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """
+    Render the script for every target in `payload.targets` (concurrently,
+    sentence clips shared through the audio cache) and save each rendition.
+
+    Returns:
+        One entry per target, in request order; the first is the primary
+    """
+    targets: List[AudioTarget] = payload.targets
+    print(f"\n[Python] ===== STEP 2: AUDIO GENERATION ({len(targets)} targets) =====")
+
+    try:
+        renditions = save_renditions(
+            script_result["script"], targets, payload.recordingsPath, payload.metadata.get("sessionId", "unknown")
+        )
+    except Exception as e:
+        print(f"[Python] ❌ Audio generation failed: {str(e)}")
+        raise
+
+    for rendition in renditions:
+        print(f"[Python]   - {rendition['processed_audio_filename']} ({rendition['audio_size_bytes']} bytes)")
+    return renditions
+
+
+def queue_node_delivery(payload: AudioProcessRequest, response_data: Dict[str, Any]) -> None:
+    """With NODE_FORWARD_ENABLED, queue the saved audio + script for delivery to Node."""
+    if not NODE_FORWARD_ENABLED:
+        return
+    file_path = os.path.join(payload.recordingsPath, response_data["processed_audio_filename"])
+    response_data["node_delivery_id"] = enqueue_audio_delivery(
+        file_path, response_data["script"], response_data["session_id"]
+    )
+
+
+def build_response_data(
+    payload: AudioProcessRequest,
+    script_result: Dict[str, Any],
+    filename: str,
+    audio_size: int,
+    renditions: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Build the JSON-serializable response for a processed request. With
+    `renditions`, the primary one is also reported as the processed audio.
+    """
+    print(f"\n[Python] ===== STEP 4: PREPARING RESPONSE =====")
+
+    response_data = {
+        "success": True,
+        "script": script_result["script"],
+        "raw_text": payload.text,
+        "processed_audio_filename": filename,
+        "audio_size_bytes": audio_size,
+        "timing_analysis": script_result.get("timing_analysis", {}),
+        "dom_context_used": script_result.get("dom_context_used", False),
+        "event_coalescing": script_result.get("event_coalescing"),
+        "speculation": script_result.get("speculation"),
+        "alignment": script_result.get("alignment"),
+        "renditions": renditions,
+        "session_id": payload.metadata.get("sessionId", "unknown"),
+    }
+
+    print(f"[Python]   - DOM context used: {response_data['dom_context_used']}")
+
+    return response_data
+
+
+def process_audio_request(payload: AudioProcessRequest, profile: bool = False) -> Dict[str, Any]:
+    """
+    Run the full pipeline for a single request, stage after stage. With
+    `profile`, the run is sampled and a speedscope profile is written next
+    to the audio.
+
+    Blocking: call from a worker thread when running inside the event loop.
+    """
+    print(f"[Python] ===== FULL PROCESSING PIPELINE STARTED =====")
+    if payload.sessionRef:
+        hydrate_request(payload)
+    print(f"[Python] Raw text length: {len(payload.text)}")
+
+    has_new_format = payload.deepgramData is not None
+    has_old_format = payload.deepgramResponse is not None
+    print(f"[Python] Format detected: {'NEW (deepgramData)' if has_new_format else 'OLD (deepgramResponse)' if has_old_format else 'UNKNOWN'}")
+    print(f"[Python] Deepgram words: {len(payload.words)} words")
+
+    session_id = payload.metadata.get("sessionId", "unknown")
+    with profile_current_thread(f"/audio-full-process {session_id}", enabled=profile) as profiler, \
+            capture_request("/audio-full-process", payload) as capture:
+        session = resolve_session(payload)
+        remember_request(payload, session)
+        print(f"[Python] Recordings path: {payload.recordingsPath}")
+
+        renditions = None
+        if payload.targets:
+            script_result = run_script_stage(payload, session)
+            release_transcript_inputs(payload)
+            payload.session = session = None
+            renditions = run_fanout_stage(payload, script_result)
+            filename = renditions[0]["processed_audio_filename"]
+            size = renditions[0]["audio_size_bytes"]
+            audio_sha256 = None
+        else:
+            if SPECULATIVE_DRAFT_ENABLED:
+                script_result, audio = run_speculative_stages(payload, session)
+            else:
+                script_result = run_script_stage(payload, session)
+                release_transcript_inputs(payload)
+                audio = run_audio_stage(script_result, session)
+            payload.session = session = None
+            size = audio_size(audio)
+            audio_sha256 = _audio_sha256(audio) if capture is not None else None
+            try:
+                filename = save_audio_file(payload, audio)
+            finally:
+                discard_audio(audio)
+            del audio
+        response_data = build_response_data(payload, script_result, filename, size, renditions)
+        queue_node_delivery(payload, response_data)
+
+        if capture is not None:
+            capture.response = {
+                "script": response_data["script"],
+                "audio_size_bytes": size,
+                "audio_sha256": audio_sha256,
+            }
+
+    if profiler is not None:
+        response_data["profile_filename"] = save_request_profile(profiler, payload.recordingsPath, session_id)
+
+    print(f"\n[Python] ===== ✅ ALL PROCESSING COMPLETE ✅ =====")
+
+    return response_data
@@ -0,0 +1,259 @@
+"""
+Audio post-processing stage that runs after TTS.
+
+Works on raw 16-bit mono PCM in fixed-size frames streamed from disk, so a
+long narration never has to be decoded into memory as a whole:
+
+1. Trim leading/trailing silence
+2. Normalize loudness (RMS target with a peak ceiling)
+3. Optionally mix a looped background music bed underneath
+
+Loudness normalization needs the level of the whole narration, so the input
+file is read twice: once to measure, once to process and write.
+"""
+import math
+import os
+import wave
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from pydub.utils import audioop
+
+SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "24000"))
+SAMPLE_WIDTH = 2  # 16-bit PCM
+CHANNELS = 1
+FRAME_MS = 20
+
+SILENCE_THRESHOLD_DBFS = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DBFS", "-45"))
+SILENCE_PADDING_MS = int(os.getenv("AUDIO_SILENCE_PADDING_MS", "120"))
+TARGET_RMS_DBFS = float(os.getenv("AUDIO_TARGET_RMS_DBFS", "-18"))
+PEAK_CEILING_DBFS = float(os.getenv("AUDIO_PEAK_CEILING_DBFS", "-1"))
+BACKGROUND_MUSIC_PATH = os.getenv("BACKGROUND_MUSIC_PATH")
+BACKGROUND_GAIN_DB = float(os.getenv("BACKGROUND_GAIN_DB", "-24"))
+
+_FULL_SCALE = float(2 ** (8 * SAMPLE_WIDTH - 1))
+
+
+def frame_size_bytes(sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS) -> int:
+    return sample_rate * frame_ms // 1000 * SAMPLE_WIDTH * CHANNELS
+
+
+def to_dbfs(amplitude: float) -> float:
+    if amplitude <= 0:
+        return float("-inf")
+    return 20 * math.log10(amplitude / _FULL_SCALE)
+
+
+def iter_pcm_frames(path: str, frame_bytes: Optional[int] = None) -> Iterator[bytes]:
+    """Stream a raw PCM file as fixed-size frames (the last one may be short)."""
+    frame_bytes = frame_bytes or frame_size_bytes()
+    with open(path, "rb") as f:
+        while True:
+            frame = f.read(frame_bytes)
+            if not frame:
+                return
+            # Never split a sample across frames
+            if len(frame) % SAMPLE_WIDTH:
+                frame = frame[: len(frame) - len(frame) % SAMPLE_WIDTH]
+            yield frame
+
+
+def trim_silence(
+    frames: Iterable[bytes],
+    threshold_dbfs: float = SILENCE_THRESHOLD_DBFS,
+    padding_frames: int = SILENCE_PADDING_MS // FRAME_MS,
+) -> Iterator[bytes]:
+    """
+    Drop leading and trailing silence, keeping `padding_frames` of it on
+    each side so speech doesn't start or stop abruptly.
+
+    Silent frames in the middle are buffered and released as soon as speech
+    resumes; only the trailing run is dropped.
+    """
+    leading = []
+    pending = []
+    started = False
+
+    for frame in frames:
+        silent = to_dbfs(audioop.rms(frame, SAMPLE_WIDTH)) < threshold_dbfs
+
+        if not started:
+            if silent:
+                leading.append(frame)
+                if len(leading) > padding_frames:
+                    leading.pop(0)
+                continue
+            started = True
+            yield from leading
+            leading = []
+
+        if silent:
+            pending.append(frame)
+            continue
+
+        yield from pending
+        pending = []
+        yield frame
+
+    yield from pending[:padding_frames]
+
+
+def measure_levels(frames: Iterable[bytes]) -> Dict[str, Any]:
+    """Whole-stream RMS and peak levels, accumulated frame by frame."""
+    sum_squares = 0.0
+    samples = 0
+    peak = 0
+
+    for frame in frames:
+        count = len(frame) // SAMPLE_WIDTH
+        rms = audioop.rms(frame, SAMPLE_WIDTH)
+        sum_squares += float(rms) * rms * count
+        samples += count
+        peak = max(peak, audioop.max(frame, SAMPLE_WIDTH))
+
+    rms = math.sqrt(sum_squares / samples) if samples else 0.0
+    return {
+        "samples": samples,
+        "rms_dbfs": to_dbfs(rms),
+        "peak_dbfs": to_dbfs(peak),
+    }
+
+
+def normalization_gain_db(
+    levels: Dict[str, Any],
+    target_rms_dbfs: float = TARGET_RMS_DBFS,
+    peak_ceiling_dbfs: float = PEAK_CEILING_DBFS,
+) -> float:
+    """Gain that brings RMS to the target without pushing peaks over the ceiling."""
+    if levels["samples"] == 0 or levels["rms_dbfs"] == float("-inf"):
+        return 0.0
+    gain = target_rms_dbfs - levels["rms_dbfs"]
+    return min(gain, peak_ceiling_dbfs - levels["peak_dbfs"])
+
+
+def apply_gain(frames: Iterable[bytes], gain_db: float) -> Iterator[bytes]:
+    if abs(gain_db) < 0.01:
+        yield from frames
+        return
+    factor = 10 ** (gain_db / 20)
+    for frame in frames:
+        yield audioop.mul(frame, SAMPLE_WIDTH, factor)
+
+
+def iter_wav_frames(path: str, sample_rate: int = SAMPLE_RATE, loop: bool = False) -> Iterator[bytes]:
+    """
+    Stream a WAV file as frames in the pipeline's PCM format, converting
+    channels, sample width and rate on the fly.
+    """
+    frame_bytes = frame_size_bytes(sample_rate)
+
+    while True:
+        produced = False
+        with wave.open(path, "rb") as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames_per_read = max(1, rate * FRAME_MS // 1000)
+            ratecv_state = None
+            buffer = b""
+
+            while True:
+                chunk = wav.readframes(frames_per_read)
+                if not chunk:
+                    break
+                if channels == 2:
+                    chunk = audioop.tomono(chunk, width, 0.5, 0.5)
+                if width != SAMPLE_WIDTH:
+                    chunk = audioop.lin2lin(chunk, width, SAMPLE_WIDTH)
+                if rate != sample_rate:
+                    chunk, ratecv_state = audioop.ratecv(
+                        chunk, SAMPLE_WIDTH, CHANNELS, rate, sample_rate, ratecv_state
+                    )
+
+                buffer += chunk
+                while len(buffer) >= frame_bytes:
+                    produced = True
+                    yield buffer[:frame_bytes]
+                    buffer = buffer[frame_bytes:]
+
+            if buffer:
+                produced = True
+                yield buffer
+
+        if not loop or not produced:
+            return
+
+
+def mix_background(
+    frames: Iterable[bytes],
+    background_path: str,
+    gain_db: float = BACKGROUND_GAIN_DB,
+    sample_rate: int = SAMPLE_RATE,
+) -> Iterator[bytes]:
+    """Mix a looped background bed under the narration."""
+    factor = 10 ** (gain_db / 20)
+    bed = iter_wav_frames(background_path, sample_rate, loop=True)
+    bed_buffer = b""
+
+    for frame in frames:
+        while len(bed_buffer) < len(frame):
+            chunk = next(bed, None)
+            if chunk is None:
+                # Empty background file - nothing to mix
+                yield frame
+                break
+            bed_buffer += chunk
+        if len(bed_buffer) < len(frame):
+            continue
+        bed_frame, bed_buffer = bed_buffer[: len(frame)], bed_buffer[len(frame):]
+        yield audioop.add(frame, audioop.mul(bed_frame, SAMPLE_WIDTH, factor), SAMPLE_WIDTH)
+
+
+def postprocess_pcm_file(
+    input_path: str,
+    output_path: str,
+    sample_rate: int = SAMPLE_RATE,
+    trim: bool = True,
+    normalize: bool = True,
+    background_path: Optional[str] = BACKGROUND_MUSIC_PATH,
+) -> Dict[str, Any]:
+    """
+    Post-process a raw PCM narration file into a WAV file.
+
+    Returns:
+        Dictionary with the measured levels, applied gain and output duration
+    """
+    frame_bytes = frame_size_bytes(sample_rate)
+
+    def narration() -> Iterator[bytes]:
+        frames = iter_pcm_frames(input_path, frame_bytes)
+        return trim_silence(frames) if trim else frames
+
+    gain_db = 0.0
+    levels = None
+    if normalize:
+        levels = measure_levels(narration())
+        gain_db = normalization_gain_db(levels)
+
+    frames = apply_gain(narration(), gain_db)
+    if background_path:
+        frames = mix_background(frames, background_path, sample_rate=sample_rate)
+
+    written = 0
+    with wave.open(output_path, "wb") as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        for frame in frames:
+            wav.writeframesraw(frame)
+            written += len(frame)
+
+    duration = written / (SAMPLE_WIDTH * CHANNELS * sample_rate)
+    print(f"[Audio Post] ✅ Post-processed narration: {duration:.2f}s, gain {gain_db:+.1f} dB"
+          f"{', background mixed' if background_path else ''}")
+
+    return {
+        "input_levels": levels,
+        "gain_db": gain_db,
+        "duration_seconds": duration,
+        "background_mixed": bool(background_path),
+    }
@@ -0,0 +1,95 @@
+"""
+Serving generated audio over HTTP, for players and CDNs.
+
+`/audio/{session_id}/{filename}` only serves files written through the
+storage service: the name is looked up in the session's artifact index
+(then in the session store's recordings path, for generated names only),
+never joined onto a client-supplied path.
+
+- Range requests (single and multiple ranges, If-Range), HEAD, Content-Length,
+  Last-Modified and an ETag come from Starlette's FileResponse; the file is
+  read in AUDIO_CHUNK_BYTES chunks and never held in memory whole
+- If-None-Match answers 304. Generated files are never rewritten (unique
+  names, atomic writes), so they are marked immutable for caches
+- Zero-copy: ASGI servers offering `http.response.pathsend` send the whole
+  file with sendfile. Behind nginx, AUDIO_ACCEL_REDIRECT_PREFIX hands the
+  transfer (ranges included) to nginx through X-Accel-Redirect
+"""
+import os
+import stat
+from typing import Optional
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+from app.services.session_store import SessionNotFoundError, load_session
+from app.services.storage_service import find_artifact
+
+AUDIO_CACHE_MAX_AGE_SECONDS = int(os.getenv("AUDIO_CACHE_MAX_AGE_SECONDS", str(365 * 24 * 3600)))
+AUDIO_CHUNK_BYTES = int(os.getenv("AUDIO_CHUNK_BYTES", str(256 * 1024)))
+# e.g. /_audio: nginx needs `location /_audio/ { internal; alias /; }`
+AUDIO_ACCEL_REDIRECT_PREFIX = os.getenv("AUDIO_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+
+
+class AudioFileResponse(FileResponse):
+    chunk_size = AUDIO_CHUNK_BYTES
+
+
+def resolve_audio_path(session_id: str, filename: str) -> Optional[str]:
+    """Absolute path of a session's generated audio file, or None."""
+    if os.path.basename(filename) != filename or filename.startswith("."):
+        return None
+
+    # Audio only: profiles indexed for the session are not served here
+    path = find_artifact(session_id, filename, kind="processed_audio")
+    if path is None and filename.startswith("processed_audio_"):
+        # Not indexed (e.g. the index write failed): the session's own directory only
+        try:
+            recordings_path = load_session(session_id)["recordings_path"]
+        except SessionNotFoundError:
+            recordings_path = None
+        if recordings_path:
+            path = os.path.join(recordings_path, filename)
+    return path
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as for GET/HEAD
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in candidates
+
+
+def audio_response(path: str, request_headers: Headers) -> Optional[Response]:
+    """
+    Response for an audio file, or None when it doesn't exist (anymore).
+
+    Blocking (stat): call from a worker thread.
+    """
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISREG(stat_result.st_mode):
+        return None
+
+    headers = {"Cache-Control": f"public, max-age={AUDIO_CACHE_MAX_AGE_SECONDS}, immutable"}
+    if AUDIO_ACCEL_REDIRECT_PREFIX:
+        headers["X-Accel-Redirect"] = AUDIO_ACCEL_REDIRECT_PREFIX + quote(os.path.abspath(path))
+
+    response = AudioFileResponse(path, headers=headers, stat_result=stat_result)
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, response.headers["etag"]):
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"],
+            "Last-Modified": response.headers["last-modified"],
+            "Cache-Control": headers["Cache-Control"],
+        })
+
+    if AUDIO_ACCEL_REDIRECT_PREFIX:
+        # nginx sends the body, answers ranges and sets ETag/Last-Modified itself
+        return Response(status_code=200, headers={**headers, "Content-Type": response.media_type})
+    return response
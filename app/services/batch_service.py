@@ -0,0 +1,228 @@
+"""
+Batch processing service for /batch/audio-full-process.
+
+Accepts an NDJSON stream of AudioProcessRequest payloads and runs them through
+the audio pipeline on a bounded pool of workers. Each upstream provider gets
+its own concurrency cap, so throughput is limited by provider quotas rather
+than by per-request HTTP overhead. Results are streamed back as NDJSON lines
+in completion order, each tagged with the index of the input line.
+"""
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from pydantic import ValidationError
+from starlette.responses import StreamingResponse
+
+from app.models.request_models import AudioProcessRequest
+from app.services.memory_service import estimate_request_bytes, estimate_stored_session_bytes, memory_reservation
+from app.services.audio_pipeline_service import (
+    audio_size,
+    build_response_data,
+    discard_audio,
+    hydrate_request,
+    queue_node_delivery,
+    release_transcript_inputs,
+    remember_request,
+    resolve_session,
+    run_audio_stage,
+    run_fanout_stage,
+    run_script_stage,
+    save_audio_file,
+)
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "16"))
+GEMINI_CONCURRENCY = int(os.getenv("BATCH_GEMINI_CONCURRENCY", "4"))
+TTS_CONCURRENCY = int(os.getenv("BATCH_TTS_CONCURRENCY", "4"))
+
+# Shared across all batch requests so concurrent batches respect the same caps
+_provider_slots = {
+    "gemini": asyncio.Semaphore(GEMINI_CONCURRENCY),
+    "tts": asyncio.Semaphore(TTS_CONCURRENCY),
+}
+
+
+class BatchStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that only listens for client disconnects once the
+    request body has been read.
+
+    The default implementation consumes `receive()` while streaming, which
+    would swallow the NDJSON request body we are still reading. Once
+    `body_read` is set, a disconnect cancels the stream, and with it the
+    reader and the workers (no Gemini/TTS quota spent for a client that left).
+    """
+
+    def __init__(self, content, body_read: asyncio.Event, **kwargs) -> None:
+        super().__init__(content, **kwargs)
+        self.body_read = body_read
+
+    async def _wait_for_disconnect(self, receive) -> None:
+        await self.body_read.wait()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def __call__(self, scope, receive, send) -> None:
+        stream_task = asyncio.create_task(self.stream_response(send))
+        disconnect_task = asyncio.create_task(self._wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({stream_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnect_task.cancel()
+            if not stream_task.done():
+                print("[Batch] ⚠️  Client disconnected, cancelling remaining items")
+                stream_task.cancel()
+            await asyncio.gather(stream_task, disconnect_task, return_exceptions=True)
+
+        if stream_task.cancelled():
+            return
+        stream_task.result()
+        if self.background is not None:
+            await self.background()
+
+
+async def _iter_ndjson_lines(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a streamed request body into non-empty lines."""
+    # Only each new chunk is split; a line spanning chunks grows in place
+    buffer = bytearray()
+    async for chunk in body:
+        *lines, tail = chunk.split(b"\n")
+        if lines:
+            buffer += lines[0]
+            lines[0] = bytes(buffer)
+            buffer.clear()
+        buffer += tail
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield bytes(buffer)
+
+
+async def _process_item(payload: AudioProcessRequest, line_bytes: int, index: int) -> Dict[str, Any]:
+    """
+    Run one request through the pipeline under the provider caps, holding
+    its share of the worker memory budget (estimated from its line size,
+    plus the stored session it loads for a sessionRef).
+    """
+    size = estimate_request_bytes(line_bytes, True)
+    if payload.sessionRef:
+        size += await asyncio.to_thread(estimate_stored_session_bytes, payload.sessionRef)
+    async with memory_reservation(size, f"batch item {index}"):
+        return await _run_item(payload)
+
+
+async def _run_item(payload: AudioProcessRequest) -> Dict[str, Any]:
+    if payload.sessionRef:
+        await asyncio.to_thread(hydrate_request, payload)
+    session = await asyncio.to_thread(resolve_session, payload)
+    await asyncio.to_thread(remember_request, payload, session)
+
+    async with _provider_slots["gemini"]:
+        script_result = await asyncio.to_thread(run_script_stage, payload, session)
+    release_transcript_inputs(payload)
+
+    renditions = None
+    if payload.targets:
+        payload.session = session = None
+        async with _provider_slots["tts"]:
+            renditions = await asyncio.to_thread(run_fanout_stage, payload, script_result)
+        filename = renditions[0]["processed_audio_filename"]
+        size = renditions[0]["audio_size_bytes"]
+    else:
+        async with _provider_slots["tts"]:
+            audio = await asyncio.to_thread(run_audio_stage, script_result, session)
+        payload.session = session = None
+
+        size = audio_size(audio)
+        try:
+            filename = await asyncio.to_thread(save_audio_file, payload, audio)
+        finally:
+            discard_audio(audio)
+        del audio
+    response_data = build_response_data(payload, script_result, filename, size, renditions)
+    await asyncio.to_thread(queue_node_delivery, payload, response_data)
+    return response_data
+
+
+def _result_line(index: Optional[int], result: Optional[Dict[str, Any]], error: Optional[str]) -> bytes:
+    if error is not None:
+        line = {"index": index, "success": False, "error": error}
+    else:
+        line = {"index": index, "success": True, "result": result}
+    return (json.dumps(line) + "\n").encode("utf-8")
+
+
+async def stream_batch_results(
+    body: AsyncIterator[bytes],
+    body_read: Optional[asyncio.Event] = None
+) -> AsyncIterator[bytes]:
+    """
+    Schedule every NDJSON request line across the worker pool and yield one
+    NDJSON result line per item as soon as it completes.
+
+    Reading the body is throttled by the queue size, so a huge batch never
+    sits fully in memory. `body_read` is set once the body is consumed.
+    """
+    pending: asyncio.Queue[Optional[Tuple[int, bytes]]] = asyncio.Queue(maxsize=BATCH_WORKERS * 2)
+    results: asyncio.Queue[Optional[bytes]] = asyncio.Queue()
+
+    async def reader() -> None:
+        index = 0
+        try:
+            async for line in _iter_ndjson_lines(body):
+                await pending.put((index, line))
+                index += 1
+        except Exception as e:
+            print(f"[Batch] ❌ Failed reading request body: {str(e)}")
+            # Not tied to an input line: tells the client the stream is incomplete
+            await results.put(_result_line(None, None, f"Failed reading request body: {str(e)}"))
+        finally:
+            if body_read is not None:
+                body_read.set()
+
+        print(f"[Batch] Finished reading {index} requests")
+        for _ in range(BATCH_WORKERS):
+            await pending.put(None)
+
+    async def worker() -> None:
+        try:
+            while True:
+                item = await pending.get()
+                if item is None:
+                    return
+
+                index, line = item
+                try:
+                    payload = AudioProcessRequest.model_validate_json(line)
+                except ValidationError as e:
+                    await results.put(_result_line(index, None, f"Invalid request: {e}"))
+                    continue
+
+                try:
+                    result = await _process_item(payload, len(line), index)
+                    await results.put(_result_line(index, result, None))
+                except Exception as e:
+                    print(f"[Batch] ❌ Item {index} failed: {str(e)}")
+                    await results.put(_result_line(index, None, f"Processing failed: {str(e)}"))
+        finally:
+            await results.put(None)
+
+    reader_task = asyncio.create_task(reader())
+    worker_tasks = [asyncio.create_task(worker()) for _ in range(BATCH_WORKERS)]
+
+    try:
+        finished_workers = 0
+        while finished_workers < BATCH_WORKERS:
+            line = await results.get()
+            if line is None:
+                finished_workers += 1
+                continue
+            yield line
+        await reader_task
+    finally:
+        for task in [reader_task, *worker_tasks]:
+            task.cancel()
@@ -0,0 +1,245 @@
+"""
+Traffic capture and deterministic replay of upstream calls.
+
+Capture mode (CAPTURE_DIR set): each sampled /audio-full-process request is
+appended to a gzip JSONL log in CAPTURE_DIR (one file per worker process)
+with its sanitized payload and every upstream response it needed (Gemini
+text inline, TTS audio as content-addressed blobs under CAPTURE_DIR/blobs).
+
+Replay mode (`replay_upstream`): upstream calls are answered from a
+captured record instead of the network, so the full pipeline can be rerun
+and profiled offline against real payloads (see benchmarks/replay.py).
+
+Services route their provider calls through `upstream_call`, which is a
+plain call when neither mode is active.
+"""
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+from urllib.parse import urlparse, urlunparse
+
+from app.services.shared_cache import make_cache_key
+
+CAPTURE_DIR = os.getenv("CAPTURE_DIR")
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0"))
+
+_MASK_PATTERN = re.compile(r"[A-Za-z0-9]")
+
+_active: ContextVar[Optional[Union["CaptureRecorder", "ReplayRecorder"]]] = ContextVar("upstream_recorder", default=None)
+_log_lock = threading.Lock()
+
+
+class ReplayMissError(RuntimeError):
+    """Raised when a replayed request makes an upstream call that was never captured."""
+
+
+class CaptureRecorder:
+    """Performs upstream calls and records their responses."""
+
+    def __init__(self, blob_dir: Path):
+        self.blob_dir = blob_dir
+        self.entries: List[Dict[str, Any]] = []
+        self.response: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def call(self, provider: str, key: str, call: Callable[[], Union[str, bytes]]) -> Union[str, bytes]:
+        value = call()
+        entry: Dict[str, Any] = {"provider": provider, "key": key}
+        if isinstance(value, bytes):
+            entry["sha256"] = _write_blob(self.blob_dir, value)
+            entry["size"] = len(value)
+        else:
+            entry["text"] = value
+        with self._lock:
+            self.entries.append(entry)
+        return value
+
+
+class ReplayRecorder:
+    """
+    Answers upstream calls from captured entries. Calls are matched by
+    request key first; when the code under test builds different requests
+    (e.g. a changed prompt), the next unused response from the same
+    provider is returned instead and counted as a key mismatch.
+    """
+
+    def __init__(self, entries: Sequence[Dict[str, Any]], blob_dir: Path):
+        self.blob_dir = blob_dir
+        self.by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.by_provider: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for entry in entries:
+            self.by_key[entry["key"]].append(entry)
+            self.by_provider[entry["provider"]].append(entry)
+        self.used: set = set()
+        self.key_mismatches = 0
+        self._lock = threading.Lock()
+
+    def _take(self, provider: str, key: str) -> Dict[str, Any]:
+        with self._lock:
+            for entry in self.by_key.get(key, []):
+                if id(entry) not in self.used:
+                    self.used.add(id(entry))
+                    return entry
+            for entry in self.by_provider.get(provider, []):
+                if id(entry) not in self.used:
+                    self.used.add(id(entry))
+                    self.key_mismatches += 1
+                    return entry
+        raise ReplayMissError(f"No captured {provider} response left for request {key[:12]}...")
+
+    def call(self, provider: str, key: str, call: Callable[[], Union[str, bytes]]) -> Union[str, bytes]:
+        entry = self._take(provider, key)
+        if "text" in entry:
+            return entry["text"]
+        return (self.blob_dir / entry["sha256"]).read_bytes()
+
+
+def capture_active() -> bool:
+    """Whether upstream calls in this context are being captured or replayed."""
+    return _active.get() is not None
+
+
+def upstream_call(provider: str, request_parts: Sequence[Any], call: Callable[[], Union[str, bytes]]) -> Union[str, bytes]:
+    """
+    Run an upstream provider call (returning text or bytes) through the
+    active capture/replay recorder, if any.
+    """
+    recorder = _active.get()
+    if recorder is None:
+        return call()
+    return recorder.call(provider, make_cache_key(provider, *request_parts), call)
+
+
+def _write_blob(blob_dir: Path, data: bytes) -> str:
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = blob_dir / sha256
+    if not path.exists():
+        blob_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob_dir / f".{sha256}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    return sha256
+
+
+def _strip_query(url: Any) -> Any:
+    if not isinstance(url, str):
+        return url
+    parsed = urlparse(url)
+    return urlunparse(parsed._replace(query="", fragment=""))
+
+
+def _sanitize_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    event = dict(event)
+    target = event.get("target") or {}
+    if event.get("value"):
+        # Typed values may be credentials or personal data: keep only the shape
+        event["value"] = "" if target.get("type") == "password" else _MASK_PATTERN.sub("x", event["value"])
+    if target.get("attributes", {}).get("value"):
+        event["target"] = {**target, "attributes": {**target["attributes"], "value": ""}}
+    if isinstance(event.get("metadata"), dict) and "url" in event["metadata"]:
+        event["metadata"] = {**event["metadata"], "url": _strip_query(event["metadata"]["url"])}
+    return event
+
+
+def sanitize_request(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of an AudioProcessRequest body that is safe to keep on disk: typed
+    input values masked, URL query strings dropped, local paths removed and
+    the Deepgram request metadata stripped.
+    """
+    body = dict(body)
+    body["recordingsPath"] = "<recordings>"
+    body["domEvents"] = [_sanitize_event(e) for e in body.get("domEvents") or []]
+
+    if body.get("session"):
+        session = dict(body["session"])
+        session["url"] = _strip_query(session.get("url"))
+        session["events"] = [_sanitize_event(e) for e in session.get("events") or []]
+        session["videoPath"] = None
+        session["audioPath"] = None
+        body["session"] = session
+
+    metadata = dict(body.get("metadata") or {})
+    if "url" in metadata:
+        metadata["url"] = _strip_query(metadata["url"])
+    body["metadata"] = metadata
+
+    raw = (body.get("deepgramResponse") or {}).get("raw")
+    if isinstance(raw, dict) and "metadata" in raw:
+        body["deepgramResponse"] = {**body["deepgramResponse"], "raw": {k: v for k, v in raw.items() if k != "metadata"}}
+
+    return body
+
+
+def _append_record(record: Dict[str, Any]) -> None:
+    log_path = Path(CAPTURE_DIR) / f"captures-{os.getpid()}.jsonl.gz"
+    line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+    with _log_lock:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        # Every append is its own gzip member; gzip readers concatenate them
+        with gzip.open(log_path, "ab") as f:
+            f.write(line)
+
+
+@contextlib.contextmanager
+def capture_request(path: str, payload: Any) -> Iterator[Optional[CaptureRecorder]]:
+    """
+    Capture one request (a pydantic payload) and its upstream responses when
+    capture mode is on and the request is sampled. Yields the recorder (set
+    `.response` to a summary of the result) or None.
+    """
+    if not CAPTURE_DIR or random.random() >= CAPTURE_SAMPLE_RATE:
+        yield None
+        return
+
+    recorder = CaptureRecorder(Path(CAPTURE_DIR) / "blobs")
+    record: Dict[str, Any] = {
+        "path": path,
+        "captured_at": time.time(),
+        "body": sanitize_request(payload.model_dump(mode="json")),
+    }
+    token = _active.set(recorder)
+    try:
+        yield recorder
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        _active.reset(token)
+        record["upstream"] = recorder.entries
+        record["response"] = recorder.response
+        try:
+            _append_record(record)
+            print(f"[Capture] Recorded {path} with {len(recorder.entries)} upstream response(s)")
+        except OSError as e:
+            print(f"[Capture] ⚠️  Failed to write capture: {str(e)}")
+
+
+@contextlib.contextmanager
+def replay_upstream(entries: Sequence[Dict[str, Any]], blob_dir: Union[str, Path]) -> Iterator[ReplayRecorder]:
+    """Answer upstream calls inside the block from captured entries."""
+    recorder = ReplayRecorder(entries, Path(blob_dir))
+    token = _active.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _active.reset(token)
+
+
+def read_captures(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Records from a capture log (.jsonl.gz or plain .jsonl)."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
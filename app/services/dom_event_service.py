@@ -4,7 +4,11 @@ This service converts raw DOM events into structured instructions
 that can be used by the frontend to apply visual effects and
 by the RAG model for script generation.
 """
-from typing import List, Dict, Optional
+import json
+from typing import Any, List, Dict, Optional, Sequence, Tuple
+
+from pydantic import TypeAdapter
+
 from app.models.dom_event_models import (
     RecordingSession,
     InteractionEvent,
@@ -12,6 +16,17 @@ from app.models.dom_event_models import (
     ProcessRecordingResponse
 )
 
+try:
+    import orjson
+except ImportError:  # Optional fast encoder
+    orjson = None
+
+# Threshold for step separation (2 seconds of inactivity)
+STEP_THRESHOLD_MS = 2000
+
+_INSTRUCTION_TARGET_KEYS = ("tag", "id", "classes", "text", "type", "name", "attributes")
+_events_adapter = TypeAdapter(List[InteractionEvent])
+
 
 def process_dom_events(session: RecordingSession) -> ProcessRecordingResponse:
     """
@@ -67,7 +82,8 @@ def convert_event_to_instruction(event: InteractionEvent) -> Optional[FrontendIn
         value=event.value,
         selector=event.target.selector if event.target else None,
         bbox=event.target.bbox if event.target else None,
-        confidence=1.0  # DOM events are 100% accurate
+        confidence=1.0,  # DOM events are 100% accurate
+        endTimestamp=event.endTimestamp
     )
     
     # Add target information for frontend
@@ -112,6 +128,35 @@ def extract_text_from_events(events: List[InteractionEvent]) -> str:
     return " ".join(text_parts)
 
 
+def _step_ranges(
+    timestamps: Sequence[int],
+    types: Sequence[str],
+    end_timestamps: Optional[Sequence[Optional[int]]] = None
+) -> List[Tuple[int, int]]:
+    """
+    Split events into steps: a new step starts after more than
+    STEP_THRESHOLD_MS of inactivity or on a step_change event.
+    Inactivity is measured from the end of coalesced events.
+
+    Returns:
+        List of (start_index, end_index) pairs, end exclusive
+    """
+    if not timestamps:
+        return []
+
+    ranges = []
+    start = 0
+    for i in range(1, len(timestamps)):
+        previous_end = timestamps[i - 1]
+        if end_timestamps is not None and end_timestamps[i - 1] is not None:
+            previous_end = end_timestamps[i - 1]
+        if timestamps[i] - previous_end > STEP_THRESHOLD_MS or types[i] == "step_change":
+            ranges.append((start, i))
+            start = i
+    ranges.append((start, len(timestamps)))
+    return ranges
+
+
 def group_events_by_step(events: List[InteractionEvent]) -> List[Dict]:
     """
     Group events into logical steps based on timing and event types.
@@ -123,45 +168,104 @@ def group_events_by_step(events: List[InteractionEvent]) -> List[Dict]:
     Returns:
         List of step dictionaries with grouped events
     """
-    if not events:
-        return []
-    
-    steps = []
-    current_step = {
-        "stepNumber": 1,
-        "startTime": events[0].timestamp,
-        "endTime": events[0].timestamp,
-        "events": [events[0]],
-        "description": ""
+    ranges = _step_ranges(
+        [e.timestamp for e in events],
+        [e.type for e in events],
+        [e.endTimestamp for e in events]
+    )
+
+    return [
+        {
+            "stepNumber": step_number,
+            "startTime": events[start].timestamp,
+            "endTime": events[end - 1].timestamp,
+            "events": events[start:end],
+            "description": ""
+        }
+        for step_number, (start, end) in enumerate(ranges, 1)
+    ]
+
+
+def _instruction_record(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Plain-dict equivalent of convert_event_to_instruction, built from an
+    already-serialized event (no model construction or validation).
+    """
+    if event["type"] == "scroll":
+        position = event["metadata"].get("scrollPosition")
+        if position and position["y"] == 0 and position["x"] == 0:
+            return None
+
+    target = event.get("target")
+    return {
+        "timestamp": event["timestamp"],
+        "action": event["type"],
+        "target": {key: target.get(key) for key in _INSTRUCTION_TARGET_KEYS} if target else None,
+        "value": event.get("value"),
+        "bbox": target["bbox"] if target else None,
+        "selector": target["selector"] if target else None,
+        "confidence": 1.0,
+        "endTimestamp": event.get("endTimestamp"),
     }
-    
-    # Threshold for step separation (2 seconds of inactivity)
-    STEP_THRESHOLD_MS = 2000
-    
-    for i, event in enumerate(events[1:], 1):
-        time_gap = event.timestamp - current_step["endTime"]
-        
-        # If there's a significant gap or step_change event, start new step
-        if time_gap > STEP_THRESHOLD_MS or event.type == "step_change":
-            # Finalize current step
-            current_step["endTime"] = events[i-1].timestamp
-            steps.append(current_step)
-            
-            # Start new step
-            current_step = {
-                "stepNumber": len(steps) + 1,
-                "startTime": event.timestamp,
-                "endTime": event.timestamp,
-                "events": [event],
-                "description": ""
-            }
-        else:
-            current_step["events"].append(event)
-            current_step["endTime"] = event.timestamp
-    
-    # Add final step
-    if current_step["events"]:
-        steps.append(current_step)
-    
-    return steps
 
+
+def build_process_recording_payload(session: RecordingSession) -> Dict[str, Any]:
+    """
+    Bulk version of process_dom_events + group_events_by_step producing the
+    same JSON shape as ProcessRecordingResponse, as plain dicts.
+
+    Every event is serialized once; instructions and groupedSteps are built
+    from (and share) those dicts instead of re-dumping the models.
+    """
+    events = session.events
+    event_dicts = _events_adapter.dump_python(events, mode="json")
+
+    instructions = [record for record in map(_instruction_record, event_dicts) if record is not None]
+
+    ranges = _step_ranges(
+        [e["timestamp"] for e in event_dicts],
+        [e["type"] for e in event_dicts],
+        [e["endTimestamp"] for e in event_dicts]
+    )
+    grouped_steps = [
+        {
+            "stepNumber": step_number,
+            "startTime": event_dicts[start]["timestamp"],
+            "endTime": event_dicts[end - 1]["timestamp"],
+            "events": event_dicts[start:end],
+            "description": ""
+        }
+        for step_number, (start, end) in enumerate(ranges, 1)
+    ]
+
+    return {
+        "sessionId": session.sessionId,
+        "instructions": instructions,
+        "metadata": {
+            "totalEvents": len(events),
+            "instructionsGenerated": len(instructions),
+            "duration": session.endTime - session.startTime,
+            "url": session.url,
+            "extractedText": extract_text_from_events(events),
+            "groupedSteps": grouped_steps,
+        },
+    }
+
+
+def columnar_instructions(instructions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Column-oriented layout of instruction records: one list per field
+    instead of one object per instruction, so field names appear once.
+    """
+    keys = ("timestamp", "action", "target", "value", "bbox", "selector", "confidence", "endTimestamp")
+    layout: Dict[str, Any] = {"layout": "columnar", "count": len(instructions)}
+    for key in keys:
+        layout[key] = [record[key] for record in instructions]
+    return layout
+
+
+def render_json(payload: Any) -> bytes:
+    """Serialize straight to JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
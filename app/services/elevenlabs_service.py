@@ -10,20 +10,33 @@ import requests
 from dotenv import load_dotenv
 from pydub import AudioSegment
 
+from app.services.capture_service import capture_active, upstream_call
+from app.services.shared_cache import cache_get, cache_set, make_cache_key
+
 load_dotenv()
 
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
 DEFAULT_VOICE_MODEL = "aura-2-thalia-en"
-DEEPGRAM_SPEAK_URL = "https://api.deepgram.com/v1/speak"
+DEEPGRAM_SPEAK_URL = os.getenv("DEEPGRAM_SPEAK_URL", "https://api.deepgram.com/v1/speak")
+AUDIO_CACHE_TTL_SECONDS = float(os.getenv("AUDIO_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", "16"))
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+_WHITESPACE = re.compile(r'\s+')
+
+# Keep-alive connections to Deepgram, shared by every thread of the worker
+http_session = requests.Session()
+http_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=TTS_POOL_SIZE))
+http_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=TTS_POOL_SIZE))
 
 
 def chunk_by_sentence(text: str) -> List[str]:
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    sentences = _SENTENCE_BOUNDARY.split(text.strip())
     return [s.strip() for s in sentences if s.strip()]
 
 
 def ensure_sentence_endings(text: str) -> str:
-    txt = re.sub(r'\s+', ' ', text).strip()
+    txt = _WHITESPACE.sub(' ', text).strip()
     if txt and txt[-1] not in ".!?":
         txt += "."
     return txt
@@ -39,20 +52,113 @@ def call_deepgram(text: str, model: str) -> bytes:
         "encoding": "mp3",
         "bit_rate": "32000",
     }
-    resp = requests.post(DEEPGRAM_SPEAK_URL, headers=headers, params=params, json={"text": text})
+    resp = http_session.post(DEEPGRAM_SPEAK_URL, headers=headers, params=params, json={"text": text})
     if not resp.ok:
         raise RuntimeError(f"Deepgram error {resp.status_code}: {resp.text}")
     return resp.content
 
 
-def generate_voice_from_text(text: str, voice_id: str = DEFAULT_VOICE_MODEL) -> bytes:
+def generate_voice_from_text(text: str, voice_id: str = DEFAULT_VOICE_MODEL, bit_rate: int = 32000) -> bytes:
     if not text.strip():
         return b""
 
     text = ensure_sentence_endings(text)
 
+    cache_key = make_cache_key(voice_id, "mp3", str(bit_rate), text)
+    cached = cache_get("audio", cache_key)
+    if cached is not None:
+        print(f"[TTS] ♻️  Audio served from shared cache ({len(cached)} bytes)")
+        return cached
+
     # CALL DEEPGRAM ONCE — fastest
-    resp = requests.post(
+    def request_audio() -> bytes:
+        resp = http_session.post(
+            DEEPGRAM_SPEAK_URL,
+            headers={
+                "Authorization": f"Token {DEEPGRAM_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            params={
+                "model": voice_id,
+                "encoding": "mp3",
+                "bit_rate": str(bit_rate),
+            },
+            json={"text": text},
+            stream=True,
+            timeout=30,
+        )
+
+        if not resp.ok:
+            raise RuntimeError(f"Deepgram error {resp.status_code}: {resp.text}")
+        return resp.content
+
+    audio_bytes = upstream_call("deepgram", (voice_id, "mp3", str(bit_rate), text), request_audio)
+    cache_set("audio", cache_key, audio_bytes, AUDIO_CACHE_TTL_SECONDS)
+    return audio_bytes
+
+
+def synthesize_pcm(
+    text: str,
+    voice_id: str = DEFAULT_VOICE_MODEL,
+    sample_rate: int = 24000,
+) -> bytes:
+    """
+    Synthesize raw 16-bit mono PCM for a short text (one sentence), for
+    timing-aligned assembly. Cached like the MP3 output.
+    """
+    text = ensure_sentence_endings(text)
+
+    cache_key = make_cache_key(voice_id, "linear16", sample_rate, text)
+    cached = cache_get("audio", cache_key)
+    if cached is not None:
+        return cached
+
+    def request_pcm() -> bytes:
+        resp = http_session.post(
+            DEEPGRAM_SPEAK_URL,
+            headers={
+                "Authorization": f"Token {DEEPGRAM_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            params={
+                "model": voice_id,
+                "encoding": "linear16",
+                "sample_rate": str(sample_rate),
+                "container": "none",
+            },
+            json={"text": text},
+            timeout=30,
+        )
+
+        if not resp.ok:
+            raise RuntimeError(f"Deepgram error {resp.status_code}: {resp.text}")
+        return resp.content
+
+    pcm = upstream_call("deepgram", (voice_id, "linear16", sample_rate, text), request_pcm)
+    cache_set("audio", cache_key, pcm, AUDIO_CACHE_TTL_SECONDS)
+    return pcm
+
+
+def synthesize_pcm_to_file(
+    text: str,
+    output_path: str,
+    voice_id: str = DEFAULT_VOICE_MODEL,
+    sample_rate: int = 24000,
+) -> int:
+    """
+    Synthesize raw 16-bit mono PCM and stream it straight to disk, for the
+    post-processing stage. Returns the number of bytes written.
+    """
+    text = ensure_sentence_endings(text)
+
+    if capture_active():
+        # Capture/replay records the response as one value
+        pcm = synthesize_pcm(text, voice_id, sample_rate)
+        with open(output_path, "wb") as f:
+            f.write(pcm)
+        return len(pcm)
+
+    resp = http_session.post(
         DEEPGRAM_SPEAK_URL,
         headers={
             "Authorization": f"Token {DEEPGRAM_API_KEY}",
@@ -60,8 +166,9 @@ def generate_voice_from_text(text: str, voice_id: str = DEFAULT_VOICE_MODEL) ->
         },
         params={
             "model": voice_id,
-            "encoding": "mp3",
-            "bit_rate": "32000",
+            "encoding": "linear16",
+            "sample_rate": str(sample_rate),
+            "container": "none",
         },
         json={"text": text},
         stream=True,
@@ -71,4 +178,9 @@ def generate_voice_from_text(text: str, voice_id: str = DEFAULT_VOICE_MODEL) ->
     if not resp.ok:
         raise RuntimeError(f"Deepgram error {resp.status_code}: {resp.text}")
 
-    return resp.content
+    written = 0
+    with open(output_path, "wb") as f:
+        for chunk in resp.iter_content(chunk_size=64 * 1024):
+            f.write(chunk)
+            written += len(chunk)
+    return written
@@ -0,0 +1,109 @@
+"""
+Event stream coalescing for noisy DOM sessions.
+
+Real sessions are dominated by scroll events and per-keystroke `type`
+events. This preprocessing stage runs before RAG context building (and
+optionally before frontend instruction generation) and, in a single pass:
+
+- merges consecutive scrolls into one scroll span (final position,
+  `endTimestamp` set to the last scroll)
+- collapses consecutive keystrokes in the same field into one `type` event
+  carrying the final value
+- removes focus/blur pairs with no interaction in between
+
+Scroll and keystroke merging only joins events less than STEP_THRESHOLD_MS
+apart: step grouping measures inactivity from `endTimestamp`, so merging
+across a longer pause would erase a step boundary.
+
+Everything downstream (prompts, timelines, instructions) shrinks in
+proportion to the compression ratio reported in the stats.
+"""
+import os
+from typing import Any, Dict, List, Tuple
+
+from app.models.dom_event_models import InteractionEvent, RecordingSession
+from app.services.dom_event_service import STEP_THRESHOLD_MS
+
+EVENT_COALESCING_ENABLED = os.getenv("EVENT_COALESCING_ENABLED", "1") == "1"
+
+
+def _same_target(a: InteractionEvent, b: InteractionEvent) -> bool:
+    if a.target is None or b.target is None:
+        return a.target is b.target
+    return a.target.selector == b.target.selector
+
+
+def _continues(last: InteractionEvent, event: InteractionEvent) -> bool:
+    """Whether `event` follows `last` closely enough to be merged into it."""
+    last_end = last.endTimestamp if last.endTimestamp is not None else last.timestamp
+    return event.timestamp - last_end <= STEP_THRESHOLD_MS
+
+
+def coalesce_events(
+    events: List[InteractionEvent],
+    merge_scrolls: bool = True,
+    collapse_typing: bool = True,
+    drop_idle_focus: bool = True,
+) -> Tuple[List[InteractionEvent], Dict[str, Any]]:
+    """
+    Coalesce an event list in linear time.
+
+    Returns:
+        Tuple of (coalesced events, stats)
+    """
+    output: List[InteractionEvent] = []
+    scrolls_merged = 0
+    keystrokes_collapsed = 0
+    focus_blur_removed = 0
+
+    for event in events:
+        last = output[-1] if output else None
+
+        if (merge_scrolls and event.type == "scroll" and last is not None
+                and last.type == "scroll" and _continues(last, event)):
+            output[-1] = last.model_copy(update={
+                "metadata": event.metadata,
+                "endTimestamp": event.timestamp,
+            })
+            scrolls_merged += 1
+            continue
+
+        if (collapse_typing and event.type == "type" and last is not None
+                and last.type == "type" and _same_target(last, event) and _continues(last, event)):
+            output[-1] = last.model_copy(update={
+                "value": event.value,
+                "endTimestamp": event.timestamp,
+            })
+            keystrokes_collapsed += 1
+            continue
+
+        if (drop_idle_focus and event.type == "blur" and last is not None
+                and last.type == "focus" and _same_target(last, event)):
+            output.pop()
+            focus_blur_removed += 1
+            continue
+
+        output.append(event)
+
+    stats = {
+        "input_events": len(events),
+        "output_events": len(output),
+        "compression_ratio": round(len(events) / len(output), 2) if output else 0.0,
+        "scrolls_merged": scrolls_merged,
+        "keystrokes_collapsed": keystrokes_collapsed,
+        "focus_blur_pairs_removed": focus_blur_removed,
+    }
+    return output, stats
+
+
+def coalesce_session(session: RecordingSession, **options: bool) -> Tuple[RecordingSession, Dict[str, Any]]:
+    """
+    Return a copy of the session with coalesced events (the original is not
+    modified) plus the coalescing stats.
+    """
+    events, stats = coalesce_events(session.events, **options)
+    print(f"[Coalescing] {stats['input_events']} → {stats['output_events']} events "
+          f"({stats['compression_ratio']}x): {stats['scrolls_merged']} scrolls merged, "
+          f"{stats['keystrokes_collapsed']} keystrokes collapsed, "
+          f"{stats['focus_blur_pairs_removed']} idle focus/blur pairs removed")
+    return session.model_copy(update={"events": events}), stats
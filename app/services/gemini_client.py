@@ -0,0 +1,39 @@
+"""
+Gemini client configuration, shared by every service that calls Gemini.
+
+The google.generativeai client is process-global: it is configured once,
+on first use, and every module builds its models through `gemini_model`.
+"""
+import os
+import threading
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_KEY = os.getenv("GEMINI_API_KEY")
+# Point at a local stand-in (e.g. loadtest/fake_providers.py) instead of Google
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_gemini() -> None:
+    """Configure the Gemini client (API key, optional endpoint) once per process."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=API_KEY)
+        _configured = True
+
+
+def gemini_model(model_name: str) -> genai.GenerativeModel:
+    """A model on the configured client."""
+    configure_gemini()
+    return genai.GenerativeModel(model_name)
@@ -1,14 +1,29 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
 import re
+from app.services.gemini_client import gemini_model
+from app.services.prompt_cache_service import generate_text
 
-load_dotenv()
+MODEL_NAME = "gemini-2.5-flash-lite"
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=API_KEY)
+model = gemini_model(MODEL_NAME)
 
-model = genai.GenerativeModel("gemini-2.5-flash-lite")
+_WHITESPACE = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"\s+([.,!?])")
+
+# Static part of the prompt, identical for every request (see prompt_cache_service)
+PRODUCT_TEXT_PROMPT_PREFIX = """
+You are an AI that converts messy raw speech transcripts
+into structured product demo narration.
+
+OUTPUT RULES:
+- Add correct punctuation.
+- Remove filler words.
+- Keep narration concise and professional.
+- Keep action sequence IDENTICAL.
+- No hallucinated UI elements.
+- Single continuous paragraph.
+- NO newline characters at all.
+- Maintain similar character length.
+""".strip()
 
 
 def clean_output(text: str) -> str:
@@ -16,37 +31,23 @@ def clean_output(text: str) -> str:
         return ""
 
     text = text.replace("\n", " ")
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r"\s+([.,!?])", r"\1", text)
+    text = _WHITESPACE.sub(" ", text)
+    text = _SPACE_BEFORE_PUNCTUATION.sub(r"\1", text)
 
     return text.strip()
 
 
 def generate_product_text(raw_text: str) -> str:
 
-    prompt = f"""
-    You are an AI that converts messy raw speech transcripts
-    into structured product demo narration.
-
+    prompt_suffix = f"""
     RAW INPUT:
     {raw_text}
 
-    OUTPUT RULES:
-    - Add correct punctuation.
-    - Remove filler words.
-    - Keep narration concise and professional.
-    - Keep action sequence IDENTICAL.
-    - No hallucinated UI elements.
-    - Single continuous paragraph.
-    - NO newline characters at all.
-    - Maintain similar character length.
-
     FINAL OUTPUT:
     """
 
     try:
-        response = model.generate_content(prompt)
-        cleaned_text = clean_output(response.text)
+        cleaned_text = clean_output(generate_text(model, MODEL_NAME, PRODUCT_TEXT_PROMPT_PREFIX, prompt_suffix))
         return cleaned_text
 
     except Exception as e:
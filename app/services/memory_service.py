@@ -0,0 +1,251 @@
+"""
+Per-worker memory budget and admission control for large requests.
+
+Parsed payloads are roughly MEMORY_EXPANSION_FACTOR times their JSON size
+(every word/event becomes dicts or pydantic models), plus the synthesized
+audio. Before a body is read, the request's footprint is estimated from its
+Content-Length and reserved against WORKER_MEMORY_BUDGET_BYTES:
+
+- fits: the request runs immediately
+- doesn't fit yet: it waits (FIFO) for earlier requests to release memory,
+  up to ADMISSION_QUEUE_TIMEOUT_SECONDS, then gets a 503 with Retry-After
+- larger than the whole budget: rejected with 413
+
+The reservation is released once the response has been sent. Batch items
+(/batch/audio-full-process) each reserve their own line's estimate through
+`memory_reservation` instead, since the batch body is streamed.
+
+A `sessionRef` request has a tiny body but loads the stored session and
+Deepgram payload: it also reserves their stored size times
+MEMORY_EXPANSION_FACTOR (`session_ref_reservation`) before loading them.
+"""
+import asyncio
+import contextlib
+import json
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, Optional, Tuple
+
+from app.services.session_store import session_summary
+
+WORKER_MEMORY_BUDGET_BYTES = int(os.getenv("WORKER_MEMORY_BUDGET_BYTES", str(1024 ** 3)))
+MEMORY_EXPANSION_FACTOR = float(os.getenv("MEMORY_EXPANSION_FACTOR", "10"))
+AUDIO_RESERVE_BYTES = int(os.getenv("AUDIO_RESERVE_BYTES", str(16 * 1024 * 1024)))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+# Used when the parsed body size is unknown (chunked bodies, multipart uploads)
+UNKNOWN_BODY_ESTIMATE_BYTES = int(os.getenv("UNKNOWN_BODY_ESTIMATE_BYTES", str(8 * 1024 * 1024)))
+
+ADMISSION_CONTROLLED_PATHS = {
+    "/audio-full-process": True,     # path -> reserves audio memory
+    "/process-recording": False,
+    "/synced-narration": False,
+    "/synced-narration/regenerate": True,
+}
+
+
+class MemoryBudgetError(RuntimeError):
+    """Raised when work cannot reserve its memory: larger than the budget (413), or queued too long (503)."""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MemoryBudget:
+    """Byte budget shared by the requests of one worker, granted in FIFO order."""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    def _grant_waiters(self) -> None:
+        while self._waiters:
+            size, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + size > self.budget_bytes:
+                break
+            self._waiters.popleft()
+            self._take(size)
+            future.set_result(True)
+
+    def _take(self, size: int) -> None:
+        self.in_use += size
+        self.peak = max(self.peak, self.in_use)
+        self.admitted += 1
+
+    async def acquire(self, size: int, timeout: float) -> bool:
+        """Reserve `size` bytes, waiting up to `timeout`. Returns False if not granted."""
+        if not self._waiters and self.in_use + size <= self.budget_bytes:
+            self._take(size)
+            return True
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((size, future))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future.done():
+                # Granted just as the wait timed out
+                return True
+            future.cancel()
+            self.rejected += 1
+            # Smaller requests queued behind this one may fit now
+            self._grant_waiters()
+            return False
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if future.done() and not future.cancelled():
+                self.release(size)
+            else:
+                future.cancel()
+                self._grant_waiters()
+            raise
+
+    def release(self, size: int) -> None:
+        self.in_use -= size
+        self._grant_waiters()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "in_use_bytes": self.in_use,
+            "peak_bytes": self.peak,
+            "queued": sum(1 for _, f in self._waiters if not f.done()),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+_budget = MemoryBudget(WORKER_MEMORY_BUDGET_BYTES)
+
+
+def memory_stats() -> Dict[str, Any]:
+    return _budget.stats()
+
+
+@contextlib.asynccontextmanager
+async def memory_reservation(size: int, label: str, held: int = 0) -> AsyncIterator[None]:
+    """
+    Hold `size` bytes of the worker budget for the duration of the block
+    (FIFO with the admission-controlled requests). `held` is what the caller
+    already reserved (e.g. its request's admission), which can't be released
+    while it waits.
+
+    Raises:
+        MemoryBudgetError if `size` + `held` exceeds the budget or isn't
+        granted within ADMISSION_QUEUE_TIMEOUT_SECONDS
+    """
+    if WORKER_MEMORY_BUDGET_BYTES <= 0:
+        yield
+        return
+
+    if size + held > _budget.budget_bytes:
+        _budget.rejected += 1
+        raise MemoryBudgetError(f"{label} needs ~{(size + held) / 1024 / 1024:.0f} MB, "
+                                f"budget is {_budget.budget_bytes / 1024 / 1024:.0f} MB", status_code=413)
+    if not await _budget.acquire(size, ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        print(f"[Memory] ⚠️  Shed {label} after {ADMISSION_QUEUE_TIMEOUT_SECONDS:.0f}s in queue "
+              f"({_budget.in_use / 1024 / 1024:.0f} MB in use)")
+        raise MemoryBudgetError("Worker memory budget exhausted, retry later")
+
+    try:
+        yield
+    finally:
+        _budget.release(size)
+
+
+def estimate_stored_session_bytes(session_id: str) -> int:
+    """Estimated peak memory of loading a stored session (sessionRef). Blocking (SQLite)."""
+    summary = session_summary(session_id)
+    return int(summary["stored_bytes"] * MEMORY_EXPANSION_FACTOR) if summary else 0
+
+
+@contextlib.asynccontextmanager
+async def session_ref_reservation(session_ref: Optional[str], held: int = 0) -> AsyncIterator[None]:
+    """
+    `memory_reservation` for what a sessionRef request loads; a no-op without
+    one. `held`: the request's admission reservation (`reserved_bytes`).
+    """
+    if not session_ref or WORKER_MEMORY_BUDGET_BYTES <= 0:
+        yield
+        return
+
+    size = await asyncio.to_thread(estimate_stored_session_bytes, session_ref)
+    async with memory_reservation(size, f"session {session_ref}", held):
+        yield
+
+
+def reserved_bytes(scope: Dict[str, Any]) -> int:
+    """Bytes MemoryAdmissionMiddleware reserved for this request (0 if none)."""
+    return scope.get("state", {}).get("memory_reserved_bytes", 0)
+
+
+def estimate_request_bytes(content_length: Optional[int], produces_audio: bool) -> int:
+    """Estimated peak memory of a request from its body size."""
+    body = content_length if content_length is not None else UNKNOWN_BODY_ESTIMATE_BYTES
+    return int(body * MEMORY_EXPANSION_FACTOR) + (AUDIO_RESERVE_BYTES if produces_audio else 0)
+
+
+def _parsed_body_length(headers: Iterable[Tuple[bytes, bytes]]) -> Optional[int]:
+    """
+    Body bytes that will be parsed in memory: the Content-Length, except for
+    multipart uploads whose files are spooled to disk (unknown session size).
+    """
+    header_map = dict(headers)
+    if header_map.get(b"content-type", b"").startswith(b"multipart/"):
+        return None
+    try:
+        return int(header_map[b"content-length"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def _send_error(send, status: int, detail: str, retry_after: Optional[int] = None) -> None:
+    headers = [(b"content-type", b"application/json")]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": json.dumps({"detail": detail}).encode("utf-8")})
+
+
+class MemoryAdmissionMiddleware:
+    """ASGI middleware reserving memory for large requests before their body is read."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"] not in ADMISSION_CONTROLLED_PATHS \
+                or WORKER_MEMORY_BUDGET_BYTES <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        estimate = estimate_request_bytes(
+            _parsed_body_length(scope["headers"]), ADMISSION_CONTROLLED_PATHS[scope["path"]]
+        )
+
+        if estimate > _budget.budget_bytes:
+            _budget.rejected += 1
+            print(f"[Memory] ❌ Rejected {scope['path']}: needs ~{estimate / 1024 / 1024:.0f} MB, "
+                  f"budget is {_budget.budget_bytes / 1024 / 1024:.0f} MB")
+            await _send_error(send, 413, "Request too large for this worker's memory budget")
+            return
+
+        if not await _budget.acquire(estimate, ADMISSION_QUEUE_TIMEOUT_SECONDS):
+            print(f"[Memory] ⚠️  Shed {scope['path']} after {ADMISSION_QUEUE_TIMEOUT_SECONDS:.0f}s in queue "
+                  f"({_budget.in_use / 1024 / 1024:.0f} MB in use)")
+            await _send_error(send, 503, "Worker memory budget exhausted, retry later", retry_after=5)
+            return
+
+        # Read by session_ref_reservation, so the request never queues behind itself
+        scope.setdefault("state", {})["memory_reserved_bytes"] = estimate
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _budget.release(estimate)
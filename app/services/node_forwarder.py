@@ -1,23 +1,282 @@
-import requests
+"""
+Delivery of processed audio to the Node.js server, through a durable outbox.
+
+Deliveries are rows in the shared SQLite database (`node_outbox`), so they
+survive worker restarts. `enqueue_audio_delivery` only records the saved
+file's path; each worker runs `run_outbox_dispatcher` in its event loop,
+which claims due rows (leased, so one worker delivers each row) and posts
+them with a pooled httpx.AsyncClient:
+
+- the multipart body is streamed from the file on disk, never loaded whole
+- at most NODE_FORWARD_MAX_IN_FLIGHT deliveries per worker at once
+- every attempt carries the same `Idempotency-Key` (the delivery id), so
+  retries are safe for Node to de-duplicate
+- connection errors, timeouts, 408/429 and 5xx are retried with
+  exponential backoff and jitter (or Retry-After) up to
+  NODE_FORWARD_MAX_ATTEMPTS; other 4xx fail the delivery right away
+"""
+import asyncio
 import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.services.shared_cache import get_connection
 
 NODE_SERVER_URL = os.getenv("NODE_SERVER_URL") or "http://localhost:3000/api/test-audio"
+NODE_FORWARD_ENABLED = os.getenv("NODE_FORWARD_ENABLED", "0") == "1"
+NODE_FORWARD_MAX_IN_FLIGHT = int(os.getenv("NODE_FORWARD_MAX_IN_FLIGHT", "4"))
+NODE_FORWARD_MAX_ATTEMPTS = int(os.getenv("NODE_FORWARD_MAX_ATTEMPTS", "8"))
+NODE_FORWARD_BACKOFF_SECONDS = float(os.getenv("NODE_FORWARD_BACKOFF_SECONDS", "1"))
+NODE_FORWARD_BACKOFF_MAX_SECONDS = float(os.getenv("NODE_FORWARD_BACKOFF_MAX_SECONDS", "300"))
+NODE_FORWARD_TIMEOUT_SECONDS = float(os.getenv("NODE_FORWARD_TIMEOUT_SECONDS", "60"))
+# Upper bound on how long a due delivery enqueued by another worker waits
+NODE_FORWARD_POLL_SECONDS = float(os.getenv("NODE_FORWARD_POLL_SECONDS", "5"))
+NODE_OUTBOX_RETENTION_SECONDS = float(os.getenv("NODE_OUTBOX_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+_CHUNK_BYTES = 256 * 1024
+_RETRYABLE_STATUSES = {408, 425, 429}
+# A claimed row is handed to another worker if not settled within this time
+_LEASE_SECONDS = NODE_FORWARD_TIMEOUT_SECONDS * 2 + 30
 
+_schema_ready = False
+_schema_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
 
-def send_audio_to_node(audio_bytes: bytes, text: str):
+
+def _db() -> sqlite3.Connection:
+    global _schema_ready
+    conn = get_connection()
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS node_outbox (
+                    id TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    session_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    lease_until REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS node_outbox_due ON node_outbox (status, next_attempt_at)")
+            _schema_ready = True
+    return conn
+
+
+def enqueue_audio_delivery(file_path: str, text: str, session_id: str) -> str:
     """
-    Sends audio + cleaned text to Node.
+    Record a delivery of a saved audio file (+ its script) to Node.
+    Returns the delivery id, also sent as the Idempotency-Key.
     """
+    delivery_id = uuid.uuid4().hex
+    now = time.time()
+    _db().execute(
+        "INSERT INTO node_outbox (id, file_path, text, session_id, status, next_attempt_at, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)",
+        (delivery_id, str(file_path), text, session_id, now, now, now),
+    )
+    print(f"[Node Forwarder] Queued delivery {delivery_id[:8]} for session {session_id}")
+
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+    return delivery_id
+
+
+def outbox_stats() -> Dict[str, Any]:
+    """Delivery counts by status (all workers)."""
+    rows = _db().execute("SELECT status, COUNT(*) FROM node_outbox GROUP BY status").fetchall()
+    return {"enabled": NODE_FORWARD_ENABLED, "url": NODE_SERVER_URL, **{status: count for status, count in rows}}
+
+
+def _claim_due(limit: int) -> List[Dict[str, Any]]:
+    """Lease up to `limit` due deliveries (including ones whose worker died mid-delivery)."""
+    conn = _db()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            "SELECT id, file_path, text, session_id, attempts FROM node_outbox "
+            "WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'delivering' AND lease_until < ?) "
+            "ORDER BY next_attempt_at LIMIT ?",
+            (now, now, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE node_outbox SET status = 'delivering', lease_until = ?, updated_at = ? WHERE id = ?",
+            [(now + _LEASE_SECONDS, now, row[0]) for row in rows],
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return [
+        {"id": row[0], "file_path": row[1], "text": row[2], "session_id": row[3], "attempts": row[4]}
+        for row in rows
+    ]
+
+
+def _seconds_until_due() -> float:
+    row = _db().execute("SELECT MIN(next_attempt_at) FROM node_outbox WHERE status = 'pending'").fetchone()
+    if row[0] is None:
+        return NODE_FORWARD_POLL_SECONDS
+    return min(NODE_FORWARD_POLL_SECONDS, max(0.0, row[0] - time.time()))
+
+
+def _settle(delivery_id: str, status: str, attempts: int, error: Optional[str] = None,
+            retry_in: float = 0.0) -> None:
+    now = time.time()
+    _db().execute(
+        "UPDATE node_outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?, "
+        "lease_until = NULL, updated_at = ? WHERE id = ?",
+        (status, attempts, error, now + retry_in, now, delivery_id),
+    )
+
+
+def _purge_delivered() -> int:
+    cursor = _db().execute(
+        "DELETE FROM node_outbox WHERE status = 'delivered' AND updated_at < ?",
+        (time.time() - NODE_OUTBOX_RETENTION_SECONDS,),
+    )
+    return cursor.rowcount
+
+
+def _backoff_seconds(attempts: int, retry_after: Optional[str] = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), NODE_FORWARD_BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    # Full jitter, so workers don't retry a recovering server in lockstep
+    return random.uniform(0, min(NODE_FORWARD_BACKOFF_MAX_SECONDS, NODE_FORWARD_BACKOFF_SECONDS * 2 ** attempts))
+
+
+def _multipart_parts(boundary: str, delivery: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """(head, tail) of the multipart body around the audio file's bytes."""
+    filename = Path(delivery["file_path"]).name
+    media_type = "audio/wav" if filename.endswith(".wav") else "audio/mpeg"
+    head = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="text"\r\n\r\n{delivery["text"]}\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="sessionId"\r\n\r\n{delivery["session_id"]}\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="{filename}"\r\n'
+        f'Content-Type: {media_type}\r\n\r\n'
+    ).encode("utf-8")
+    return head, f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+
+async def _stream_body(head: bytes, file_path: str, tail: bytes) -> AsyncIterator[bytes]:
+    yield head
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, _CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    yield tail
+
+
+async def _deliver(client: httpx.AsyncClient, delivery: Dict[str, Any]) -> None:
+    delivery_id = delivery["id"]
+    attempts = delivery["attempts"] + 1
+
+    try:
+        size = os.path.getsize(delivery["file_path"])
+    except OSError as e:
+        print(f"[Node Forwarder] ❌ Delivery {delivery_id[:8]} failed: audio file is gone ({str(e)})")
+        await asyncio.to_thread(_settle, delivery_id, "failed", attempts, f"file missing: {str(e)}")
+        return
+
+    boundary = uuid.uuid4().hex
+    head, tail = _multipart_parts(boundary, delivery)
+    error: Optional[str] = None
+    retry_after: Optional[str] = None
+    retryable = True
+
     try:
-        print("[Python] Sending audio to Node.js server...")
-        files = {
-            "audio": ("output.mp3", audio_bytes, "audio/mpeg")
-        }
+        response = await client.post(
+            NODE_SERVER_URL,
+            content=_stream_body(head, delivery["file_path"], tail),
+            headers={
+                "Content-Type": f"multipart/form-data; boundary={boundary}",
+                "Content-Length": str(len(head) + size + len(tail)),
+                "Idempotency-Key": delivery_id,
+            },
+        )
+        if response.is_success:
+            print(f"[Node Forwarder] ✅ Delivered {delivery_id[:8]} ({size} bytes, attempt {attempts})")
+            await asyncio.to_thread(_settle, delivery_id, "delivered", attempts)
+            return
+        error = f"HTTP {response.status_code}: {response.text[:200]}"
+        retryable = response.status_code >= 500 or response.status_code in _RETRYABLE_STATUSES
+        retry_after = response.headers.get("retry-after")
+    except httpx.TransportError as e:
+        error = f"{type(e).__name__}: {str(e)}"
+
+    if retryable and attempts < NODE_FORWARD_MAX_ATTEMPTS:
+        delay = _backoff_seconds(attempts, retry_after)
+        print(f"[Node Forwarder] ⚠️  Delivery {delivery_id[:8]} attempt {attempts} failed ({error}), "
+              f"retrying in {delay:.1f}s")
+        await asyncio.to_thread(_settle, delivery_id, "pending", attempts, error, delay)
+    else:
+        print(f"[Node Forwarder] ❌ Delivery {delivery_id[:8]} failed after {attempts} attempt(s): {error}")
+        await asyncio.to_thread(_settle, delivery_id, "failed", attempts, error)
+
+
+async def run_outbox_dispatcher() -> None:
+    """Deliver due outbox rows until cancelled (one per worker, started in the lifespan)."""
+    global _loop, _wakeup
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    in_flight: set = set()
+    purged_at = 0.0
+
+    limits = httpx.Limits(max_connections=NODE_FORWARD_MAX_IN_FLIGHT,
+                          max_keepalive_connections=NODE_FORWARD_MAX_IN_FLIGHT)
+    async with httpx.AsyncClient(timeout=NODE_FORWARD_TIMEOUT_SECONDS, limits=limits) as client:
+        print(f"[Node Forwarder] Dispatching to {NODE_SERVER_URL} "
+              f"(max {NODE_FORWARD_MAX_IN_FLIGHT} in flight)")
+        try:
+            while True:
+                try:
+                    if time.time() - purged_at > 3600:
+                        await asyncio.to_thread(_purge_delivered)
+                        purged_at = time.time()
 
-        data = {"text": text}
+                    free = NODE_FORWARD_MAX_IN_FLIGHT - len(in_flight)
+                    for delivery in (await asyncio.to_thread(_claim_due, free) if free > 0 else []):
+                        task = asyncio.create_task(_deliver(client, delivery))
+                        in_flight.add(task)
+                        task.add_done_callback(in_flight.discard)
+                        # A freed slot may pick up the next due delivery right away
+                        task.add_done_callback(lambda _: _wakeup.set())
 
-        response = requests.post(NODE_SERVER_URL, data=data, files=files)
-        return response.json()
+                    # With every slot busy, a finishing delivery wakes the loop
+                    wait = (await asyncio.to_thread(_seconds_until_due)
+                            if len(in_flight) < NODE_FORWARD_MAX_IN_FLIGHT else NODE_FORWARD_POLL_SECONDS)
+                except sqlite3.Error as e:
+                    print(f"[Node Forwarder] ⚠️  Outbox unavailable: {str(e)}")
+                    wait = NODE_FORWARD_POLL_SECONDS
 
-    except Exception as e:
-        return {"error": f"Failed to send audio to Node: {str(e)}"}
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                _wakeup.clear()
+        finally:
+            # Interrupted deliveries keep their lease and are retried after it expires
+            for task in in_flight:
+                task.cancel()
+            _loop = _wakeup = None
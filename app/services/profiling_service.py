@@ -0,0 +1,190 @@
+"""
+Opt-in sampling profiler with speedscope export.
+
+Off by default: unless PROFILING_ENABLED=1, nothing is started and the only
+cost is a flag check per request.
+
+- Per request: send `X-Profile: 1` (or `?profile=1`). The thread running the
+  pipeline is sampled every PROFILE_INTERVAL_MS and the profile is written
+  next to the recordings as `profile_<session>_<ts>.speedscope.json`
+  (indexed as a session artifact).
+- Periodic: with PROFILE_PERIODIC_SECONDS > 0, every thread in the worker is
+  sampled for PROFILE_PERIODIC_WINDOW_SECONDS once per period, written to
+  PROFILE_DIR.
+
+The sampler is a daemon thread reading `sys._current_frames()`, so the
+profiled code is not instrumented. Open the files at https://www.speedscope.app.
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.services.storage_service import write_artifact
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+PROFILE_PERIODIC_SECONDS = float(os.getenv("PROFILE_PERIODIC_SECONDS", "0"))
+PROFILE_PERIODIC_WINDOW_SECONDS = float(os.getenv("PROFILE_PERIODIC_WINDOW_SECONDS", "10"))
+
+_Frame = Tuple[str, str, int]
+
+_periodic_thread: Optional[threading.Thread] = None
+
+
+class SamplingProfiler:
+    """Samples the stacks of the given threads (or all others) at a fixed interval."""
+
+    def __init__(self, name: str, thread_ids: Optional[Set[int]] = None,
+                 interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.name = name
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.frames: Dict[_Frame, int] = {}
+        self.samples: Dict[int, List[Tuple[List[int], float]]] = {}
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_qualname, code.co_filename, code.co_firstlineno)
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def _sample(self, weight: float) -> None:
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.setdefault(thread_id, []).append((stack, weight))
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(now - last)
+            last = now
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        """Speedscope file (one sampled profile per thread)."""
+        frames = [{"name": name, "file": file, "line": line} for name, file, line in self.frames]
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        profiles = []
+        for thread_id, samples in self.samples.items():
+            total = sum(weight for _, weight in samples)
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self.name} [{thread_names.get(thread_id, thread_id)}]",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": [stack for stack, _ in samples],
+                "weights": [weight for _, weight in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": self.name,
+            "exporter": "productai-sampling-profiler",
+        }
+
+
+def profiling_requested(headers: Any, query_params: Any) -> bool:
+    """Whether a request asked to be profiled (always False unless enabled)."""
+    if not PROFILING_ENABLED:
+        return False
+    flag = headers.get("x-profile") or query_params.get("profile") or ""
+    return flag.lower() in ("1", "true")
+
+
+@contextlib.contextmanager
+def profile_current_thread(name: str, enabled: bool = True) -> Iterator[Optional[SamplingProfiler]]:
+    """Sample the calling thread for the duration of the block (yields None when disabled)."""
+    if not enabled:
+        yield None
+        return
+
+    profiler = SamplingProfiler(name, {threading.get_ident()}).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def _encode(profiler: SamplingProfiler) -> bytes:
+    return json.dumps(profiler.to_speedscope(), separators=(",", ":")).encode("utf-8")
+
+
+def save_request_profile(profiler: SamplingProfiler, directory: str, session_id: str) -> str:
+    """Write a request profile next to the session's recordings. Returns the filename."""
+    filename = f"profile_{session_id}_{int(time.time() * 1000)}.speedscope.json"
+    write_artifact(directory, filename, _encode(profiler), session_id, kind="profile")
+    sample_count = sum(len(s) for s in profiler.samples.values())
+    print(f"[Profiler] 🔥 {sample_count} samples over {profiler.stopped_at - profiler.started_at:.2f}s "
+          f"written to {filename}")
+    return filename
+
+
+def profile_call(name: str, fn: Callable, *args: Any) -> Tuple[Any, str]:
+    """Run `fn(*args)` under the profiler; the profile goes to PROFILE_DIR. Returns (result, path)."""
+    with profile_current_thread(name) as profiler:
+        result = fn(*args)
+    path = Path(PROFILE_DIR) / f"profile_{int(time.time() * 1000)}_{os.getpid()}.speedscope.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(_encode(profiler))
+    print(f"[Profiler] 🔥 {name} profile written to {path}")
+    return result, str(path)
+
+
+def _periodic_loop() -> None:
+    while True:
+        time.sleep(PROFILE_PERIODIC_SECONDS)
+        profiler = SamplingProfiler(f"worker {os.getpid()} (periodic)").start()
+        time.sleep(PROFILE_PERIODIC_WINDOW_SECONDS)
+        profiler.stop()
+        if not profiler.samples:
+            continue
+        try:
+            path = Path(PROFILE_DIR) / f"periodic_{os.getpid()}_{int(time.time())}.speedscope.json"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(_encode(profiler))
+            print(f"[Profiler] Periodic profile written to {path}")
+        except OSError as e:
+            print(f"[Profiler] ⚠️  Failed to write periodic profile: {str(e)}")
+
+
+def start_periodic_profiler() -> None:
+    """Start periodic whole-process sampling, if enabled and configured."""
+    global _periodic_thread
+    if not PROFILING_ENABLED or PROFILE_PERIODIC_SECONDS <= 0 or _periodic_thread is not None:
+        return
+    _periodic_thread = threading.Thread(target=_periodic_loop, name="periodic-profiler", daemon=True)
+    _periodic_thread.start()
+    print(f"[Profiler] Periodic sampling: {PROFILE_PERIODIC_WINDOW_SECONDS:.0f}s every "
+          f"{PROFILE_PERIODIC_SECONDS:.0f}s, written to {PROFILE_DIR}")
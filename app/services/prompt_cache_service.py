@@ -0,0 +1,210 @@
+"""
+Static prompt prefixes and Gemini context caching.
+
+Every Gemini prompt is built as a static instruction prefix (role, TASK,
+OUTPUT RULES - identical for every request) followed by the per-request
+suffix (transcript, DOM context). Keeping the prefix first lets the
+provider reuse its tokens across requests:
+
+- Always: the prefix is sent first, so Gemini's implicit prefix caching
+  can apply.
+- GEMINI_CONTEXT_CACHE_ENABLED=1: the prefix is created once as a cached
+  content (system instruction) per model and only the suffix is sent with
+  each request. Handles are shared by workers through the shared cache and
+  their TTL is extended when less than GEMINI_CONTEXT_CACHE_REFRESH_SECONDS
+  is left. Prefixes the provider refuses to cache (e.g. below its minimum
+  token count) are sent inline instead.
+
+The full prompt text (`join_prompt`) stays the identity of a call for the
+script cache and capture/replay.
+"""
+import datetime
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from app.services.shared_cache import cache_get_json, cache_set_json, make_cache_key
+
+GEMINI_CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "0") == "1"
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+GEMINI_CONTEXT_CACHE_REFRESH_SECONDS = float(os.getenv("GEMINI_CONTEXT_CACHE_REFRESH_SECONDS", "300"))
+# After a failed create, send the prefix inline for this long before retrying
+GEMINI_CONTEXT_CACHE_RETRY_SECONDS = float(os.getenv("GEMINI_CONTEXT_CACHE_RETRY_SECONDS", "60"))
+
+# prefix key -> {"name": cached content name, "expires_at": epoch} or {"inline_until": epoch}
+_handles: Dict[str, Dict[str, Any]] = {}
+_models: Dict[str, genai.GenerativeModel] = {}
+# Prefix keys whose handle a thread is creating/refreshing right now
+_in_flight: Set[str] = set()
+_lock = threading.Lock()
+_stats = {
+    "calls": 0,
+    "cached_calls": 0,
+    "caches_created": 0,
+    "caches_refreshed": 0,
+    "create_failures": 0,
+    "prompt_tokens": 0,
+    "cached_tokens": 0,
+}
+
+
+def join_prompt(prefix: str, suffix: str) -> str:
+    """The full prompt as sent when the prefix is not cached."""
+    return f"{prefix}\n\n{suffix}"
+
+
+def prompt_cache_stats() -> Dict[str, Any]:
+    return {
+        "enabled": GEMINI_CONTEXT_CACHE_ENABLED,
+        "cached_prefixes": sum(1 for handle in _handles.values() if "name" in handle),
+        **_stats,
+    }
+
+
+def _create_handle(model_name: str, prefix: str, key: str) -> Dict[str, Any]:
+    try:
+        cached = genai.caching.CachedContent.create(
+            model=model_name,
+            display_name=f"prefix-{key[:16]}",
+            system_instruction=prefix,
+            ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL_SECONDS),
+        )
+    except google_exceptions.BadRequest as e:
+        # Too small or otherwise uncacheable: this won't change until the prefix does
+        print(f"[Prompt Cache] Prefix for {model_name} not cacheable, sending inline: {str(e)}")
+        _stats["create_failures"] += 1
+        return {"inline_until": time.time() + GEMINI_CONTEXT_CACHE_TTL_SECONDS}
+    except Exception as e:
+        print(f"[Prompt Cache] ⚠️  Failed to create cached content for {model_name}: {str(e)}")
+        _stats["create_failures"] += 1
+        return {"inline_until": time.time() + GEMINI_CONTEXT_CACHE_RETRY_SECONDS}
+
+    _stats["caches_created"] += 1
+    _models[cached.name] = genai.GenerativeModel.from_cached_content(cached)
+    print(f"[Prompt Cache] ♻️  Cached {model_name} prompt prefix as {cached.name} "
+          f"for {GEMINI_CONTEXT_CACHE_TTL_SECONDS:.0f}s")
+    return {"name": cached.name, "expires_at": time.time() + GEMINI_CONTEXT_CACHE_TTL_SECONDS}
+
+
+def _refresh_handle(handle: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Extend a handle's TTL. Returns None when the cached content is gone."""
+    try:
+        cached = genai.caching.CachedContent.get(handle["name"])
+        cached.update(ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL_SECONDS))
+    except Exception as e:
+        print(f"[Prompt Cache] Cached content {handle['name']} could not be refreshed: {str(e)}")
+        return None
+    _stats["caches_refreshed"] += 1
+    _models[cached.name] = genai.GenerativeModel.from_cached_content(cached)
+    return {"name": handle["name"], "expires_at": time.time() + GEMINI_CONTEXT_CACHE_TTL_SECONDS}
+
+
+def _bind_shared_handle(handle: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Bind a model to a handle created by another worker. Returns None when it is gone."""
+    try:
+        _models[handle["name"]] = genai.GenerativeModel.from_cached_content(handle["name"])
+    except Exception as e:
+        print(f"[Prompt Cache] Cached content {handle['name']} unavailable: {str(e)}")
+        return None
+    return handle
+
+
+def _cached_model(model_name: str, prefix: str) -> Optional[genai.GenerativeModel]:
+    """
+    Model bound to the cached prefix, creating or refreshing it as needed.
+
+    Only the dict lookups and updates hold `_lock`. Provider calls (create,
+    refresh, bind) run outside it, by one thread per prefix (in-flight
+    marker); meanwhile other callers keep using the current handle, or send
+    the prefix inline when there is none yet, instead of waiting.
+    """
+    key = make_cache_key(model_name, prefix)
+
+    with _lock:
+        handle = _handles.get(key)
+    if handle is None:
+        handle = cache_get_json("gemini_context", key)
+    now = time.time()
+
+    if handle and "inline_until" in handle:
+        if handle["inline_until"] > now:
+            return None
+        handle = None
+
+    model = _models.get(handle["name"]) if handle else None
+    if model is not None and handle["expires_at"] - now >= GEMINI_CONTEXT_CACHE_REFRESH_SECONDS:
+        return model
+
+    with _lock:
+        if key in _in_flight:
+            # Another thread is creating/refreshing this prefix
+            return model if handle and handle["expires_at"] > now else None
+        current = _handles.get(key)
+        if current and current.get("name") in _models and current != handle:
+            # Finished by another thread since the lookup above
+            return _models[current["name"]]
+        _in_flight.add(key)
+
+    try:
+        if handle and handle["expires_at"] - now < GEMINI_CONTEXT_CACHE_REFRESH_SECONDS:
+            handle = _refresh_handle(handle) if handle["expires_at"] > now else None
+        elif handle and model is None:
+            handle = _bind_shared_handle(handle)
+        if handle is None:
+            handle = _create_handle(model_name, prefix, key)
+
+        with _lock:
+            changed = handle != _handles.get(key)
+            _handles[key] = handle
+        if changed:
+            lifetime = handle.get("expires_at", handle.get("inline_until")) - now
+            cache_set_json("gemini_context", key, handle, max(1.0, lifetime))
+    finally:
+        with _lock:
+            _in_flight.discard(key)
+    return _models.get(handle.get("name"))
+
+
+def _record_usage(response: Any) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        _stats["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+        _stats["cached_tokens"] += getattr(usage, "cached_content_token_count", 0) or 0
+
+
+def _forget_handle(model_name: str, prefix: str) -> None:
+    key = make_cache_key(model_name, prefix)
+    with _lock:
+        handle = _handles.pop(key, None)
+        if handle and "name" in handle:
+            _models.pop(handle["name"], None)
+    cache_set_json("gemini_context", key, None, 1.0)
+
+
+def generate_text(model: genai.GenerativeModel, model_name: str, prefix: str, suffix: str) -> str:
+    """
+    Generate text for a static prefix + per-request suffix with `model`
+    (or the model bound to the cached prefix when context caching is on).
+    """
+    _stats["calls"] += 1
+
+    if GEMINI_CONTEXT_CACHE_ENABLED:
+        cached_model = _cached_model(model_name, prefix)
+        if cached_model is not None:
+            try:
+                response = cached_model.generate_content(suffix)
+                _stats["cached_calls"] += 1
+                _record_usage(response)
+                return response.text
+            except (google_exceptions.NotFound, google_exceptions.Forbidden) as e:
+                # Expired or deleted provider-side: recreate on the next call
+                print(f"[Prompt Cache] Cached prefix unavailable, sending inline: {str(e)}")
+                _forget_handle(model_name, prefix)
+
+    response = model.generate_content(join_prompt(prefix, suffix))
+    _record_usage(response)
+    return response.text
@@ -37,6 +37,45 @@ def build_rag_context_from_events(session: RecordingSession) -> str:
     return "\n".join(context_parts)
 
 
+def build_step_contexts(events: List[InteractionEvent], max_events_per_step: int = 40) -> List[Dict]:
+    """
+    Group events into steps, each with its own bounded context, so steps can
+    be narrated independently.
+
+    Steps with more than `max_events_per_step` described events keep the
+    first and last half of them, with the number of omitted actions noted.
+
+    Returns:
+        List of dicts with step_number, start_ms, end_ms, event_count and context
+    """
+    step_contexts = []
+
+    for step_num, step in enumerate(_group_events_into_steps(events), 1):
+        described = [event for event in step["events"] if _describe_event(event)]
+        omitted = 0
+        if len(described) > max_events_per_step:
+            half = max_events_per_step // 2
+            omitted = len(described) - 2 * half
+            described = described[:half] + described[-half:]
+
+        context = _build_step_context(step_num, {**step, "events": described})
+        if omitted:
+            # One line per event after the step header: note the gap in the middle
+            lines = context.split("\n")
+            lines.insert(1 + max_events_per_step // 2, f"  ... ({omitted} more actions)")
+            context = "\n".join(lines)
+
+        step_contexts.append({
+            "step_number": step_num,
+            "start_ms": step["startTime"],
+            "end_ms": step["endTime"],
+            "event_count": len(step["events"]),
+            "context": context,
+        })
+
+    return step_contexts
+
+
 def _group_events_into_steps(events: List[InteractionEvent]) -> List[Dict]:
     """
     Group events into logical steps with timing information.
@@ -48,7 +87,7 @@ def _group_events_into_steps(events: List[InteractionEvent]) -> List[Dict]:
     current_step = {
         "stepNumber": 1,
         "startTime": events[0].timestamp,
-        "endTime": events[0].timestamp,
+        "endTime": _event_end(events[0]),
         "events": [events[0]]
     }
     
@@ -61,19 +100,19 @@ def _group_events_into_steps(events: List[InteractionEvent]) -> List[Dict]:
         # If there's a significant gap or step_change event, start new step
         if time_gap > STEP_THRESHOLD_MS or event.type == "step_change":
             # Finalize current step
-            current_step["endTime"] = events[i-1].timestamp
+            current_step["endTime"] = _event_end(events[i-1])
             steps.append(current_step)
             
             # Start new step
             current_step = {
                 "stepNumber": len(steps) + 1,
                 "startTime": event.timestamp,
-                "endTime": event.timestamp,
+                "endTime": _event_end(event),
                 "events": [event]
             }
         else:
             current_step["events"].append(event)
-            current_step["endTime"] = event.timestamp
+            current_step["endTime"] = _event_end(event)
     
     # Add final step
     if current_step["events"]:
@@ -82,6 +121,11 @@ def _group_events_into_steps(events: List[InteractionEvent]) -> List[Dict]:
     return steps
 
 
+def _event_end(event: InteractionEvent) -> int:
+    """Last timestamp covered by an event (coalesced events span a range)."""
+    return event.endTimestamp if event.endTimestamp is not None else event.timestamp
+
+
 def _build_step_context(step_num: int, step: Dict) -> str:
     """
     Build context description for a single step.
@@ -137,9 +181,12 @@ def _describe_event(event: InteractionEvent) -> str:
         return "Left input field"
     
     elif event.type == "scroll":
+        span = ""
+        if event.endTimestamp is not None and event.endTimestamp > event.timestamp:
+            span = f" over {(event.endTimestamp - event.timestamp) / 1000.0:.1f}s"
         if event.metadata.scrollPosition:
-            return f"Scrolled to position ({event.metadata.scrollPosition.x}, {event.metadata.scrollPosition.y})"
-        return "Scrolled page"
+            return f"Scrolled to position ({event.metadata.scrollPosition.x}, {event.metadata.scrollPosition.y}){span}"
+        return f"Scrolled page{span}"
     
     elif event.type == "step_change":
         return "Page/UI state changed"
@@ -0,0 +1,213 @@
+"""
+Incremental regeneration after a transcript edit or a trim.
+
+Instead of reprocessing a recording from scratch, an edit is diffed against
+the previous per-step narration (concurrent_steps):
+
+1. An edited transcript is aligned onto the word timings (token diff
+   against the words' punctuated text), then a trim is applied locally:
+   events and words inside the cut are dropped, later ones move back by
+   the cut length
+2. Steps and their transcript parts are rebuilt (local, cheap) and
+   fingerprinted without step numbers or timestamps, so steps only shifted
+   by a trim keep their identity
+3. Only steps whose fingerprint changed are narrated again by Gemini
+4. The audio is rendered sentence by sentence through the shared audio
+   cache, so only sentences that changed go to TTS
+
+The Gemini and TTS work is proportional to the steps and sentences the edit
+touched; everything else is reused. With `sessionRef`, the session,
+transcript, words and previous steps come from the session store, and every
+result is stored (trimmed session, edited transcript and words, steps) as
+the next baseline.
+"""
+import difflib
+import string
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.dom_event_models import RecordingSession
+from app.models.request_models import AudioTarget, NarrationRegenerationRequest, RecordingTrim
+from app.services.elevenlabs_service import chunk_by_sentence
+from app.services.session_store import load_session, store_session, store_steps
+from app.services.synced_narration_service import generate_concurrent_step_narration
+from app.services.voice_fanout_service import save_renditions
+
+
+def apply_trim(
+    session: RecordingSession,
+    words: Optional[List[Dict[str, Any]]],
+    trim: RecordingTrim
+) -> Tuple[RecordingSession, Optional[List[Dict[str, Any]]]]:
+    """
+    Cut [trim.start_ms, trim.end_ms) out of the recording's events and word
+    timings. Returns new objects; the inputs are left untouched.
+    """
+    cut_start, cut_end = max(trim.start_ms, 0), max(trim.end_ms, trim.start_ms, 0)
+    cut = cut_end - cut_start
+
+    def shift(timestamp: int) -> int:
+        if timestamp >= cut_end:
+            return timestamp - cut
+        return min(timestamp, cut_start)
+
+    events = []
+    for event in session.events:
+        if cut_start <= event.timestamp < cut_end:
+            continue
+        update = {"timestamp": shift(event.timestamp)}
+        if event.endTimestamp is not None:
+            update["endTimestamp"] = shift(event.endTimestamp)
+        events.append(event.model_copy(update=update))
+
+    trimmed_session = session.model_copy(update={
+        "events": events,
+        "endTime": max(session.endTime - cut, session.startTime),
+    })
+
+    if words is None:
+        return trimmed_session, None
+
+    cut_start_s, cut_end_s, cut_s = cut_start / 1000.0, cut_end / 1000.0, cut / 1000.0
+    trimmed_words = [
+        {**word, "start": word["start"] - cut_s, "end": word.get("end", word["start"]) - cut_s}
+        if word.get("start", 0.0) >= cut_end_s else word
+        for word in words
+        if not cut_start_s <= word.get("start", 0.0) < cut_end_s
+    ]
+    return trimmed_session, trimmed_words
+
+
+def align_transcript(raw_text: str, words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Carry a transcript edit over to the word timings the steps are split by.
+
+    `raw_text` is token-diffed against the words' punctuated text: unchanged
+    words keep their timing, removed ones are dropped, replacement tokens
+    share the time span of the words they replace and inserted tokens get a
+    zero-length timing where they were inserted.
+    """
+    tokens = raw_text.split()
+    spoken = [word.get("punctuated_word") or word.get("word", "") for word in words]
+    if tokens == spoken:
+        return words
+
+    aligned = []
+    matcher = difflib.SequenceMatcher(None, spoken, tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            aligned.extend(words[i1:i2])
+            continue
+        if tag == "delete":
+            continue
+        if i2 > i1:
+            start = words[i1].get("start", 0.0)
+            end = max(words[i2 - 1].get("end", words[i2 - 1].get("start", 0.0)), start)
+        elif i1 > 0:
+            start = end = words[i1 - 1].get("end", words[i1 - 1].get("start", 0.0))
+        elif words:
+            start = end = words[0].get("start", 0.0)
+        else:
+            start = end = 0.0
+        span = (end - start) / (j2 - j1)
+        for k, token in enumerate(tokens[j1:j2]):
+            aligned.append({
+                "word": token.strip(string.punctuation).lower() or token,
+                "punctuated_word": token,
+                "start": start + k * span,
+                "end": start + (k + 1) * span,
+            })
+    return aligned
+
+
+def remember_narration(
+    raw_text: str,
+    session: RecordingSession,
+    words: Optional[List[Dict[str, Any]]],
+    steps: List[Dict[str, Any]]
+) -> None:
+    """Store a narrated session and its steps, for regeneration by sessionRef."""
+    store_session(
+        session.sessionId,
+        session=session,
+        transcript=raw_text,
+        deepgram={"words": words} if words is not None else None,
+    )
+    store_steps(session.sessionId, steps)
+
+
+def _hydrate(payload: NarrationRegenerationRequest) -> None:
+    """Fill what a sessionRef request left out from the session store."""
+    stored = load_session(payload.sessionRef)
+    sent = payload.model_fields_set
+    if payload.session is None:
+        payload.session = stored["session"]
+    if "raw_text" not in sent:
+        payload.raw_text = stored["transcript"] or ""
+    if payload.words is None and stored["deepgram"]:
+        # An edited raw_text is aligned onto these timings (align_transcript)
+        payload.words = stored["deepgram"].get("words")
+    if "previous_steps" not in sent:
+        payload.previous_steps = stored["steps"] or []
+    if payload.session is None:
+        raise ValueError(f"No session stored for {payload.sessionRef}")
+
+
+def regenerate_narration(payload: NarrationRegenerationRequest) -> Dict[str, Any]:
+    """
+    Apply an edit to a narrated recording, regenerating only what it affects.
+
+    Blocking: call from a worker thread when running inside the event loop.
+    """
+    start = time.perf_counter()
+    if payload.sessionRef:
+        _hydrate(payload)
+    session, words, raw_text = payload.session, payload.words, payload.raw_text
+    if words:
+        # Steps are split by word timings: without this an edit-only change is lost
+        words = align_transcript(raw_text, words)
+
+    trimmed_ms = 0
+    if payload.trim is not None:
+        session, words = apply_trim(session, words, payload.trim)
+        trimmed_ms = max(payload.trim.end_ms - max(payload.trim.start_ms, 0), 0)
+        if words is not None:
+            raw_text = " ".join(
+                word.get("punctuated_word") or word.get("word", "") for word in words
+            )
+        print(f"[Regeneration] Trimmed {trimmed_ms}ms: "
+              f"{len(payload.session.events)} → {len(session.events)} events")
+
+    result = generate_concurrent_step_narration(raw_text, session, words, payload.previous_steps)
+    # The edited/trimmed state is the baseline of the next sessionRef regeneration
+    remember_narration(raw_text, session, words, result["steps"])
+
+    previous_sentences = {
+        sentence
+        for step in payload.previous_steps if step.get("narration")
+        for sentence in chunk_by_sentence(step["narration"])
+    }
+    sentences = chunk_by_sentence(result["narration"])
+    changed_sentences = sum(1 for sentence in sentences if sentence not in previous_sentences)
+
+    result["regeneration"] = {
+        "steps": len(result["steps"]),
+        "reused_steps": result.get("reused_steps", 0),
+        "regenerated_steps": len(result["steps"]) - result.get("reused_steps", 0),
+        "sentences": len(sentences),
+        "changed_sentences": changed_sentences,
+        "trimmed_ms": trimmed_ms,
+    }
+
+    if payload.recordingsPath and result["narration"] and not result.get("error"):
+        result["renditions"] = save_renditions(
+            result["narration"], payload.targets or [AudioTarget()], payload.recordingsPath, session.sessionId
+        )
+        result["processed_audio_filename"] = result["renditions"][0]["processed_audio_filename"]
+
+    regeneration = result["regeneration"]
+    regeneration["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"[Regeneration] ✅ {regeneration['regenerated_steps']}/{len(result['steps'])} steps "
+          f"and {changed_sentences}/{len(sentences)} sentences regenerated "
+          f"in {regeneration['seconds']:.2f}s")
+    return result
@@ -0,0 +1,188 @@
+"""
+Content negotiation and streaming serialization for large responses.
+
+- Format (`Accept`): JSON by default, MessagePack for `application/msgpack`.
+  Without the msgpack package, a request accepting only MessagePack gets a
+  406 rather than JSON it can't decode.
+- Compression (`Accept-Encoding`): brotli (when installed) or gzip, only
+  once the body reaches RESPONSE_COMPRESSION_MIN_BYTES.
+
+Bodies are produced as a stream of chunks: dicts are written key by key and
+long lists in batches of _STREAM_BATCH_ITEMS, so a multi-MB response is
+never held as one string. Bodies below the threshold are sent as a plain
+response with a Content-Length.
+"""
+import os
+import zlib
+from typing import Any, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import Response, StreamingResponse
+
+from app.services.dom_event_service import render_json
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: JSON only
+    msgpack = None
+
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "65536"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+_STREAM_BATCH_ITEMS = 256
+# Chunks are coalesced into writes of at least this size
+_STREAM_CHUNK_BYTES = 65536
+
+
+def _accepted(header: str) -> List[Tuple[str, float]]:
+    """(value, q) pairs of an Accept / Accept-Encoding header."""
+    accepted = []
+    for item in header.split(","):
+        value, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, number = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        if value:
+            accepted.append((value.strip().lower(), q))
+    return accepted
+
+
+def negotiate_media_type(accept: str) -> Optional[str]:
+    """
+    application/msgpack when asked for (and available), else
+    application/json. None when only MessagePack is acceptable but the
+    msgpack package is missing.
+    """
+    accepted = [(value, q) for value, q in _accepted(accept) if q > 0]
+    for value, q in sorted(accepted, key=lambda pair: -pair[1]):
+        if value in MSGPACK_MEDIA_TYPES and msgpack is not None:
+            return "application/msgpack"
+        if value in ("application/json", "application/*", "*/*"):
+            return "application/json"
+    if msgpack is None and any(value in MSGPACK_MEDIA_TYPES for value, _ in accepted):
+        return None
+    return "application/json"
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred supported content coding ("br" or "gzip"), or None for identity."""
+    accepted = {value: q for value, q in _accepted(accept_encoding)}
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    candidates = [
+        coding for coding in supported
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda coding: accepted.get(coding, accepted.get("*", 0.0)))
+
+
+def iter_json(value: Any) -> Iterator[bytes]:
+    """JSON encoding of `value` as chunks (same bytes as render_json)."""
+    if isinstance(value, dict):
+        yield b"{"
+        for index, (key, item) in enumerate(value.items()):
+            yield (b"," if index else b"") + render_json(str(key)) + b":"
+            yield from iter_json(item)
+        yield b"}"
+    elif isinstance(value, list) and len(value) > _STREAM_BATCH_ITEMS:
+        yield b"["
+        for start in range(0, len(value), _STREAM_BATCH_ITEMS):
+            # A batch rendered as a list, without its brackets
+            yield (b"," if start else b"") + render_json(value[start:start + _STREAM_BATCH_ITEMS])[1:-1]
+        yield b"]"
+    else:
+        yield render_json(value)
+
+
+def iter_msgpack(value: Any, packer: Any = None) -> Iterator[bytes]:
+    """MessagePack encoding of `value` as chunks."""
+    packer = packer or msgpack.Packer(use_bin_type=True)
+    if isinstance(value, dict):
+        yield packer.pack_map_header(len(value))
+        for key, item in value.items():
+            yield packer.pack(key)
+            yield from iter_msgpack(item, packer)
+    elif isinstance(value, list) and len(value) > _STREAM_BATCH_ITEMS:
+        yield packer.pack_array_header(len(value))
+        for start in range(0, len(value), _STREAM_BATCH_ITEMS):
+            yield b"".join(packer.pack(item) for item in value[start:start + _STREAM_BATCH_ITEMS])
+    else:
+        yield packer.pack(value)
+
+
+def _compress(chunks: Iterator[bytes], encoding: str) -> Iterator[bytes]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=RESPONSE_BROTLI_QUALITY)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(RESPONSE_GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def _coalesced(head: List[bytes], rest: Iterator[bytes]) -> Iterator[bytes]:
+    buffer = head
+    size = sum(len(chunk) for chunk in head)
+    for chunk in rest:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= _STREAM_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def encode_response(payload: Any, accept: str = "", accept_encoding: str = "") -> Response:
+    """
+    Response for `payload` in the negotiated format and content coding.
+
+    Serializes up to RESPONSE_COMPRESSION_MIN_BYTES right away (call it off
+    the event loop); larger bodies are compressed and streamed, the rest of
+    the serialization happening as the client reads.
+
+    Raises:
+        HTTPException(406) if the client only accepts MessagePack and the
+        msgpack package is not installed
+    """
+    media_type = negotiate_media_type(accept)
+    if media_type is None:
+        raise HTTPException(status_code=406, detail="application/msgpack requested, but msgpack is not installed")
+    chunks = iter_msgpack(payload) if media_type == "application/msgpack" else iter_json(payload)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+
+    head: List[bytes] = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= RESPONSE_COMPRESSION_MIN_BYTES:
+            break
+    else:
+        return Response(content=b"".join(head), media_type=media_type, headers=headers)
+
+    encoding = negotiate_encoding(accept_encoding)
+    body = _coalesced(head, chunks)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        body = _compress(body, encoding)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
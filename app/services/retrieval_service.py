@@ -0,0 +1,245 @@
+"""
+Local retrieval index over product UI elements and approved scripts.
+
+Documents are stored per product (normalized URL host + path) in the shared
+SQLite database:
+- UI element texts, data-testid and aria-label attributes seen in sessions
+- Sentences from previously approved scripts
+
+Queries run against an in-process BM25 index per product, built lazily from
+the database and rebuilt only when that product's documents change, so a
+lookup takes milliseconds and never touches the network. Prompts include
+only the top-k snippets instead of everything ever seen for the product.
+
+Each worker keeps at most RETRIEVAL_MAX_INDEXES product indexes (least
+recently used go first), and remembers the element sets it already indexed,
+so re-processing a session with the same UI elements does not write to
+SQLite again.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.models.dom_event_models import RecordingSession
+from app.services.elevenlabs_service import chunk_by_sentence
+from app.services.shared_cache import get_connection, make_cache_key
+
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "1") == "1"
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+RETRIEVAL_MAX_INDEXES = int(os.getenv("RETRIEVAL_MAX_INDEXES", "64"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_CAMEL_PATTERN = re.compile(r"([a-z])([A-Z])")
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+_indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+_indexes_lock = threading.Lock()
+# Fingerprints of (product, element set) already written, most recent last
+_indexed_sets: "OrderedDict[str, None]" = OrderedDict()
+_INDEXED_SETS_MAX = 4096
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; camelCase and kebab/snake-case ids are split."""
+    return _TOKEN_PATTERN.findall(_CAMEL_PATTERN.sub(r"\1 \2", text).lower())
+
+
+def product_key(url: str) -> str:
+    """Normalize a URL to host + path, ignoring scheme, query and fragment."""
+    parsed = urlparse(url)
+    return f"{parsed.netloc.lower()}{parsed.path.rstrip('/')}" or url
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed document set."""
+
+    def __init__(self, documents: List[Dict[str, Any]], version: float):
+        self.documents = documents
+        self.version = version
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+
+        for doc_index, doc in enumerate(documents):
+            counts = Counter(tokenize(doc["text"]))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((doc_index, tf))
+
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    def search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        n = len(self.documents)
+        scores: Dict[int, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_index, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_index] / (self.avg_length or 1))
+                scores[doc_index] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [{**self.documents[i], "score": round(score, 3)} for i, score in ranked]
+
+
+def _db() -> sqlite3.Connection:
+    global _schema_ready
+    conn = get_connection()
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS retrieval_docs (
+                    product_key TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (product_key, doc_id)
+                )
+                """
+            )
+            _schema_ready = True
+    return conn
+
+
+def _add_documents(key: str, documents: Iterable[Tuple[str, str]]) -> Optional[int]:
+    """
+    Insert (kind, text) documents for a product; existing ones are kept.
+    Returns how many were new, or None when the write failed.
+    """
+    now = time.time()
+    rows = [
+        (key, make_cache_key(kind, text), kind, text, now)
+        for kind, text in documents
+        if text and text.strip()
+    ]
+    if not rows:
+        return 0
+    try:
+        cursor = _db().executemany(
+            "INSERT OR IGNORE INTO retrieval_docs (product_key, doc_id, kind, text, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        print(f"[Retrieval] ⚠️  Failed to index documents for {key}: {str(e)}")
+        return None
+
+
+def _remember(cache: OrderedDict, key: Any, value: Any, max_items: int) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_items:
+        cache.popitem(last=False)
+
+
+def index_session(session: RecordingSession) -> int:
+    """
+    Index the UI elements a session interacted with. Returns new documents
+    added (0 without touching SQLite when this worker already indexed the
+    same element set for the product).
+    """
+    documents = set()
+    for event in session.events:
+        if not event.target:
+            continue
+        if event.target.text:
+            documents.add(("ui_text", event.target.text.strip()))
+        if event.target.attributes.get("data-testid"):
+            documents.add(("testid", event.target.attributes["data-testid"]))
+        if event.target.attributes.get("aria-label"):
+            documents.add(("aria_label", event.target.attributes["aria-label"]))
+
+    key = product_key(session.url)
+    documents = sorted(documents)
+    fingerprint = make_cache_key(key, *(f"{kind}:{text}" for kind, text in documents))
+    with _indexes_lock:
+        if fingerprint in _indexed_sets:
+            _indexed_sets.move_to_end(fingerprint)
+            return 0
+
+    added = _add_documents(key, documents)
+    if added is None:
+        return 0
+    with _indexes_lock:
+        _remember(_indexed_sets, fingerprint, None, _INDEXED_SETS_MAX)
+    if added:
+        print(f"[Retrieval] Indexed {added} new UI element(s) for {product_key(session.url)}")
+    return added
+
+
+def add_approved_script(url: str, script: str) -> int:
+    """Index an approved script, sentence by sentence, for the product at `url`."""
+    added = _add_documents(product_key(url), (("approved_script", s) for s in chunk_by_sentence(script))) or 0
+    print(f"[Retrieval] Indexed {added} approved script sentence(s) for {product_key(url)}")
+    return added
+
+
+def _get_index(key: str) -> Optional[BM25Index]:
+    """In-process index for a product, rebuilt when its documents changed."""
+    conn = _db()
+    version = conn.execute(
+        "SELECT MAX(updated_at) FROM retrieval_docs WHERE product_key = ?", (key,)
+    ).fetchone()[0]
+    if version is None:
+        return None
+
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(key)
+            return index
+
+    rows = conn.execute(
+        "SELECT kind, text FROM retrieval_docs WHERE product_key = ?", (key,)
+    ).fetchall()
+    index = BM25Index([{"kind": kind, "text": text} for kind, text in rows], version)
+
+    with _indexes_lock:
+        _remember(_indexes, key, index, RETRIEVAL_MAX_INDEXES)
+    return index
+
+
+def retrieve(url: str, query: str, k: int = RETRIEVAL_TOP_K) -> List[Dict[str, Any]]:
+    """Top-k documents for the product at `url` matching `query`."""
+    try:
+        index = _get_index(product_key(url))
+    except sqlite3.Error as e:
+        print(f"[Retrieval] ⚠️  Lookup failed: {str(e)}")
+        return []
+    if index is None:
+        return []
+    return index.search(query, k)
+
+
+def build_retrieval_context(session: RecordingSession, query: str, k: int = RETRIEVAL_TOP_K) -> str:
+    """
+    Index the session and return the top-k relevant snippets for the prompt,
+    grouped by kind.
+    """
+    index_session(session)
+    results = retrieve(session.url, query, k)
+    if not results:
+        return ""
+
+    labels = {
+        "ui_text": "UI text",
+        "testid": "Element id",
+        "aria_label": "Accessible label",
+        "approved_script": "Approved narration",
+    }
+    return "\n".join(f"- [{labels.get(r['kind'], r['kind'])}] {r['text']}" for r in results)
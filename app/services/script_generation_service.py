@@ -8,24 +8,72 @@ This service combines:
 
 To generate a production-ready script that can be converted to audio.
 """
-import google.generativeai as genai
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 import os
 import re
 from app.models.dom_event_models import RecordingSession
+from app.services.capture_service import upstream_call
+from app.services.elevenlabs_service import ensure_sentence_endings
+from app.services.event_coalescing_service import EVENT_COALESCING_ENABLED, coalesce_session
+from app.services.gemini_client import gemini_model
+from app.services.prompt_cache_service import generate_text, join_prompt
 from app.services.rag_service import (
     build_rag_context_from_events,
     build_timeline_context,
     extract_ui_elements_summary,
 )
+from app.services.retrieval_service import RETRIEVAL_ENABLED, build_retrieval_context
+from app.services.script_template_service import (
+    SCRIPT_TEMPLATES_ENABLED,
+    build_adaptation_prompt,
+    find_script_template,
+    store_script_template,
+)
+from app.services.shared_cache import cache_get_json, cache_set_json, make_cache_key
 
 load_dotenv()
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=API_KEY)
+MODEL_NAME = "gemini-2.5-flash-lite"
+SCRIPT_CACHE_TTL_SECONDS = float(os.getenv("SCRIPT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+model = gemini_model(MODEL_NAME)
+
+_WHITESPACE = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"\s+([.,!?])")
+# Fillers the draft drops; "like", "so", "well"... are often real words
+_DRAFT_DISFLUENCIES = {"um", "uh"}
+
+# Static part of the script prompt, identical for every request (see prompt_cache_service)
+SCRIPT_PROMPT_PREFIX = """
+You are an AI that creates professional, production-ready product demo scripts.
+
+Each request gives you THREE sources of information:
+
+1. RAW TRANSCRIPT (from speech-to-text)
+2. TIMING ANALYSIS (word-level timing with gaps and filler detection)
+3. SCREEN RECORDING CONTEXT (DOM events showing user actions), optionally with
+   the UI elements involved and a timeline of actions
+
+TASK:
+Generate a clean, professional product demo script that:
 
-model = genai.GenerativeModel("gemini-2.5-flash-lite")
+1. Uses the raw transcript as the base
+2. Syncs with timing gaps to create natural pacing
+3. References actual UI actions (buttons, inputs, navigation)
+4. Fills pauses with meaningful connecting narration
+5. Maintains a polished professional tone
+6. Removes filler words like "um", "uh", "like"
+7. Outputs a clean, single-paragraph narration
+
+OUTPUT RULES:
+- Single continuous paragraph
+- No newlines inside the script
+- Present tense actions ("click the button")
+- Reference UI elements when provided
+- ±20% length tolerance versus original transcript
+- Must be clear, natural, and professional
+""".strip()
 
 
 def analyze_word_timings(words: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -38,6 +86,8 @@ def analyze_word_timings(words: List[Dict[str, Any]]) -> Dict[str, Any]:
         print(f"[Timing Analysis] ⚠️  No words provided, returning empty analysis")
         return {
             "total_duration": 0,
+            "total_words": 0,
+            "num_gaps": 0,
             "gaps": [],
             "average_gap": 0,
             "speaking_segments": [],
@@ -302,6 +352,32 @@ def generate_product_script(
     dom_context = ""
     timeline_context = ""
     ui_elements = ""
+    ui_from_retrieval = False
+    coalescing_stats = None
+
+    if session and session.events and EVENT_COALESCING_ENABLED:
+        session, coalescing_stats = coalesce_session(session)
+
+    # Recurring flow on the same page: reuse or adapt the stored script
+    if session and session.events and SCRIPT_TEMPLATES_ENABLED:
+        template = find_script_template(session, raw_text)
+
+        if template and template["reuse"] == "exact":
+            print(f"[Script Generation] ===== SCRIPT REUSED FROM TEMPLATE (no LLM call) =====")
+            return _build_script_result(
+                template["script"], raw_text, timing_analysis, session, coalescing_stats, "exact"
+            )
+
+        if template and template["reuse"] == "adapt":
+            try:
+                script = _generate_script_text(*build_adaptation_prompt(template, raw_text))
+                store_script_template(session, raw_text, script)
+                print(f"[Script Generation] ===== SCRIPT ADAPTED FROM TEMPLATE =====")
+                return _build_script_result(
+                    script, raw_text, timing_analysis, session, coalescing_stats, "adapted"
+                )
+            except Exception as e:
+                print(f"[Script Generation]   ⚠️  Template adaptation failed, full generation: {str(e)}")
 
     if session and session.events:
         print(
@@ -313,7 +389,11 @@ def generate_product_script(
         timeline = build_timeline_context(session.events)
         timeline_context = _format_timeline(timeline)
         print(f"[Script Generation]   - Extracting UI elements...")
-        ui_elements = extract_ui_elements_summary(session.events)
+        if RETRIEVAL_ENABLED:
+            ui_elements = build_retrieval_context(session, raw_text)
+            ui_from_retrieval = bool(ui_elements)
+        if not ui_elements:
+            ui_elements = extract_ui_elements_summary(session.events)
         print(f"[Script Generation] --->RAG context built successfully")
     else:
         print(
@@ -331,66 +411,43 @@ def generate_product_script(
     timing_context_safe = str(timing_context).replace("\\", "\\\\")
 
     # Build optional blocks
+    ui_heading = (
+        "RELEVANT UI ELEMENTS AND APPROVED NARRATION"
+        if ui_from_retrieval else "UI ELEMENTS INTERACTED WITH"
+    )
     ui_section = (
-        f"UI ELEMENTS INTERACTED WITH:\n{ui_text}" if ui_text.strip() else ""
+        f"{ui_heading}:\n{ui_text}" if ui_text.strip() else ""
     )
     timeline_section = (
         f"TIMELINE OF ACTIONS:\n{timeline_text}" if timeline_text.strip() else ""
     )
 
-    # Final text – ONLY simple {variables}, never conditions inside {}
-    prompt = f"""
-You are an AI that creates professional, production-ready product demo scripts.
-
-You have access to THREE sources of information:
-
-1. RAW TRANSCRIPT (from speech-to-text):
+    # Per-request part – ONLY simple {variables}, never conditions inside {}
+    prompt_suffix = f"""
+1. RAW TRANSCRIPT:
 {raw_text_safe}
 
-2. TIMING ANALYSIS (word-level timing with gaps and filler detection):
+2. TIMING ANALYSIS:
 {timing_context_safe}
 
-3. SCREEN RECORDING CONTEXT (DOM events showing user actions):
+3. SCREEN RECORDING CONTEXT:
 {dom_text}
 
 {ui_section}
 
 {timeline_section}
 
-TASK:
-Generate a clean, professional product demo script that:
-
-1. Uses the raw transcript as the base
-2. Syncs with timing gaps to create natural pacing
-3. References actual UI actions (buttons, inputs, navigation)
-4. Fills pauses with meaningful connecting narration
-5. Maintains a polished professional tone
-6. Removes filler words like "um", "uh", "like"
-7. Outputs a clean, single-paragraph narration
-
-OUTPUT RULES:
-- Single continuous paragraph
-- No newlines inside the script
-- Present tense actions ("click the button")
-- Reference UI elements when provided
-- ±20% length tolerance versus original transcript
-- Must be clear, natural, and professional
-
 PRODUCTION-READY SCRIPT:
 """.strip()
 
-    print(f"[Script Generation]   - Prompt length: {len(prompt)} characters")
+    print(f"[Script Generation]   - Prompt length: {len(SCRIPT_PROMPT_PREFIX)} static + "
+          f"{len(prompt_suffix)} per-request characters")
     print(f"[Script Generation] --->Prompt built")
 
     # 4. Generate script with Gemini
     print(f"\n[Script Generation] Step 4/4: Calling Gemini API...")
     try:
-        print(f"[Script Generation]   - Sending request to Gemini...")
-        response = model.generate_content(prompt)
-        print(f"[Script Generation]   - Response received from Gemini")
-
-        script = _clean_script_output(response.text)
-        print(f"[Script Generation]   - Script cleaned and formatted")
+        script = _generate_script_text(SCRIPT_PROMPT_PREFIX, prompt_suffix)
         print(f"[Script Generation]   - Final script length: {len(script)} characters")
 
         print(f"\n[Script Generation] ===== SCRIPT GENERATION COMPLETE =====")
@@ -399,27 +456,10 @@ PRODUCTION-READY SCRIPT:
             f"{script[:100]}..."
         )
 
-        return {
-            "script": script,
-            "raw_text": raw_text,
-            "timing_analysis": {
-                "total_duration": timing_analysis["total_duration"],
-                "total_words": timing_analysis["total_words"],
-                "speaking_rate": timing_analysis["speaking_rate"],
-                "num_gaps": timing_analysis["num_gaps"],
-                "average_gap": timing_analysis["average_gap"],
-                "num_filler_words": len(
-                    timing_analysis.get("filler_words", [])
-                ),
-                "num_low_confidence": len(
-                    timing_analysis.get("low_confidence_words", [])
-                ),
-                "has_timing_data": timing_analysis["has_timing_data"],
-            },
-            "dom_context_used": bool(session and session.events),
-            "session_id": session.sessionId if session else None,
-            "success": True,
-        }
+        if session and session.events and SCRIPT_TEMPLATES_ENABLED:
+            store_script_template(session, raw_text, script)
+
+        return _build_script_result(script, raw_text, timing_analysis, session, coalescing_stats)
 
     except Exception as e:
         print(
@@ -437,21 +477,126 @@ PRODUCTION-READY SCRIPT:
         }
 
 
+def build_draft_script(
+    raw_text: str,
+    word_timings: List[Dict[str, Any]],
+    session: Optional[RecordingSession] = None,
+) -> Dict[str, Any]:
+    """
+    Local draft script without an LLM call: the Deepgram punctuated words
+    minus the um/uh fillers and immediate repetitions found by
+    analyze_word_timings. Ambiguous fillers ("like", "so", ...) are kept.
+
+    Returns the same structure as generate_product_script, with "draft": True.
+    """
+    timing_analysis = analyze_word_timings(word_timings)
+    skipped = {
+        filler["position"] for filler in timing_analysis["filler_words"]
+        if filler.get("type") == "repetition" or filler["word"].lower() in _DRAFT_DISFLUENCIES
+    }
+
+    tokens: List[str] = []
+    capitalize = True
+    for position, word in enumerate(word_timings):
+        text = word.get("punctuated_word") or word.get("word", "")
+        if not text:
+            continue
+        if position in skipped:
+            # Keep a sentence end carried by a dropped filler ("um." -> previous word)
+            if text[-1] in ".!?" and tokens:
+                tokens[-1] = tokens[-1].rstrip(",;:") + ("" if tokens[-1][-1] in ".!?" else text[-1])
+                capitalize = True
+            continue
+        if capitalize:
+            text = text[0].upper() + text[1:]
+        capitalize = text[-1] in ".!?"
+        tokens.append(text)
+
+    script = ensure_sentence_endings(" ".join(tokens)) if tokens else _clean_script_output(raw_text)
+    print(f"[Script Generation] 📝 Draft script built locally ({len(script)} characters, "
+          f"{len(skipped)} filler(s) dropped)")
+
+    result = _build_script_result(script, raw_text, timing_analysis, session, None)
+    result["draft"] = True
+    return result
+
+
+def _generate_script_text(prefix: str, suffix: str) -> str:
+    """Call Gemini for a static prefix + per-request suffix, going through the shared script cache."""
+    prompt = join_prompt(prefix, suffix)
+    cache_key = make_cache_key(MODEL_NAME, prompt)
+    cached = cache_get_json("script", cache_key)
+
+    if cached is not None:
+        print(f"[Script Generation]   - ♻️  Script served from shared cache")
+        return cached["script"]
+
+    print(f"[Script Generation]   - Sending request to Gemini...")
+    response_text = upstream_call("gemini", (MODEL_NAME, prompt), lambda: generate_text(model, MODEL_NAME, prefix, suffix))
+    print(f"[Script Generation]   - Response received from Gemini")
+
+    script = _clean_script_output(response_text)
+    print(f"[Script Generation]   - Script cleaned and formatted")
+    cache_set_json("script", cache_key, {"script": script}, SCRIPT_CACHE_TTL_SECONDS)
+    return script
+
+
+def _build_script_result(
+    script: str,
+    raw_text: str,
+    timing_analysis: Dict[str, Any],
+    session: Optional[RecordingSession],
+    coalescing_stats: Optional[Dict[str, Any]],
+    template_reuse: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Successful generate_product_script result."""
+    return {
+        "script": script,
+        "raw_text": raw_text,
+        "timing_analysis": {
+            "total_duration": timing_analysis["total_duration"],
+            "total_words": timing_analysis["total_words"],
+            "speaking_rate": timing_analysis["speaking_rate"],
+            "num_gaps": timing_analysis["num_gaps"],
+            "average_gap": timing_analysis["average_gap"],
+            "num_filler_words": len(
+                timing_analysis.get("filler_words", [])
+            ),
+            "num_low_confidence": len(
+                timing_analysis.get("low_confidence_words", [])
+            ),
+            "has_timing_data": timing_analysis["has_timing_data"],
+        },
+        "speaking_segments": [
+            {
+                "start": segment["start"],
+                "end": segment["end"],
+                "word_count": segment["word_count"],
+            }
+            for segment in timing_analysis["speaking_segments"]
+        ],
+        "dom_context_used": bool(session and session.events),
+        "event_coalescing": coalescing_stats,
+        "template_reuse": template_reuse,
+        "session_id": session.sessionId if session else None,
+        "success": True,
+    }
+
+
 def _clean_script_output(text: str) -> str:
     """Clean and normalize script output."""
     if not text:
         return ""
 
     # Remove markdown formatting if present
-    text = re.sub(r"\*\*", "", text)
-    text = re.sub(r"\*", "", text)
+    text = text.replace("*", "")
 
     # Remove newlines and extra spaces
     text = text.replace("\n", " ")
-    text = re.sub(r"\s+", " ", text)
+    text = _WHITESPACE.sub(" ", text)
 
     # Fix punctuation spacing
-    text = re.sub(r"\s+([.,!?])", r"\1", text)
+    text = _SPACE_BEFORE_PUNCTUATION.sub(r"\1", text)
 
     return text.strip()
 
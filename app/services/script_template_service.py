@@ -0,0 +1,147 @@
+"""
+Script template memoization for recurring demo flows.
+
+Customers record near-identical flows on the same product pages over and
+over. A flow is fingerprinted by its URL (host + path) plus the sequence of
+(event type, selector) of its significant DOM events; the generated script
+is stored under that fingerprint in the shared cache.
+
+When a new session matches a stored flow:
+- same transcript (identical words after dropping fillers/punctuation): the
+  stored script is reused and the LLM call is skipped entirely
+- any other similar transcript: a short adaptation prompt asks the LLM to update only
+  the parts of the stored script where the transcript changed
+- otherwise: normal full generation
+"""
+import difflib
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.dom_event_models import RecordingSession
+from app.services.retrieval_service import product_key
+from app.services.shared_cache import cache_get_json, cache_set_json, make_cache_key
+
+SCRIPT_TEMPLATES_ENABLED = os.getenv("SCRIPT_TEMPLATES_ENABLED", "1") == "1"
+TEMPLATE_ADAPT_MIN_SIMILARITY = float(os.getenv("TEMPLATE_ADAPT_MIN_SIMILARITY", "0.6"))
+TEMPLATE_TTL_SECONDS = float(os.getenv("TEMPLATE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+_FINGERPRINT_EVENT_TYPES = ("click", "type", "focus", "step_change")
+_FILLERS = {"um", "uh", "like", "so", "well", "actually", "basically"}
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+ADAPTATION_PROMPT_PREFIX = """
+You are an AI that updates an existing product demo script.
+
+The presenter recorded the same on-screen flow again. You get the script that was
+used for the previous recording, and the passages where the new spoken transcript
+differs from the previous one (previous → new).
+
+TASK:
+Update the script so it reflects the new passages. Keep every other
+sentence exactly as it is.
+
+OUTPUT RULES:
+- Single continuous paragraph
+- No newlines inside the script
+- Present tense actions ("click the button")
+- Must be clear, natural, and professional
+""".strip()
+
+
+def flow_fingerprint(session: RecordingSession) -> str:
+    """Fingerprint of URL path + (event type, selector) sequence."""
+    steps = [
+        f"{event.type}:{event.target.selector if event.target else ''}"
+        for event in session.events
+        if event.type in _FINGERPRINT_EVENT_TYPES
+    ]
+    return make_cache_key(product_key(session.url), *steps)
+
+
+def normalize_transcript(text: str) -> List[str]:
+    """Lowercase words without punctuation, fillers or immediate repetitions."""
+    words = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if word in _FILLERS or (words and words[-1] == word):
+            continue
+        words.append(word)
+    return words
+
+
+def find_script_template(session: RecordingSession, raw_text: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a stored script for the session's flow.
+
+    Returns:
+        None if no usable template, else a dict with "reuse" ("exact" or
+        "adapt"), the stored "script", the transcript "similarity" and, for
+        "adapt", the stored transcript
+    """
+    fingerprint = flow_fingerprint(session)
+    template = cache_get_json("script_template", fingerprint)
+    if template is None:
+        return None
+
+    old_words = template["transcript_words"]
+    new_words = normalize_transcript(raw_text)
+    similarity = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False).ratio()
+
+    if old_words == new_words:
+        # Even a one-word edit must reach the script: only identical words skip the LLM
+        reuse = "exact"
+    elif similarity >= TEMPLATE_ADAPT_MIN_SIMILARITY:
+        reuse = "adapt"
+    else:
+        print(f"[Script Templates] Flow matched but transcript too different ({similarity:.2f}), full generation")
+        return None
+
+    print(f"[Script Templates] ♻️  Flow matched ({reuse}, transcript similarity {similarity:.2f})")
+    return {
+        "reuse": reuse,
+        "script": template["script"],
+        "similarity": similarity,
+        "transcript_words": old_words,
+    }
+
+
+def build_adaptation_prompt(template: Dict[str, Any], raw_text: str) -> Tuple[str, str]:
+    """
+    Short prompt: the stored script plus only the transcript passages that
+    changed, instead of the full RAG context.
+
+    Returns (static prefix, per-request suffix).
+    """
+    old_words = template["transcript_words"]
+    new_words = normalize_transcript(raw_text)
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+
+    changes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        before = " ".join(old_words[i1:i2]) or "(nothing)"
+        after = " ".join(new_words[j1:j2]) or "(removed)"
+        changes.append(f'- "{before}" → "{after}"')
+
+    change_text = "\n".join(changes)
+    suffix = f"""
+PREVIOUS SCRIPT:
+{template["script"]}
+
+CHANGED PASSAGES (previous → new):
+{change_text}
+
+UPDATED SCRIPT:
+""".strip()
+    return ADAPTATION_PROMPT_PREFIX, suffix
+
+
+def store_script_template(session: RecordingSession, raw_text: str, script: str) -> None:
+    cache_set_json("script_template", flow_fingerprint(session), {
+        "script": script,
+        "transcript_words": normalize_transcript(raw_text),
+        "url": session.url,
+        "created_at": time.time(),
+    }, TEMPLATE_TTL_SECONDS)
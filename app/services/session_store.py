@@ -0,0 +1,227 @@
+"""
+Server-side session store, so Node can reference a session by ID.
+
+Every request that carries a full RecordingSession or transcript stores it
+here (table `session_store` in the shared SQLite database, one row per
+sessionId):
+
+- the validated session, as compact JSON, zlib-compressed
+- the transcript text, Deepgram data (words, sentences, ...) and recordings path
+- derived indexes: event count, time range, a SHA-256 of the session, and
+  the latest per-step narration (for /synced-narration/regenerate)
+
+Later requests send `sessionRef` instead of the multi-MB payload, plus
+optional deltas (events recorded since, a new transcript). Validated
+sessions are also kept per worker (SESSION_STORE_MEMORY_ITEMS, keyed by
+their SHA-256), so a reprocess on the same worker does not even re-parse.
+An unchanged session is not written again.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.dom_event_models import InteractionEvent, RecordingSession
+from app.services.dom_event_service import render_json
+from app.services.shared_cache import get_connection
+
+SESSION_STORE_ENABLED = os.getenv("SESSION_STORE_ENABLED", "1") == "1"
+SESSION_STORE_RETENTION_SECONDS = float(os.getenv("SESSION_STORE_RETENTION_SECONDS", str(30 * 24 * 3600)))
+SESSION_STORE_MEMORY_ITEMS = int(os.getenv("SESSION_STORE_MEMORY_ITEMS", "32"))
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+_memory_lock = threading.Lock()
+# (session_id, sha256) -> validated RecordingSession
+_validated: "OrderedDict[Tuple[str, str], RecordingSession]" = OrderedDict()
+_last_prune = 0.0
+
+
+class SessionNotFoundError(LookupError):
+    """Raised when a request references a sessionId the store doesn't have."""
+
+
+def _db() -> sqlite3.Connection:
+    global _schema_ready
+    conn = get_connection()
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_store (
+                    session_id TEXT PRIMARY KEY,
+                    session BLOB,
+                    session_sha256 TEXT,
+                    event_count INTEGER,
+                    start_ms INTEGER,
+                    end_ms INTEGER,
+                    transcript TEXT,
+                    deepgram BLOB,
+                    recordings_path TEXT,
+                    steps BLOB,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS session_store_updated ON session_store (updated_at)")
+            _schema_ready = True
+    return conn
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(value if isinstance(value, bytes) else render_json(value), 1)
+
+
+def _unpack(blob: Optional[bytes]) -> Any:
+    return json.loads(zlib.decompress(blob)) if blob is not None else None
+
+
+def _remember_validated(session_id: str, sha256: str, session: RecordingSession) -> None:
+    with _memory_lock:
+        _validated[(session_id, sha256)] = session
+        _validated.move_to_end((session_id, sha256))
+        while len(_validated) > SESSION_STORE_MEMORY_ITEMS:
+            _validated.popitem(last=False)
+
+
+def _prune() -> None:
+    """Drop sessions not updated within the retention period (at most hourly per worker)."""
+    global _last_prune
+    if time.time() - _last_prune < 3600:
+        return
+    _last_prune = time.time()
+    removed = _db().execute(
+        "DELETE FROM session_store WHERE updated_at < ?",
+        (time.time() - SESSION_STORE_RETENTION_SECONDS,),
+    ).rowcount
+    if removed:
+        print(f"[Session Store] 🧹 Pruned {removed} session(s) older than {SESSION_STORE_RETENTION_SECONDS:.0f}s")
+
+
+def store_session(
+    session_id: str,
+    session: Optional[RecordingSession] = None,
+    transcript: Optional[str] = None,
+    deepgram: Optional[Dict[str, Any]] = None,
+    recordings_path: Optional[str] = None,
+) -> None:
+    """
+    Store (or update) what a request carried for `session_id`. Fields left
+    as None keep their stored value; an unchanged session is not rewritten.
+    """
+    if not SESSION_STORE_ENABLED:
+        return
+
+    row = {"transcript": transcript, "recordings_path": recordings_path}
+    if deepgram is not None:
+        row["deepgram"] = _pack(deepgram)
+
+    if session is not None:
+        encoded = session.model_dump_json().encode("utf-8")
+        sha256 = hashlib.sha256(encoded).hexdigest()
+        _remember_validated(session_id, sha256, session)
+        stored = _db().execute(
+            "SELECT session_sha256 FROM session_store WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if stored is None or stored[0] != sha256:
+            row.update({
+                "session": _pack(encoded),
+                "session_sha256": sha256,
+                "event_count": len(session.events),
+                "start_ms": session.startTime,
+                "end_ms": session.endTime,
+            })
+
+    row = {"updated_at": time.time(), **{column: value for column, value in row.items() if value is not None}}
+    updates = ", ".join(f"{column} = excluded.{column}" for column in row)
+    try:
+        _db().execute(
+            f"INSERT INTO session_store (session_id, {', '.join(row)}) VALUES (?{', ?' * len(row)}) "
+            f"ON CONFLICT (session_id) DO UPDATE SET {updates}",
+            (session_id, *row.values()),
+        )
+        _prune()
+    except sqlite3.Error as e:
+        print(f"[Session Store] ⚠️  Failed to store session {session_id}: {str(e)}")
+
+
+def store_steps(session_id: str, steps: List[Dict[str, Any]]) -> None:
+    """Keep the latest per-step narration of a session (for regeneration by reference)."""
+    if not SESSION_STORE_ENABLED:
+        return
+    try:
+        _db().execute(
+            "INSERT INTO session_store (session_id, steps, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET steps = excluded.steps, updated_at = excluded.updated_at",
+            (session_id, _pack(steps), time.time()),
+        )
+    except sqlite3.Error as e:
+        print(f"[Session Store] ⚠️  Failed to store steps of {session_id}: {str(e)}")
+
+
+def load_session(session_id: str) -> Dict[str, Any]:
+    """
+    Everything stored for `session_id`: session (a RecordingSession the
+    caller may modify), transcript, deepgram, recordings_path and steps.
+    Raises SessionNotFoundError.
+    """
+    row = _db().execute(
+        "SELECT session, session_sha256, transcript, deepgram, recordings_path, steps "
+        "FROM session_store WHERE session_id = ?",
+        (session_id,),
+    ).fetchone() if SESSION_STORE_ENABLED else None
+    if row is None:
+        raise SessionNotFoundError(f"Unknown session: {session_id}")
+
+    session_blob, sha256, transcript, deepgram, recordings_path, steps = row
+    session = None
+    if session_blob is not None:
+        with _memory_lock:
+            session = _validated.get((session_id, sha256))
+        if session is None:
+            session = RecordingSession.model_validate_json(zlib.decompress(session_blob))
+            _remember_validated(session_id, sha256, session)
+        # Shallow copy: callers set videoPath/events on their own instance
+        session = session.model_copy()
+
+    return {
+        "session": session,
+        "transcript": transcript,
+        "deepgram": _unpack(deepgram),
+        "recordings_path": recordings_path,
+        "steps": _unpack(steps),
+    }
+
+
+def append_events(session: RecordingSession, events: List[InteractionEvent]) -> RecordingSession:
+    """A copy of `session` with delta events merged in timestamp order."""
+    if not events:
+        return session
+    merged = sorted([*session.events, *events], key=lambda event: event.timestamp)
+    return session.model_copy(update={"events": merged})
+
+
+def session_summary(session_id: str) -> Optional[Dict[str, Any]]:
+    """What is stored for a session, without the payloads themselves."""
+    if not SESSION_STORE_ENABLED:
+        return None
+    row = _db().execute(
+        "SELECT event_count, start_ms, end_ms, session_sha256, transcript IS NOT NULL, deepgram IS NOT NULL, "
+        "steps IS NOT NULL, recordings_path, "
+        "IFNULL(LENGTH(session), 0) + IFNULL(LENGTH(deepgram), 0) + IFNULL(LENGTH(steps), 0), "
+        "updated_at FROM session_store WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    keys = ("event_count", "start_ms", "end_ms", "session_sha256", "has_transcript", "has_deepgram",
+            "has_steps", "recordings_path", "stored_bytes", "updated_at")
+    summary = dict(zip(keys, row))
+    for key in ("has_transcript", "has_deepgram", "has_steps"):
+        summary[key] = bool(summary[key])
+    return summary
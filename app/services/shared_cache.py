@@ -0,0 +1,197 @@
+"""
+Shared on-disk cache used by every worker process.
+
+Backed by a single SQLite database in WAL mode, so multiple uvicorn workers
+can read concurrently while one writes. Entries are grouped by namespace
+("script", "audio", "gemini_context", ...) and may carry a TTL.
+
+Writes trigger maintenance at most every SHARED_CACHE_MAINTENANCE_SECONDS
+per worker: expired entries are deleted, then the oldest entries until the
+values fit in SHARED_CACHE_MAX_BYTES again. SQLite reuses the freed pages,
+so the database file stops growing once it reaches the cap.
+
+Each thread gets its own connection; SQLite handles cross-process locking.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", ".cache/productai_cache.sqlite3")
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "1") == "1"
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+SHARED_CACHE_MAINTENANCE_SECONDS = float(os.getenv("SHARED_CACHE_MAINTENANCE_SECONDS", "300"))
+
+_local = threading.local()
+_maintenance_lock = threading.Lock()
+_last_maintenance = 0.0
+
+
+def _connect() -> sqlite3.Connection:
+    """Get (or open) this thread's connection to the shared cache database."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == SHARED_CACHE_PATH:
+        return conn
+
+    Path(SHARED_CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_created ON cache_entries (created_at)")
+
+    _local.conn = conn
+    _local.path = SHARED_CACHE_PATH
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Connection to the shared database, for services that keep their own
+    tables next to the cache entries.
+    """
+    return _connect()
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a stable cache key from arbitrary parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def cache_get(namespace: str, key: str) -> Optional[bytes]:
+    """Return the cached value, or None if missing, expired or disabled."""
+    if not SHARED_CACHE_ENABLED:
+        return None
+
+    try:
+        row = _connect().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"[Shared Cache] ⚠️  Read failed ({namespace}): {str(e)}")
+        return None
+
+    if row is None:
+        return None
+
+    value, expires_at = row
+    if expires_at is not None and expires_at < time.time():
+        return None
+    return bytes(value)
+
+
+def cache_set(namespace: str, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+    """Store a value. Failures are logged and ignored - the cache is best effort."""
+    if not SHARED_CACHE_ENABLED:
+        return
+
+    now = time.time()
+    expires_at = now + ttl_seconds if ttl_seconds else None
+    try:
+        _connect().execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, created_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, sqlite3.Binary(value), now, expires_at),
+        )
+    except sqlite3.Error as e:
+        print(f"[Shared Cache] ⚠️  Write failed ({namespace}): {str(e)}")
+        return
+    _maybe_run_maintenance(now)
+
+
+def cache_get_json(namespace: str, key: str) -> Optional[Any]:
+    value = cache_get(namespace, key)
+    if value is None:
+        return None
+    return json.loads(value)
+
+
+def cache_set_json(namespace: str, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+    cache_set(namespace, key, json.dumps(value).encode("utf-8"), ttl_seconds)
+
+
+def purge_expired() -> int:
+    """Delete expired entries. Returns the number of rows removed."""
+    try:
+        cursor = _connect().execute(
+            "DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at < ?",
+            (time.time(),),
+        )
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        print(f"[Shared Cache] ⚠️  Purge failed: {str(e)}")
+        return 0
+
+
+def enforce_size_limit(max_bytes: Optional[int] = None) -> int:
+    """
+    Delete the oldest entries until the stored values take at most
+    `max_bytes` (default SHARED_CACHE_MAX_BYTES), leaving 10% headroom.
+    Returns the number of rows removed.
+    """
+    max_bytes = SHARED_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        conn = _connect()
+        total = conn.execute("SELECT IFNULL(SUM(LENGTH(value)), 0) FROM cache_entries").fetchone()[0]
+        if total <= max_bytes:
+            return 0
+
+        excess = total - int(max_bytes * 0.9)
+        victims, freed = [], 0
+        cursor = conn.execute("SELECT namespace, key, LENGTH(value) FROM cache_entries ORDER BY created_at")
+        for namespace, key, size in cursor:
+            victims.append((namespace, key))
+            freed += size
+            if freed >= excess:
+                break
+        cursor.close()
+
+        conn.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", victims)
+        print(f"[Shared Cache] 🧹 Evicted {len(victims)} entries ({freed / 1024 / 1024:.1f} MB) "
+              f"to stay under {max_bytes / 1024 / 1024:.0f} MB")
+        return len(victims)
+    except sqlite3.Error as e:
+        print(f"[Shared Cache] ⚠️  Eviction failed: {str(e)}")
+        return 0
+
+
+def _maybe_run_maintenance(now: float) -> None:
+    """Purge expired entries and enforce the size cap, at most once per interval per worker."""
+    global _last_maintenance
+    if now - _last_maintenance < SHARED_CACHE_MAINTENANCE_SECONDS:
+        return
+    if not _maintenance_lock.acquire(blocking=False):
+        return
+    try:
+        _last_maintenance = now
+        removed = purge_expired()
+        if removed:
+            print(f"[Shared Cache] 🧹 Purged {removed} expired entries")
+        enforce_size_limit()
+    finally:
+        _maintenance_lock.release()
@@ -0,0 +1,266 @@
+"""
+Recordings storage manager for generated artifacts (processed audio, etc).
+
+- Atomic writes: data goes to a temp file in the target directory, is
+  fsync'ed and then renamed over the final name, so Node never sees a
+  half-written file
+- Free disk space is checked before writing
+- Every artifact is indexed per session in the shared SQLite database
+- Old artifacts are evicted by age and total size quota in a background
+  thread (at most every ARTIFACT_EVICTION_INTERVAL_SECONDS), so request
+  handling never waits on cleanup
+- Files produced on disk (post-processed WAVs) are moved in, never read
+
+Only files written through this module are ever evicted; Node's own
+recordings in the same directories are left alone.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.services.shared_cache import get_connection
+
+ARTIFACT_MAX_TOTAL_BYTES = int(os.getenv("ARTIFACT_MAX_TOTAL_BYTES", str(5 * 1024 ** 3)))
+ARTIFACT_MAX_AGE_SECONDS = float(os.getenv("ARTIFACT_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+MIN_FREE_DISK_BYTES = int(os.getenv("MIN_FREE_DISK_BYTES", str(512 * 1024 ** 2)))
+ARTIFACT_EVICTION_INTERVAL_SECONDS = float(os.getenv("ARTIFACT_EVICTION_INTERVAL_SECONDS", "60"))
+
+_verified_dirs = set()
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# Single background thread: evictions are serialized and never run on a request
+_eviction_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-eviction")
+_eviction_lock = threading.Lock()
+_last_eviction = 0.0
+
+
+class InsufficientDiskSpaceError(RuntimeError):
+    """Raised when writing an artifact would leave less than MIN_FREE_DISK_BYTES free."""
+
+
+def _db() -> sqlite3.Connection:
+    global _schema_ready
+    conn = get_connection()
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    path TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_session ON artifacts (session_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_created ON artifacts (created_at)")
+            _schema_ready = True
+    return conn
+
+
+def _ensure_directory(directory: Path) -> None:
+    """mkdir once per directory per process instead of on every request."""
+    key = str(directory)
+    if key in _verified_dirs and directory.is_dir():
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    _verified_dirs.add(key)
+
+
+def _check_free_space(directory: Path, size: int) -> None:
+    free = shutil.disk_usage(directory).free
+    if free - size < MIN_FREE_DISK_BYTES:
+        # Try to make room before giving up
+        evict_artifacts(force_bytes=size + MIN_FREE_DISK_BYTES - free)
+        free = shutil.disk_usage(directory).free
+        if free - size < MIN_FREE_DISK_BYTES:
+            raise InsufficientDiskSpaceError(
+                f"Not enough disk space in {directory}: {free} bytes free, "
+                f"{size} needed plus {MIN_FREE_DISK_BYTES} reserved"
+            )
+
+
+def _index_artifact(path: Path, session_id: str, kind: str, size: int) -> None:
+    try:
+        _db().execute(
+            "INSERT OR REPLACE INTO artifacts (path, session_id, kind, size_bytes, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (str(path.resolve()), session_id, kind, size, time.time()),
+        )
+    except sqlite3.Error as e:
+        print(f"[Storage] ⚠️  Failed to index artifact {path}: {str(e)}")
+
+
+def write_artifact(
+    directory: str,
+    filename: str,
+    data: bytes,
+    session_id: str,
+    kind: str = "processed_audio",
+) -> Path:
+    """
+    Atomically write `data` to directory/filename and index it.
+
+    Blocking: run in a worker thread when called from the event loop.
+    """
+    directory = Path(directory)
+    _ensure_directory(directory)
+    _check_free_space(directory, len(data))
+
+    final_path = directory / filename
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    _index_artifact(final_path, session_id, kind, len(data))
+    schedule_eviction()
+    return final_path
+
+
+def store_artifact_file(
+    source_path: str,
+    directory: str,
+    filename: str,
+    session_id: str,
+    kind: str = "processed_audio",
+) -> Path:
+    """
+    Move an already-written file (e.g. a post-processed WAV in a temp dir)
+    into the recordings directory without reading it into memory.
+    """
+    directory = Path(directory)
+    _ensure_directory(directory)
+    size = os.path.getsize(source_path)
+    _check_free_space(directory, size)
+
+    final_path = directory / filename
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{filename}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        # Copy next to the destination first so the final rename is atomic
+        # even when the source lives on another filesystem
+        shutil.move(source_path, tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    _index_artifact(final_path, session_id, kind, size)
+    schedule_eviction()
+    return final_path
+
+
+def list_session_artifacts(session_id: str) -> List[Dict[str, Any]]:
+    """All indexed artifacts of a session, newest first."""
+    rows = _db().execute(
+        "SELECT path, kind, size_bytes, created_at FROM artifacts "
+        "WHERE session_id = ? ORDER BY created_at DESC",
+        (session_id,),
+    ).fetchall()
+    return [
+        {"path": path, "filename": os.path.basename(path), "kind": kind,
+         "size_bytes": size, "created_at": created_at}
+        for path, kind, size, created_at in rows
+    ]
+
+
+def find_artifact(session_id: str, filename: str, kind: str = "processed_audio") -> Optional[str]:
+    """Path of the indexed `kind` artifact of a session with this file name, if any."""
+    rows = _db().execute(
+        "SELECT path FROM artifacts WHERE session_id = ? AND kind = ? ORDER BY created_at DESC",
+        (session_id, kind),
+    ).fetchall()
+    for (path,) in rows:
+        if os.path.basename(path) == filename:
+            return path
+    return None
+
+
+def evict_artifacts(force_bytes: int = 0) -> Dict[str, int]:
+    """
+    Delete artifacts older than ARTIFACT_MAX_AGE_SECONDS, then the oldest
+    ones until the total is under ARTIFACT_MAX_TOTAL_BYTES (and at least
+    `force_bytes` have been freed).
+    """
+    conn = _db()
+    removed = 0
+    freed = 0
+
+    def remove(path: str, size: int) -> None:
+        nonlocal removed, freed
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[Storage] ⚠️  Could not evict {path}: {str(e)}")
+            return
+        conn.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+        removed += 1
+        freed += size
+
+    cutoff = time.time() - ARTIFACT_MAX_AGE_SECONDS
+    for path, size in conn.execute(
+        "SELECT path, size_bytes FROM artifacts WHERE created_at < ?", (cutoff,)
+    ).fetchall():
+        remove(path, size)
+
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM artifacts").fetchone()[0]
+    if total > ARTIFACT_MAX_TOTAL_BYTES or freed < force_bytes:
+        for path, size in conn.execute(
+            "SELECT path, size_bytes FROM artifacts ORDER BY created_at ASC"
+        ).fetchall():
+            if total <= ARTIFACT_MAX_TOTAL_BYTES and freed >= force_bytes:
+                break
+            remove(path, size)
+            total -= size
+
+    if removed:
+        print(f"[Storage] 🧹 Evicted {removed} artifact(s), freed {freed / 1024 / 1024:.1f} MB")
+    return {"removed": removed, "freed_bytes": freed}
+
+
+def schedule_eviction() -> None:
+    """
+    Run eviction in the background thread, at most once per
+    ARTIFACT_EVICTION_INTERVAL_SECONDS (it scans the artifacts table);
+    never blocks the caller.
+    """
+    global _last_eviction
+    with _eviction_lock:
+        now = time.monotonic()
+        if _last_eviction and now - _last_eviction < ARTIFACT_EVICTION_INTERVAL_SECONDS:
+            return
+        _last_eviction = now
+
+    def run() -> None:
+        try:
+            evict_artifacts()
+        except Exception as e:
+            print(f"[Storage] ⚠️  Eviction failed: {str(e)}")
+
+    _eviction_executor.submit(run)
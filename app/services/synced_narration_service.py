@@ -3,20 +3,105 @@ Service to generate synced narration using RAG context from DOM events
 and raw user transcript. Uses Gemini to create narration that matches
 the timing and actions from screen recordings.
 """
-import google.generativeai as genai
-from typing import List, Dict, Optional
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Optional
 from dotenv import load_dotenv
 import os
 import re
+import time
 from app.models.dom_event_models import RecordingSession
-from app.services.rag_service import build_rag_context_from_events, build_timeline_context, extract_ui_elements_summary
+from app.services.capture_service import upstream_call
+from app.services.event_coalescing_service import EVENT_COALESCING_ENABLED, coalesce_session
+from app.services.gemini_client import gemini_model
+from app.services.prompt_cache_service import generate_text, join_prompt
+from app.services.rag_service import (
+    build_rag_context_from_events,
+    build_step_contexts,
+    build_timeline_context,
+    extract_ui_elements_summary,
+)
+from app.services.shared_cache import make_cache_key
 
 load_dotenv()
 
-API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=API_KEY)
+MODEL_NAME = "gemini-2.5-flash"
+STEP_NARRATION_CONCURRENCY = int(os.getenv("STEP_NARRATION_CONCURRENCY", "8"))
+STEP_CONTEXT_MAX_EVENTS = int(os.getenv("STEP_CONTEXT_MAX_EVENTS", "40"))
 
-model = genai.GenerativeModel("gemini-2.5-flash")
+model = gemini_model(MODEL_NAME)
+
+_WHITESPACE = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"\s+([.,!?])")
+# Position/timing parts of a step context (see rag_service._build_step_context)
+_STEP_HEADER = re.compile(r"^Step \d+ \(Duration: [\d.]+s\):\n?")
+_EVENT_TIME = re.compile(r"^  \[[\d.]+s\] ", re.MULTILINE)
+
+# Static prompt prefixes, identical for every request (see prompt_cache_service)
+SYNCED_PROMPT_PREFIX = """
+You are an AI that creates professional product demo narration synchronized with screen recordings.
+
+Each request gives you the context from the screen recording (DOM events), the UI
+elements interacted with, a timeline of actions and the raw user transcript.
+
+TASK:
+Generate a clean, professional product demo narration that:
+1. Syncs with the actions shown in the screen recording (use the timeline)
+2. Describes what the user is doing at each step
+3. Maintains the natural flow from the raw transcript
+4. Adds professional polish while keeping the original intent
+5. References specific UI elements and actions from the context
+6. Matches the timing and sequence of interactions
+
+OUTPUT RULES:
+- Single continuous paragraph (no line breaks)
+- Use present tense to describe actions ("Click the button" not "Clicked")
+- Reference specific UI elements when mentioned in context
+- Keep narration concise and professional
+- Maintain similar length to raw transcript (±20%)
+- NO newline characters
+- Add proper punctuation
+- Remove filler words (um, uh, like, etc.)
+""".strip()
+
+STEP_BY_STEP_PROMPT_PREFIX = """
+You are an AI that creates step-by-step product demo narration synchronized with screen recordings.
+
+Each request gives you the context from the screen recording, a timeline of actions
+and the raw user transcript.
+
+TASK:
+Generate step-by-step narration where each step corresponds to a logical action group from the screen recording.
+Each step should:
+1. Have a clear action description
+2. Reference specific UI elements from the context
+3. Match the timing from the timeline
+4. Use the raw transcript as inspiration for natural language
+
+OUTPUT FORMAT:
+Step 1: [narration for first action group]
+Step 2: [narration for second action group]
+...
+
+Each step should be a single sentence or short paragraph describing what happens in that step.
+""".strip()
+
+STEP_PROMPT_PREFIX = """
+You are an AI that writes one step of a step-by-step product demo narration synchronized with a screen recording.
+
+Each request gives you the step's position and time range, the screen actions in that
+step and what the presenter said during it.
+
+TASK:
+Write the narration for this step only: one or two sentences describing what happens,
+referencing the specific UI elements given and using the presenter's words as inspiration.
+
+OUTPUT RULES:
+- No "Step N:" prefix
+- Present tense actions ("click the button")
+- No newline characters
+- Remove filler words (um, uh, like, etc.)
+""".strip()
 
 
 def clean_output(text: str) -> str:
@@ -25,8 +110,8 @@ def clean_output(text: str) -> str:
         return ""
     
     text = text.replace("\n", " ")
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r"\s+([.,!?])", r"\1", text)
+    text = _WHITESPACE.sub(" ", text)
+    text = _SPACE_BEFORE_PUNCTUATION.sub(r"\1", text)
     
     return text.strip()
 
@@ -45,15 +130,16 @@ def generate_synced_narration(
     Returns:
         Dictionary with synced narration and metadata
     """
+    if EVENT_COALESCING_ENABLED:
+        session, _ = coalesce_session(session)
+
     # Build RAG context from DOM events
     rag_context = build_rag_context_from_events(session)
     timeline = build_timeline_context(session.events)
     ui_summary = extract_ui_elements_summary(session.events)
     
-    # Create comprehensive prompt with context
-    prompt = f"""
-You are an AI that creates professional product demo narration synchronized with screen recordings.
-
+    # Per-request context; the instructions are in SYNCED_PROMPT_PREFIX
+    prompt_suffix = f"""
 CONTEXT FROM SCREEN RECORDING (DOM Events):
 {rag_context}
 
@@ -66,31 +152,11 @@ TIMELINE OF ACTIONS:
 RAW USER TRANSCRIPT:
 {raw_text}
 
-TASK:
-Generate a clean, professional product demo narration that:
-1. Syncs with the actions shown in the screen recording (use the timeline above)
-2. Describes what the user is doing at each step
-3. Maintains the natural flow from the raw transcript
-4. Adds professional polish while keeping the original intent
-5. References specific UI elements and actions from the context
-6. Matches the timing and sequence of interactions
-
-OUTPUT RULES:
-- Single continuous paragraph (no line breaks)
-- Use present tense to describe actions ("Click the button" not "Clicked")
-- Reference specific UI elements when mentioned in context
-- Keep narration concise and professional
-- Maintain similar length to raw transcript (±20%)
-- NO newline characters
-- Add proper punctuation
-- Remove filler words (um, uh, like, etc.)
-
 SYNCED NARRATION:
 """
     
     try:
-        response = model.generate_content(prompt)
-        synced_narration = clean_output(response.text)
+        synced_narration = clean_output(generate_text(model, MODEL_NAME, SYNCED_PROMPT_PREFIX, prompt_suffix))
         
         return {
             "synced_narration": synced_narration,
@@ -137,12 +203,13 @@ def generate_step_by_step_narration(
     Returns:
         Dictionary with step-by-step narration
     """
+    if EVENT_COALESCING_ENABLED:
+        session, _ = coalesce_session(session)
+
     rag_context = build_rag_context_from_events(session)
     timeline = build_timeline_context(session.events)
     
-    prompt = f"""
-You are an AI that creates step-by-step product demo narration synchronized with screen recordings.
-
+    prompt_suffix = f"""
 CONTEXT FROM SCREEN RECORDING:
 {rag_context}
 
@@ -151,26 +218,10 @@ TIMELINE OF ACTIONS:
 
 RAW USER TRANSCRIPT:
 {raw_text}
-
-TASK:
-Generate step-by-step narration where each step corresponds to a logical action group from the screen recording.
-Each step should:
-1. Have a clear action description
-2. Reference specific UI elements from the context
-3. Match the timing from the timeline
-4. Use the raw transcript as inspiration for natural language
-
-OUTPUT FORMAT:
-Step 1: [narration for first action group]
-Step 2: [narration for second action group]
-...
-
-Each step should be a single sentence or short paragraph describing what happens in that step.
 """
     
     try:
-        response = model.generate_content(prompt)
-        step_narration = response.text.strip()
+        step_narration = generate_text(model, MODEL_NAME, STEP_BY_STEP_PROMPT_PREFIX, prompt_suffix).strip()
         
         # Parse steps if possible
         steps = _parse_steps(step_narration)
@@ -215,3 +266,173 @@ def _parse_steps(narration: str) -> List[Dict]:
     
     return steps
 
+
+def step_fingerprint(step: Dict[str, Any], transcript: str) -> str:
+    """
+    Identity of a step's narration inputs: its described actions and its
+    part of the transcript, without step number or timestamps (a trim
+    earlier in the recording shifts both without changing the narration).
+    """
+    actions = _EVENT_TIME.sub("  ", _STEP_HEADER.sub("", step["context"]))
+    return make_cache_key(actions, transcript)
+
+
+def generate_concurrent_step_narration(
+    raw_text: str,
+    session: RecordingSession,
+    words: Optional[List[Dict[str, Any]]] = None,
+    previous_steps: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Generate step-by-step narration with one independent Gemini request per
+    step, run concurrently. Each request only sees its own step's actions and
+    the part of the transcript spoken during it, so wall time is bounded by
+    the slowest step instead of one prompt covering the whole recording.
+
+    Args:
+        raw_text: Raw user transcript
+        session: RecordingSession with DOM events
+        words: Optional Deepgram word timings, to split the transcript by step
+               (otherwise it is split proportionally to step time)
+        previous_steps: Optional `steps` of an earlier result for this
+               recording; steps whose fingerprint is unchanged keep their
+               narration instead of going to Gemini
+
+    Returns:
+        Dictionary with per-step narration (with start/end timestamps and
+        fingerprint) and the joined narration
+    """
+    if EVENT_COALESCING_ENABLED:
+        session, _ = coalesce_session(session)
+
+    step_contexts = build_step_contexts(session.events, STEP_CONTEXT_MAX_EVENTS)
+    if not step_contexts:
+        return {
+            "steps": [],
+            "narration": "",
+            "raw_text": raw_text,
+            "session_id": session.sessionId,
+            "error": "No DOM events to build steps from"
+        }
+
+    transcripts = _split_transcript_by_step(raw_text, words, step_contexts, session)
+    fingerprints = [step_fingerprint(step, transcript) for step, transcript in zip(step_contexts, transcripts)]
+
+    reusable = {
+        step["fingerprint"]: step["narration"]
+        for step in previous_steps or []
+        if step.get("fingerprint") and step.get("narration")
+    }
+    changed = [i for i, fingerprint in enumerate(fingerprints) if fingerprint not in reusable]
+    print(f"[Synced Narration] Narrating {len(changed)} of {len(step_contexts)} steps concurrently "
+          f"(up to {STEP_NARRATION_CONCURRENCY} at a time)")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=STEP_NARRATION_CONCURRENCY) as pool:
+        narrated = dict(zip(changed, pool.map(
+            lambda i: _narrate_step(step_contexts[i], transcripts[i], len(step_contexts)),
+            changed
+        )))
+    wall_seconds = time.perf_counter() - start
+
+    steps = []
+    for i, (step, transcript, fingerprint) in enumerate(zip(step_contexts, transcripts, fingerprints)):
+        if i in narrated:
+            result = narrated[i]
+        else:
+            result = _step_result(step, transcript)
+            result["narration"] = reusable[fingerprint]
+            result["reused"] = True
+        result["fingerprint"] = fingerprint
+        steps.append(result)
+
+    failed = [step for step in steps if step.get("error")]
+    print(f"[Synced Narration] ✅ {len(steps) - len(failed)}/{len(steps)} steps narrated in {wall_seconds:.2f}s")
+
+    result = {
+        "steps": steps,
+        "narration": " ".join(step["narration"] for step in steps if step["narration"]),
+        "raw_text": raw_text,
+        "rag_context_used": True,
+        "wall_seconds": round(wall_seconds, 3),
+        "reused_steps": len(step_contexts) - len(changed),
+        "session_id": session.sessionId
+    }
+    if failed:
+        result["error"] = f"{len(failed)} step(s) failed"
+    return result
+
+
+def _split_transcript_by_step(
+    raw_text: str,
+    words: Optional[List[Dict[str, Any]]],
+    step_contexts: List[Dict[str, Any]],
+    session: RecordingSession
+) -> List[str]:
+    """
+    Assign the transcript to steps. Step i owns the speech from its start
+    until the next step starts (the first step also owns anything before it).
+    """
+    # Steps are chronological, so their starts are sorted: O(log steps) per word
+    boundaries = [step["start_ms"] / 1000.0 for step in step_contexts[1:]]
+
+    def step_index(seconds: float) -> int:
+        return bisect.bisect_right(boundaries, seconds)
+
+    buckets: List[List[str]] = [[] for _ in step_contexts]
+
+    if words:
+        for word in words:
+            text = word.get("punctuated_word") or word.get("word", "")
+            buckets[step_index(word.get("start", 0.0))].append(text)
+    else:
+        # No timings: spread the words evenly over the recording
+        tokens = raw_text.split()
+        duration = max((session.endTime - session.startTime) / 1000.0, step_contexts[-1]["end_ms"] / 1000.0, 1e-6)
+        for i, token in enumerate(tokens):
+            buckets[step_index(i / len(tokens) * duration)].append(token)
+
+    return [" ".join(bucket) for bucket in buckets]
+
+
+def _step_result(step: Dict[str, Any], transcript: str) -> Dict[str, Any]:
+    return {
+        "step_number": step["step_number"],
+        "start_time": step["start_ms"] / 1000.0,
+        "end_time": step["end_ms"] / 1000.0,
+        "event_count": step["event_count"],
+        "transcript": transcript,
+    }
+
+
+def _narrate_step(step: Dict[str, Any], transcript: str, total_steps: int) -> Dict[str, Any]:
+    """One Gemini request for one step."""
+    start_s = step["start_ms"] / 1000.0
+    end_s = step["end_ms"] / 1000.0
+
+    prompt_suffix = f"""
+This is step {step["step_number"]} of {total_steps} ({start_s:.1f}s to {end_s:.1f}s).
+
+SCREEN ACTIONS IN THIS STEP:
+{step["context"]}
+
+WHAT THE PRESENTER SAID DURING THIS STEP:
+{transcript or "(nothing)"}
+
+STEP NARRATION:
+""".strip()
+
+    result = _step_result(step, transcript)
+
+    try:
+        text = upstream_call(
+            "gemini", (MODEL_NAME, join_prompt(STEP_PROMPT_PREFIX, prompt_suffix)),
+            lambda: generate_text(model, MODEL_NAME, STEP_PROMPT_PREFIX, prompt_suffix)
+        )
+        result["narration"] = re.sub(r"^step\s+\d+:\s*", "", clean_output(text), flags=re.IGNORECASE)
+    except Exception as e:
+        print(f"[Synced Narration] ❌ Step {step['step_number']} failed: {str(e)}")
+        result["narration"] = None
+        result["error"] = str(e)
+
+    return result
@@ -0,0 +1,266 @@
+"""
+Streaming upload handling for screen recording video/audio files.
+
+Multipart /process-recording bodies are parsed straight from the request
+stream (python-multipart's push parser): file parts are written to the
+spool directory in UPLOAD_CHUNK_BYTES batches on a worker thread while
+their SHA-256 is computed, so multi-GB recordings never sit in memory and
+are written exactly once. A request whose Content-Length already exceeds
+the limits is rejected before any of it is read; an oversized part stops
+the upload as soon as it crosses MAX_UPLOAD_BYTES.
+
+Files are stored content-addressed (by hash), which deduplicates re-uploads
+of the same recording, and downstream stages receive a MediaFileRef instead
+of bytes. Spooled files not uploaded again within UPLOAD_RETENTION_SECONDS
+are removed (checked at most hourly per worker).
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from app.models.dom_event_models import MediaFileRef
+
+try:
+    try:
+        from python_multipart.multipart import MultipartParser, parse_options_header
+    except ModuleNotFoundError:
+        from multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:
+    MultipartParser = parse_options_header = None
+
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", ".cache/uploads")
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(4 * 1024 ** 3)))
+MAX_SESSION_FIELD_BYTES = int(os.getenv("MAX_SESSION_FIELD_BYTES", str(256 * 1024 ** 2)))
+UPLOAD_RETENTION_SECONDS = float(os.getenv("UPLOAD_RETENTION_SECONDS", str(24 * 3600)))
+
+# Multipart parts spooled to disk; every other file part is skipped
+UPLOAD_FIELDS = ("video", "audio")
+
+_last_prune = 0.0
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+
+class _SpoolFile:
+    """One file part being written to the spool directory, hashed as it arrives."""
+
+    def __init__(self, kind: str, filename: Optional[str], content_type: Optional[str], max_bytes: int):
+        self.kind = kind
+        self.filename = filename
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.spool_dir = Path(UPLOAD_SPOOL_DIR) / kind
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+        fd, self.tmp_path = tempfile.mkstemp(dir=self.spool_dir, prefix=".upload.", suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds {self.max_bytes} bytes")
+        self.digest.update(data)
+        self.file.write(data)
+
+    def abort(self) -> None:
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def finish(self) -> MediaFileRef:
+        self.file.close()
+        sha256 = self.digest.hexdigest()
+        extension = Path(self.filename or "").suffix.lower()
+        final_path = self.spool_dir / f"{sha256}{extension}"
+
+        deduplicated = final_path.exists()
+        if deduplicated:
+            os.remove(self.tmp_path)
+            # Uploaded again: restart its retention period
+            os.utime(final_path)
+        else:
+            os.replace(self.tmp_path, final_path)
+
+        print(f"[Upload] {'♻️  Deduplicated' if deduplicated else '✅ Stored'} {self.kind} upload "
+              f"'{self.filename}' ({self.size / 1024 / 1024:.1f} MB, sha256 {sha256[:12]}...)")
+
+        return MediaFileRef(
+            path=str(final_path.resolve()),
+            filename=self.filename,
+            contentType=self.content_type,
+            sizeBytes=self.size,
+            sha256=sha256,
+            deduplicated=deduplicated,
+        )
+
+
+class _RecordingMultipart:
+    """
+    python-multipart callbacks for a /process-recording body. `feed` runs on
+    a worker thread, so the spool writes in the callbacks never block the
+    event loop.
+    """
+
+    def __init__(self, boundary: bytes, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.session: Optional[bytearray] = None
+        self.uploads: Dict[str, MediaFileRef] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._name: Optional[str] = None
+        self._spool: Optional[_SpoolFile] = None
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+        self._name = None
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options[b"filename"].decode("utf-8", "replace") if b"filename" in options else None
+
+        if name == "session":
+            self._name = name
+            self.session = bytearray()
+        elif name in UPLOAD_FIELDS and filename is not None and name not in self.uploads:
+            self._name = name
+            content_type = self._headers.get(b"content-type")
+            self._spool = _SpoolFile(
+                name, filename, content_type.decode("latin-1") if content_type else None, self.max_bytes
+            )
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._spool is not None:
+            self._spool.write(data[start:end])
+        elif self._name == "session":
+            if len(self.session) + end - start > MAX_SESSION_FIELD_BYTES:
+                raise UploadTooLargeError(f"Session field exceeds {MAX_SESSION_FIELD_BYTES} bytes")
+            self.session += data[start:end]
+
+    def _on_part_end(self) -> None:
+        if self._spool is not None:
+            spool, self._spool = self._spool, None
+            self.uploads[spool.kind] = spool.finish()
+        self._name = None
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.write(chunk)
+
+    def finalize(self) -> None:
+        self._parser.finalize()
+
+    def abort(self) -> None:
+        if self._spool is not None:
+            self._spool.abort()
+            self._spool = None
+
+
+async def read_recording_multipart(
+    request: Request,
+    max_bytes: int = MAX_UPLOAD_BYTES
+) -> Tuple[Optional[bytes], Dict[str, MediaFileRef]]:
+    """
+    Stream a multipart /process-recording body: the `session` field is kept
+    in memory (up to MAX_SESSION_FIELD_BYTES), `video`/`audio` file parts
+    are spooled to disk as they arrive.
+
+    Returns:
+        (session field bytes or None, {"video"/"audio": MediaFileRef})
+
+    Raises:
+        HTTPException(413) when the body or a part is too large,
+        HTTPException(400) for a malformed body
+    """
+    if MultipartParser is None:
+        raise HTTPException(status_code=500, detail="python-multipart is required for multipart uploads")
+
+    content_length = request.headers.get("content-length", "")
+    max_request_bytes = max_bytes * len(UPLOAD_FIELDS) + MAX_SESSION_FIELD_BYTES + 64 * 1024
+    if content_length.isdigit() and int(content_length) > max_request_bytes:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds {max_request_bytes} bytes")
+
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing boundary in multipart body")
+
+    form = _RecordingMultipart(boundary, max_bytes)
+    buffer = bytearray()
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            # Batched, so the thread hop is per MB rather than per ASGI message
+            if len(buffer) >= UPLOAD_CHUNK_BYTES:
+                await asyncio.to_thread(form.feed, bytes(buffer))
+                buffer.clear()
+        await asyncio.to_thread(form.feed, bytes(buffer))
+        form.finalize()
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"Upload too large: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {str(e)}")
+    finally:
+        form.abort()
+        await asyncio.to_thread(prune_spool)
+
+    return (bytes(form.session) if form.session is not None else None), form.uploads
+
+
+def prune_spool() -> int:
+    """
+    Remove spooled uploads (and abandoned temp files) older than
+    UPLOAD_RETENTION_SECONDS, at most hourly per worker. Returns how many.
+    """
+    global _last_prune
+    if time.time() - _last_prune < 3600:
+        return 0
+    _last_prune = time.time()
+
+    cutoff = time.time() - UPLOAD_RETENTION_SECONDS
+    removed = 0
+    for kind_dir in Path(UPLOAD_SPOOL_DIR).glob("*"):
+        if not kind_dir.is_dir():
+            continue
+        for path in kind_dir.iterdir():
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    if removed:
+        print(f"[Upload] 🧹 Pruned {removed} spooled upload(s) older than {UPLOAD_RETENTION_SECONDS:.0f}s")
+    return removed
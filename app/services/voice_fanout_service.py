@@ -0,0 +1,130 @@
+"""
+Multi-voice / multi-format rendering of one script.
+
+A request can list several TTS targets (voice model + format). The script
+is generated once, then split into sentences, and every (sentence, target)
+pair becomes one TTS call. All calls run concurrently on one shared pool
+(FANOUT_TTS_CONCURRENCY per worker):
+
+- Each sentence clip is cached in the shared audio cache under its voice,
+  format and text. A sentence rendered before (by any request or worker,
+  e.g. an unchanged sentence after a script edit) is not synthesized again,
+  and a sentence repeated in the script is requested once.
+- Clips are joined per target. MP3 frames concatenate as they are; WAV
+  targets are synthesized as raw PCM and get a single header.
+
+All renditions are written in one pass (save_renditions). The cost of N
+targets is N x TTS, never N x (script + TTS).
+"""
+import contextvars
+import io
+import os
+import time
+import wave
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from app.models.request_models import AudioTarget
+from app.services.audio_postprocess_service import SAMPLE_WIDTH
+from app.services.elevenlabs_service import chunk_by_sentence, generate_voice_from_text, synthesize_pcm
+from app.services.storage_service import write_artifact
+
+FANOUT_TTS_CONCURRENCY = int(os.getenv("FANOUT_TTS_CONCURRENCY", "8"))
+
+# Shared by all requests of the worker, so the cap holds across requests
+_tts_pool = ThreadPoolExecutor(max_workers=FANOUT_TTS_CONCURRENCY, thread_name_prefix="tts-fanout")
+
+
+def target_key(target: AudioTarget) -> Tuple[str, str, int]:
+    """What makes two targets render the same bytes."""
+    rate = target.sample_rate if target.format == "wav" else target.bit_rate
+    return (target.voice, target.format, rate)
+
+
+def target_label(target: AudioTarget) -> str:
+    """Short filename-safe name of a target, e.g. aura-2-thalia-en_32k."""
+    voice, audio_format, rate = target_key(target)
+    return f"{voice}_{rate // 1000}k" if audio_format == "mp3" else f"{voice}_{rate}hz"
+
+
+def _synthesize_clip(sentence: str, target: AudioTarget) -> bytes:
+    if target.format == "wav":
+        return synthesize_pcm(sentence, target.voice, target.sample_rate)
+    return generate_voice_from_text(sentence, target.voice, target.bit_rate)
+
+
+def _wav_bytes(pcm: bytes, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def render_targets(script: str, targets: List[AudioTarget]) -> List[bytes]:
+    """
+    Audio of `script` for every target, in the order of `targets`.
+
+    Raises the first TTS error, once every call has settled.
+    """
+    sentences = chunk_by_sentence(script)
+
+    # One call per distinct (target, sentence), whichever targets/sentences repeat
+    clips: Dict[Tuple[Tuple[str, str, int], str], Future] = {}
+    for target in targets:
+        for sentence in sentences:
+            unit = (target_key(target), sentence)
+            if unit not in clips:
+                # Each call runs in a copy of this context (capture/replay recorder)
+                clips[unit] = _tts_pool.submit(
+                    contextvars.copy_context().run, _synthesize_clip, sentence, target
+                )
+
+    print(f"[TTS Fan-out] {len(sentences)} sentence(s) x {len(targets)} target(s): "
+          f"{len(clips)} distinct clip(s)")
+
+    errors = [future.exception() for future in clips.values()]
+    for error in errors:
+        if error is not None:
+            raise error
+
+    rendered = []
+    for target in targets:
+        key = target_key(target)
+        audio = b"".join(clips[(key, sentence)].result() for sentence in sentences)
+        rendered.append(_wav_bytes(audio, target.sample_rate) if target.format == "wav" else audio)
+    return rendered
+
+
+def save_renditions(
+    script: str,
+    targets: List[AudioTarget],
+    recordings_path: str,
+    session_id: str
+) -> List[Dict[str, Any]]:
+    """
+    Render `script` for every target and write each rendition into
+    `recordings_path` (targets listed twice share one file).
+
+    Returns:
+        One entry per target, in order: the target plus its filename and size
+    """
+    rendered = render_targets(script, targets)
+    timestamp = int(time.time() * 1000)
+
+    renditions = []
+    saved: Dict[Tuple[str, str, int], str] = {}
+    for target, audio_bytes in zip(targets, rendered):
+        key = target_key(target)
+        if key not in saved:
+            filename = f"processed_audio_{session_id}_{timestamp}_{target_label(target)}.{target.format}"
+            write_artifact(recordings_path, filename, audio_bytes, session_id)
+            saved[key] = filename
+        renditions.append({
+            **target.model_dump(),
+            "processed_audio_filename": saved[key],
+            "audio_size_bytes": len(audio_bytes),
+        })
+    return renditions
@@ -0,0 +1,184 @@
+"""
+Startup warm-up, so the first requests after a deploy don't pay cold costs.
+
+Run from the lifespan in the background; `/ready` answers 503 until it has
+finished, so load balancers keep traffic away from cold workers:
+
+1. Upstream connections: a cheap countTokens call per Gemini model opens the
+   client channel, and WARMUP_TTS_CONNECTIONS parallel requests fill the
+   Deepgram keep-alive pool (any HTTP answer will do)
+2. Models: the request/session validators run once on a synthetic payload,
+   and the OpenAPI schema is built
+3. Synthetic pass (WARMUP_SYNTHETIC_REQUEST=1): the pipeline's local stages
+   (timing analysis, coalescing, RAG/timeline context, output cleanup,
+   sentence chunking, DOM conversion and response encoding) run on the
+   synthetic payload. Provider calls are left out, so nothing from the
+   warm-up reaches the shared caches, templates or the Node outbox.
+
+Every step is best-effort: a failure is logged and reported in the status,
+and the worker becomes ready anyway.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from app.models.dom_event_models import RecordingSession
+from app.models.request_models import AudioProcessRequest
+from app.services import gemini_service, script_generation_service, synced_narration_service
+from app.services.dom_event_service import build_process_recording_payload
+from app.services.elevenlabs_service import DEEPGRAM_SPEAK_URL, chunk_by_sentence, http_session
+from app.services.event_coalescing_service import coalesce_session
+from app.services.rag_service import (
+    build_rag_context_from_events,
+    build_step_contexts,
+    build_timeline_context,
+    extract_ui_elements_summary,
+)
+from app.services.response_encoding_service import encode_response
+from app.services.script_generation_service import (
+    _clean_script_output,
+    analyze_word_timings,
+    build_draft_script,
+    build_timing_context,
+)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_SYNTHETIC_REQUEST = os.getenv("WARMUP_SYNTHETIC_REQUEST", "1") == "1"
+WARMUP_TTS_CONNECTIONS = int(os.getenv("WARMUP_TTS_CONNECTIONS", "2"))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10"))
+
+_status: Dict[str, Any] = {"ready": not WARMUP_ENABLED, "steps": {}}
+
+_SYNTHETIC_TRANSCRIPT = (
+    "So um here we open the dashboard and uh click settings. Then you can see the usage "
+    "for the last seven days. This button exports the report."
+)
+
+
+def readiness() -> Dict[str, Any]:
+    """Whether this worker finished warming up, with per-step results."""
+    return _status
+
+
+def _synthetic_words() -> List[Dict[str, Any]]:
+    words = []
+    start = 0.5
+    for token in _SYNTHETIC_TRANSCRIPT.split():
+        # A pause before "Then" so gap detection has something to find
+        start += 2.0 if token == "Then" else 0.35
+        words.append({
+            "word": token.strip(".,").lower(),
+            "punctuated_word": token,
+            "start": start,
+            "end": start + 0.3,
+            "confidence": 0.6 if token in ("um", "uh") else 0.98,
+        })
+    return words
+
+
+def _synthetic_session() -> Dict[str, Any]:
+    metadata = {"url": "https://warmup.invalid/usage", "viewport": {"width": 1536, "height": 695}}
+    button = {
+        "tag": "BUTTON", "id": None, "classes": [], "text": "Settings",
+        "selector": "[data-testid='settings']", "attributes": {"data-testid": "settings"},
+        "bbox": {"x": 100, "y": 40, "width": 120, "height": 36}, "type": None, "name": None,
+    }
+    search = {**button, "tag": "INPUT", "text": "", "type": "text",
+              "selector": "[data-testid='search']", "attributes": {"data-testid": "search"}}
+    events: List[Dict[str, Any]] = [{"timestamp": 500, "type": "click", "target": button, "metadata": metadata}]
+    events += [
+        {"timestamp": 900 + 150 * i, "type": "type", "target": search, "value": "report"[:i + 1], "metadata": metadata}
+        for i in range(6)
+    ]
+    events += [
+        {"timestamp": 4000 + 200 * i, "type": "scroll",
+         "metadata": {**metadata, "scrollPosition": {"x": 0, "y": 100 * (i + 1)}}}
+        for i in range(5)
+    ]
+    events.append({"timestamp": 6000, "type": "step_change", "metadata": metadata})
+    return {
+        "sessionId": "warmup", "startTime": 0, "endTime": 8000,
+        "url": metadata["url"], "viewport": metadata["viewport"], "events": events,
+    }
+
+
+def _warm_gemini() -> None:
+    for service in (script_generation_service, synced_narration_service, gemini_service):
+        service.model.count_tokens("warm-up", request_options={"timeout": WARMUP_TIMEOUT_SECONDS})
+
+
+def _warm_tts() -> None:
+    def connect(_: int) -> None:
+        # Only the connection matters: the answer (405, 401, ...) is ignored
+        http_session.head(DEEPGRAM_SPEAK_URL, timeout=WARMUP_TIMEOUT_SECONDS)
+
+    with ThreadPoolExecutor(max_workers=WARMUP_TTS_CONNECTIONS) as pool:
+        list(pool.map(connect, range(WARMUP_TTS_CONNECTIONS)))
+
+
+def _warm_models(app: Any) -> None:
+    AudioProcessRequest.model_validate({
+        "text": _SYNTHETIC_TRANSCRIPT,
+        "deepgramData": {"words": _synthetic_words(), "sentences": [], "paragraphs": []},
+        "session": _synthetic_session(),
+        "recordingsPath": "/tmp",
+        "metadata": {"sessionId": "warmup"},
+    })
+    app.openapi()
+
+
+def _warm_pipeline() -> None:
+    session = RecordingSession.model_validate(_synthetic_session())
+    build_timing_context(analyze_word_timings(_synthetic_words()))
+    draft = build_draft_script(_SYNTHETIC_TRANSCRIPT, _synthetic_words())
+    chunk_by_sentence(_clean_script_output(f"**{draft['script']}**\n"))
+
+    coalesced, _ = coalesce_session(session)
+    build_rag_context_from_events(coalesced)
+    build_timeline_context(coalesced.events)
+    extract_ui_elements_summary(coalesced.events)
+    build_step_contexts(coalesced.events)
+
+    encode_response(build_process_recording_payload(session), "application/json", "gzip")
+
+
+def _run_step(name: str, step: Callable[[], None]) -> None:
+    start = time.perf_counter()
+    try:
+        step()
+        _status["steps"][name] = {"ok": True}
+    except Exception as e:
+        print(f"[Warm-up] ⚠️  {name} failed: {str(e)}")
+        _status["steps"][name] = {"ok": False, "error": str(e)}
+    _status["steps"][name]["seconds"] = round(time.perf_counter() - start, 3)
+
+
+def _run_warmup(app: Any) -> None:
+    start = time.perf_counter()
+    steps = [
+        ("gemini_connections", _warm_gemini),
+        ("tts_connections", _warm_tts),
+        ("models", lambda: _warm_models(app)),
+    ]
+    if WARMUP_SYNTHETIC_REQUEST:
+        steps.append(("synthetic_pipeline", _warm_pipeline))
+
+    for name, step in steps:
+        _run_step(name, step)
+
+    _status["seconds"] = round(time.perf_counter() - start, 3)
+    failed = [name for name, result in _status["steps"].items() if not result["ok"]]
+    print(f"[Warm-up] ✅ Worker {os.getpid()} warm in {_status['seconds']:.2f}s"
+          + (f" ({', '.join(failed)} failed)" if failed else ""))
+
+
+async def run_warmup(app: Any) -> None:
+    """Warm this worker (serving `app`) up off the event loop, then mark it ready."""
+    if not WARMUP_ENABLED:
+        return
+    try:
+        await asyncio.to_thread(_run_warmup, app)
+    finally:
+        _status["ready"] = True
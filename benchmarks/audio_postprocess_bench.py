@@ -0,0 +1,109 @@
+"""
+Throughput benchmark for the audio post-processing stage.
+
+Generates test tones locally (no network): a quiet narration-like tone with
+leading/trailing silence and a background bed, then measures how fast
+trimming, normalization and mixing run and how much memory they use.
+
+Usage:
+    python -m benchmarks.audio_postprocess_bench --seconds 600
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+from array import array
+from pathlib import Path
+
+from app.services.audio_postprocess_service import SAMPLE_RATE, postprocess_pcm_file
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def write_tone_pcm(path: str, seconds: float, frequency: float, level_dbfs: float,
+                   sample_rate: int = SAMPLE_RATE, silence_seconds: float = 0.0) -> None:
+    """Raw 16-bit mono sine tone, written one second at a time."""
+    amplitude = 32767 * 10 ** (level_dbfs / 20)
+    silence = array("h", [0] * sample_rate).tobytes()
+
+    with open(path, "wb") as f:
+        for _ in range(int(silence_seconds)):
+            f.write(silence)
+        for second in range(int(seconds)):
+            offset = second * sample_rate
+            chunk = array("h", (
+                int(amplitude * math.sin(2 * math.pi * frequency * (offset + i) / sample_rate))
+                for i in range(sample_rate)
+            ))
+            f.write(chunk.tobytes())
+        for _ in range(int(silence_seconds)):
+            f.write(silence)
+
+
+def write_tone_wav(path: str, seconds: float, frequency: float, sample_rate: int = 44100) -> None:
+    """Stereo 44.1 kHz background bed, to exercise on-the-fly conversion."""
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        samples = array("h")
+        for i in range(int(seconds * sample_rate)):
+            value = int(8000 * math.sin(2 * math.pi * frequency * i / sample_rate))
+            samples.extend((value, value))
+        wav.writeframes(samples.tobytes())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=300)
+    parser.add_argument("--no-background", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        narration = os.path.join(tmp_dir, "narration.pcm")
+        background = os.path.join(tmp_dir, "bed.wav")
+        output = os.path.join(tmp_dir, "out.wav")
+
+        write_tone_pcm(narration, args.seconds, 220.0, -30.0, silence_seconds=2)
+        write_tone_wav(background, 7.5, 110.0)
+
+        sys.stdout = open(os.devnull, "w")
+        tracemalloc.start()
+        start = time.perf_counter()
+        stats = postprocess_pcm_file(
+            narration, output,
+            background_path=None if args.no_background else background,
+        )
+        elapsed = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        sys.stdout = sys.__stdout__
+
+        input_seconds = args.seconds + 4
+        result = {
+            "input_seconds": input_seconds,
+            "output_seconds": stats["duration_seconds"],
+            "gain_db": stats["gain_db"],
+            "elapsed_seconds": elapsed,
+            "realtime_factor": input_seconds / elapsed,
+            "peak_python_memory_bytes": peak_memory,
+            "input_bytes": os.path.getsize(narration),
+        }
+
+    print(f"[Audio Bench] {input_seconds:.0f}s of audio in {elapsed:.2f}s "
+          f"({result['realtime_factor']:.0f}x realtime), peak Python memory "
+          f"{peak_memory / 1024:.0f} KB for {result['input_bytes'] / 1024 / 1024:.1f} MB input")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"audio_postprocess_{int(time.time())}.json"
+    path.write_text(json.dumps(result, indent=2))
+    print(f"[Audio Bench] Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Synthetic input generators for benchmarks.
+
+Produces realistic RecordingSessions and Deepgram word lists of any size,
+deterministically from a seed, so runs are comparable over time.
+"""
+import random
+from typing import Any, Dict, List
+
+from app.models.dom_event_models import RecordingSession
+
+_VOCABULARY = [
+    "so", "here", "we", "open", "the", "dashboard", "and", "click", "on", "settings",
+    "um", "then", "you", "can", "see", "usage", "for", "last", "seven", "days",
+    "like", "this", "button", "exports", "report", "uh", "now", "let's", "filter", "by",
+]
+
+_ELEMENTS = [
+    {"tag": "BUTTON", "text": "Export", "testid": "export-button"},
+    {"tag": "BUTTON", "text": "Save changes", "testid": "save-button"},
+    {"tag": "A", "text": "Settings", "testid": "nav-settings"},
+    {"tag": "DIV", "text": "UsageRate LimitBilling", "testid": None},
+    {"tag": "INPUT", "text": None, "testid": "search-input"},
+    {"tag": "INPUT", "text": None, "testid": "email-input"},
+]
+
+
+def generate_words(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Deepgram-style word list with realistic gaps, fillers and confidences."""
+    rng = random.Random(seed)
+    words = []
+    cursor = 0.0
+
+    for i in range(count):
+        word = rng.choice(_VOCABULARY)
+        duration = rng.uniform(0.12, 0.45)
+        confidence = rng.uniform(0.6, 1.0) if rng.random() < 0.1 else rng.uniform(0.9, 1.0)
+        punctuated = word.capitalize() if i == 0 else word
+        if rng.random() < 0.08:
+            punctuated += "."
+
+        words.append({
+            "word": word,
+            "start": round(cursor, 3),
+            "end": round(cursor + duration, 3),
+            "confidence": round(confidence, 3),
+            "punctuated_word": punctuated,
+        })
+
+        cursor += duration
+        # Mostly tight speech, with occasional natural and major pauses
+        roll = rng.random()
+        cursor += rng.uniform(1.0, 2.5) if roll < 0.03 else rng.uniform(0.35, 0.8) if roll < 0.15 else rng.uniform(0.0, 0.2)
+
+    return words
+
+
+def _target(rng: random.Random, element: Dict[str, Any]) -> Dict[str, Any]:
+    attributes = {"data-testid": element["testid"]} if element["testid"] else {}
+    if rng.random() < 0.3:
+        attributes["aria-label"] = (element["text"] or element["testid"] or "field").lower()
+    return {
+        "tag": element["tag"],
+        "id": None,
+        "classes": ["mat-mdc-button"] if element["tag"] == "BUTTON" else [],
+        "text": element["text"],
+        "selector": f"[data-testid='{element['testid']}']" if element["testid"] else element["tag"].lower(),
+        "bbox": {"x": rng.randint(0, 1400), "y": rng.randint(0, 650), "width": 120, "height": 36},
+        "attributes": attributes,
+        "type": "text" if element["tag"] == "INPUT" else None,
+        "name": None,
+    }
+
+
+def generate_session_dict(event_count: int, seed: int = 0, url: str = "https://app.example.com/usage") -> Dict[str, Any]:
+    """
+    RecordingSession payload (as JSON-ready dict) dominated by scrolls and
+    keystrokes, like real sessions.
+    """
+    rng = random.Random(seed)
+    metadata = {"url": url, "viewport": {"width": 1536, "height": 695}}
+    events = []
+    timestamp = 0
+    scroll_y = 0
+
+    while len(events) < event_count:
+        roll = rng.random()
+        timestamp += rng.randint(30, 400) if rng.random() > 0.05 else rng.randint(2100, 5000)
+
+        if roll < 0.4:
+            scroll_y += rng.randint(-200, 400)
+            scroll_y = max(0, scroll_y)
+            events.append({
+                "timestamp": timestamp,
+                "type": "scroll",
+                "metadata": {**metadata, "scrollPosition": {"x": 0, "y": scroll_y}},
+            })
+        elif roll < 0.75:
+            element = rng.choice(_ELEMENTS[4:])
+            target = _target(rng, element)
+            events.append({"timestamp": timestamp, "type": "focus", "target": target, "metadata": metadata})
+            typed = ""
+            for char in "analytics report"[: rng.randint(3, 16)]:
+                if len(events) >= event_count:
+                    break
+                typed += char
+                timestamp += rng.randint(40, 180)
+                events.append({"timestamp": timestamp, "type": "type", "target": target, "value": typed, "metadata": metadata})
+            if len(events) < event_count:
+                timestamp += rng.randint(100, 600)
+                events.append({"timestamp": timestamp, "type": "blur", "target": target, "metadata": metadata})
+        elif roll < 0.97:
+            element = rng.choice(_ELEMENTS[:4])
+            events.append({"timestamp": timestamp, "type": "click", "target": _target(rng, element), "metadata": metadata})
+        else:
+            events.append({"timestamp": timestamp, "type": "step_change", "metadata": metadata})
+
+    events = events[:event_count]
+    start_time = 1765146020748
+    return {
+        "sessionId": f"bench_session_{seed}_{event_count}",
+        "startTime": start_time,
+        "endTime": start_time + timestamp + 1000,
+        "url": url,
+        "viewport": {"width": 1536, "height": 695},
+        "events": events,
+    }
+
+
+def generate_session(event_count: int, seed: int = 0, url: str = "https://app.example.com/usage") -> RecordingSession:
+    """Validated RecordingSession with `event_count` events."""
+    return RecordingSession.model_validate(generate_session_dict(event_count, seed, url))
+
+
+def generate_deepgram_data(word_count: int, seed: int = 0) -> Dict[str, Any]:
+    """`deepgramData` payload: words plus the sentences/paragraphs built from them."""
+    words = generate_words(word_count, seed)
+
+    sentences = []
+    current: List[Dict[str, Any]] = []
+    for word in words:
+        current.append(word)
+        if word["punctuated_word"].endswith("."):
+            sentences.append(current)
+            current = []
+    if current:
+        sentences.append(current)
+
+    sentence_dicts = [
+        {
+            "text": " ".join(w["punctuated_word"] for w in sentence),
+            "start": sentence[0]["start"],
+            "end": sentence[-1]["end"],
+        }
+        for sentence in sentences
+    ]
+    paragraphs = [
+        {
+            "sentences": sentence_dicts[i:i + 5],
+            "start": sentence_dicts[i]["start"],
+            "end": sentence_dicts[min(i + 5, len(sentence_dicts)) - 1]["end"],
+            "num_words": sum(len(s) for s in sentences[i:i + 5]),
+        }
+        for i in range(0, len(sentence_dicts), 5)
+    ]
+
+    return {"words": words, "sentences": sentence_dicts, "paragraphs": paragraphs}
+
+
+def generate_audio_request_dict(
+    event_count: int,
+    word_count: int,
+    seed: int = 0,
+    recordings_path: str = ".cache/bench_recordings",
+) -> Dict[str, Any]:
+    """/audio-full-process payload (new format) as a JSON-ready dict."""
+    deepgram_data = generate_deepgram_data(word_count, seed)
+    session = generate_session_dict(event_count, seed)
+    return {
+        "text": " ".join(w["punctuated_word"] for w in deepgram_data["words"]),
+        "deepgramData": deepgram_data,
+        "session": session,
+        "recordingsPath": recordings_path,
+        "metadata": {"sessionId": session["sessionId"]},
+    }
@@ -0,0 +1,86 @@
+"""
+Benchmark for /process-recording conversion and serialization.
+
+Compares the model-based path (FrontendInstruction per event, response
+re-validated against ProcessRecordingResponse and JSON-encoded by FastAPI)
+with the bulk plain-dict path that serializes straight to JSON bytes.
+
+Usage:
+    python -m benchmarks.process_recording_bench --events 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.dom_event_models import ProcessRecordingResponse
+from app.services.dom_event_service import (
+    build_process_recording_payload,
+    extract_text_from_events,
+    group_events_by_step,
+    process_dom_events,
+    render_json,
+)
+from benchmarks.generators import generate_session
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def model_path(session) -> bytes:
+    response = process_dom_events(session)
+    response.metadata["extractedText"] = extract_text_from_events(session.events)
+    response.metadata["groupedSteps"] = group_events_by_step(session.events)
+    # What FastAPI does with response_model: validate, then encode
+    validated = ProcessRecordingResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def bulk_path(session) -> bytes:
+    return render_json(build_process_recording_payload(session))
+
+
+def measure(fn, session, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(session)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(session)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    session = generate_session(args.events)
+
+    results = {}
+    bodies = {}
+    for name, fn in (("model_path", model_path), ("bulk_path", bulk_path)):
+        seconds, peak, bodies[name] = measure(fn, session, args.repeat)
+        results[name] = {"seconds": seconds, "peak_memory_bytes": peak, "response_bytes": len(bodies[name])}
+        print(f"[Process Recording Bench] {name:>10}: {seconds * 1000:9.1f} ms, "
+              f"peak {peak / 1024 / 1024:7.1f} MB, body {len(bodies[name]) / 1024 / 1024:.1f} MB")
+
+    assert json.loads(bodies["model_path"]) == json.loads(bodies["bulk_path"]), "Outputs differ"
+    speedup = results["model_path"]["seconds"] / results["bulk_path"]["seconds"]
+    print(f"[Process Recording Bench] Bulk path is {speedup:.1f}x faster (identical output)")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = RESULTS_DIR / f"process_recording_{int(time.time())}.json"
+    output.write_text(json.dumps({"args": vars(args), "results": results, "speedup": speedup}, indent=2))
+    print(f"[Process Recording Bench] Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Offline replay of captured /audio-full-process traffic.
+
+Reruns the full pipeline (process_audio_request) for every record in one or
+more capture logs written in capture mode (CAPTURE_DIR), with Gemini and
+Deepgram answered from the captured responses. Nothing touches the
+network, so a code change can be timed and profiled against real
+production payloads.
+
+The shared cache, script templates and retrieval are disabled so each
+replay does the full work and builds the same prompts as in production.
+Reports per-request time, whether the script matches the captured one and
+how many upstream calls had to be matched by call order because the
+request differs from the captured one (changed prompt or TTS text, or
+input values masked at capture time). Results go to
+benchmarks/results/replay_<timestamp>.json.
+
+Usage:
+    python -m benchmarks.replay captures/captures-*.jsonl.gz
+    python -m benchmarks.replay captures/captures-1234.jsonl.gz --repeat 3 --profile replay.prof
+"""
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+
+from app.models.request_models import AudioProcessRequest
+from app.services import script_generation_service, shared_cache
+from app.services.audio_pipeline_service import process_audio_request
+from app.services.capture_service import ReplayMissError, read_captures, replay_upstream
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def replay_record(record: Dict[str, Any], blob_dir: Path, recordings_path: str) -> Dict[str, Any]:
+    """Replay one captured request. Returns timing and fidelity details."""
+    body = {**record["body"], "recordingsPath": recordings_path}
+    outcome: Dict[str, Any] = {"session_id": body.get("metadata", {}).get("sessionId")}
+
+    with replay_upstream(record.get("upstream", []), blob_dir) as recorder:
+        start = time.perf_counter()
+        try:
+            payload = AudioProcessRequest.model_validate(body)
+            result = process_audio_request(payload)
+            outcome["success"] = True
+        except ReplayMissError as e:
+            outcome.update(success=False, error=str(e))
+            result = None
+        except Exception as e:
+            outcome.update(success=False, error=f"{type(e).__name__}: {str(e)}")
+            result = None
+        outcome["seconds"] = time.perf_counter() - start
+
+    outcome["key_mismatches"] = recorder.key_mismatches
+    captured = record.get("response") or {}
+    if result is not None and captured.get("script") is not None:
+        outcome["script_matches_capture"] = result["script"] == captured["script"]
+    return outcome
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="Capture log files (.jsonl.gz)")
+    parser.add_argument("--blobs", help="Blob directory (default: <capture dir>/blobs)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--limit", type=int, help="Replay at most this many records")
+    parser.add_argument("--profile", help="Write cProfile stats for the whole replay to this file")
+    args = parser.parse_args()
+
+    records = []
+    for path in args.captures:
+        blob_dir = Path(args.blobs) if args.blobs else Path(path).parent / "blobs"
+        records.extend(
+            (record, blob_dir) for record in read_captures(path)
+            if record.get("path") == "/audio-full-process"
+        )
+    records = records[:args.limit] if args.limit else records
+    print(f"[Replay] {len(records)} captured request(s), {args.repeat} pass(es)")
+
+    profiler = cProfile.Profile() if args.profile else None
+    outcomes: List[Dict[str, Any]] = []
+
+    with tempfile.TemporaryDirectory(prefix="productai_replay_") as recordings_path, \
+            mock.patch.object(shared_cache, "SHARED_CACHE_ENABLED", False), \
+            mock.patch.object(script_generation_service, "SCRIPT_TEMPLATES_ENABLED", False), \
+            mock.patch.object(script_generation_service, "RETRIEVAL_ENABLED", False):
+        for _ in range(args.repeat):
+            for record, blob_dir in records:
+                # The pipeline logs every step; keep it out of the measurement
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    if profiler:
+                        profiler.enable()
+                    outcome = replay_record(record, blob_dir, recordings_path)
+                    if profiler:
+                        profiler.disable()
+                outcomes.append(outcome)
+
+    if profiler:
+        profiler.dump_stats(args.profile)
+        print(f"[Replay] Profile written to {args.profile} (open with snakeviz or pstats)")
+
+    succeeded = [o for o in outcomes if o["success"]]
+    seconds = [o["seconds"] for o in succeeded]
+    summary = {
+        "requests": len(outcomes),
+        "succeeded": len(succeeded),
+        "total_seconds": sum(seconds),
+        "median_seconds": statistics.median(seconds) if seconds else 0.0,
+        "max_seconds": max(seconds) if seconds else 0.0,
+        "key_mismatches": sum(o["key_mismatches"] for o in outcomes),
+        "script_mismatches": sum(1 for o in outcomes if o.get("script_matches_capture") is False),
+    }
+
+    print(f"[Replay] {summary['succeeded']}/{summary['requests']} succeeded, "
+          f"median {summary['median_seconds'] * 1000:.1f} ms, max {summary['max_seconds'] * 1000:.1f} ms, "
+          f"total {summary['total_seconds']:.2f}s")
+    if summary["key_mismatches"]:
+        print(f"[Replay] {summary['key_mismatches']} upstream call(s) matched by call order instead of request "
+              f"(prompt or TTS text differs from the capture; expected for prompts that include masked input values)")
+    if summary["script_mismatches"]:
+        print(f"[Replay] ⚠️  {summary['script_mismatches']} script(s) differ from the captured output")
+    for outcome in outcomes:
+        if not outcome["success"]:
+            print(f"[Replay] ❌ {outcome['session_id']}: {outcome['error']}")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = RESULTS_DIR / f"replay_{int(time.time())}.json"
+    output.write_text(json.dumps({"summary": summary, "requests": outcomes}, indent=2))
+    print(f"[Replay] Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
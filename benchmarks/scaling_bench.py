@@ -0,0 +1,86 @@
+"""
+Multi-process scaling benchmark for the CPU-bound pipeline stages.
+
+Runs timing analysis, RAG context building and DOM event conversion on
+synthetic inputs across 1..N worker processes (the same model as
+`python -m app.serve`) and reports throughput and scaling efficiency.
+
+Usage:
+    python -m benchmarks.scaling_bench --events 2000 --words 2000 --units 64
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+_state = {}
+
+
+def _init_worker(events: int, words: int) -> None:
+    # The services log heavily to stdout; keep it out of the measurement
+    sys.stdout = open(os.devnull, "w")
+
+    from benchmarks.generators import generate_session, generate_words
+
+    _state["session"] = generate_session(events)
+    _state["words"] = generate_words(words)
+
+
+def _run_unit(_: int) -> None:
+    from app.services.dom_event_service import process_dom_events
+    from app.services.rag_service import build_rag_context_from_events
+    from app.services.script_generation_service import analyze_word_timings
+
+    analyze_word_timings(_state["words"])
+    build_rag_context_from_events(_state["session"])
+    process_dom_events(_state["session"])
+
+
+def measure(processes: int, units: int, events: int, words: int) -> float:
+    """Return work units per second with the given number of processes."""
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(events, words)) as pool:
+        # Warm every worker before timing
+        pool.map(_run_unit, range(processes))
+        start = time.perf_counter()
+        pool.map(_run_unit, range(units), chunksize=1)
+        elapsed = time.perf_counter() - start
+    return units / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=2000)
+    parser.add_argument("--units", type=int, default=64)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    counts = []
+    n = 1
+    while n < args.max_processes:
+        counts.append(n)
+        n *= 2
+    counts.append(args.max_processes)
+
+    results = []
+    baseline = None
+    for processes in counts:
+        throughput = measure(processes, args.units, args.events, args.words)
+        baseline = baseline or throughput
+        efficiency = throughput / (baseline * processes)
+        results.append({"processes": processes, "units_per_second": throughput, "efficiency": efficiency})
+        print(f"[Scaling] {processes:>3} process(es): {throughput:8.2f} units/s  (efficiency {efficiency:.0%})")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = RESULTS_DIR / f"scaling_{int(time.time())}.json"
+    output.write_text(json.dumps({"args": vars(args), "cpu_count": os.cpu_count(), "results": results}, indent=2))
+    print(f"[Scaling] Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
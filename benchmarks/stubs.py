@@ -0,0 +1,121 @@
+"""
+Stubbed Gemini and Deepgram backends for benchmarks.
+
+`stub_backends()` swaps the Gemini models and the HTTP client used for TTS
+with in-process fakes that sleep for a configurable latency, so the whole
+pipeline (including /audio-full-process) can be measured without network
+access or API keys. The shared cache and script templates are disabled by
+default so every run does the full work.
+"""
+import contextlib
+import time
+from typing import Iterator, Optional
+from unittest import mock
+
+from app.services import (
+    elevenlabs_service,
+    gemini_service,
+    script_generation_service,
+    shared_cache,
+    synced_narration_service,
+)
+
+STUB_SENTENCES = [
+    "Here we open the dashboard and click Settings.",
+    "Then you can see usage for the last seven days.",
+    "This button exports the report.",
+    "Now let's filter by project.",
+]
+
+# 32 kbps MP3 and 24 kHz 16-bit PCM
+_MP3_BYTES_PER_SECOND = 4000
+_PCM_BYTES_PER_SECOND = 48000
+_CHARS_PER_SECOND = 15
+
+
+class StubGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGeminiModel:
+    """Stands in for genai.GenerativeModel; returns a canned script."""
+
+    def __init__(self, latency: float = 0.0, sentences: int = 8):
+        self.latency = latency
+        self.sentences = sentences
+        self.calls = 0
+
+    def generate_content(self, prompt, *args, **kwargs) -> StubGeminiResponse:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        text = " ".join(STUB_SENTENCES[i % len(STUB_SENTENCES)] for i in range(self.sentences))
+        if "Step 1:" in str(prompt):
+            text = "\n".join(f"Step {i + 1}: {s}" for i, s in enumerate(STUB_SENTENCES))
+        return StubGeminiResponse(text)
+
+
+class StubTTSResponse:
+    """The subset of requests.Response the TTS service uses."""
+
+    ok = True
+    status_code = 200
+    text = ""
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def iter_content(self, chunk_size: int = 65536) -> Iterator[bytes]:
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+
+class StubTTSClient:
+    """Stands in for the pooled `http_session` inside elevenlabs_service."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def post(self, url, headers=None, params=None, json=None, **kwargs) -> StubTTSResponse:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        text = (json or {}).get("text", "")
+        seconds = max(len(text) / _CHARS_PER_SECOND, 0.5)
+        if (params or {}).get("encoding") == "linear16":
+            # Quiet tone rather than digital silence, so trimming keeps it
+            size = int(seconds * _PCM_BYTES_PER_SECOND) // 2 * 2
+            return StubTTSResponse((b"\x00\x04\x00\xfc" * (size // 4 + 1))[:size])
+        return StubTTSResponse(b"\xff\xf3" * int(seconds * _MP3_BYTES_PER_SECOND / 2))
+
+
+@contextlib.contextmanager
+def stub_backends(
+    gemini_latency: float = 0.0,
+    tts_latency: float = 0.0,
+    disable_caches: bool = True,
+    gemini: Optional[StubGeminiModel] = None,
+    tts: Optional[StubTTSClient] = None,
+):
+    """
+    Patch Gemini and Deepgram with stubs for the duration of the block.
+
+    Yields:
+        (gemini stub, tts stub), for call counts
+    """
+    gemini = gemini or StubGeminiModel(gemini_latency)
+    tts = tts or StubTTSClient(tts_latency)
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(script_generation_service, "model", gemini))
+        stack.enter_context(mock.patch.object(synced_narration_service, "model", gemini))
+        stack.enter_context(mock.patch.object(gemini_service, "model", gemini))
+        stack.enter_context(mock.patch.object(elevenlabs_service, "http_session", tts))
+        if disable_caches:
+            stack.enter_context(mock.patch.object(shared_cache, "SHARED_CACHE_ENABLED", False))
+            stack.enter_context(mock.patch.object(script_generation_service, "SCRIPT_TEMPLATES_ENABLED", False))
+            stack.enter_context(mock.patch.object(script_generation_service, "RETRIEVAL_ENABLED", False))
+        yield gemini, tts
@@ -0,0 +1,207 @@
+"""
+Benchmark suite for the request pipeline.
+
+Runs each benchmark at every requested input size (events and words), on
+synthetic inputs from `benchmarks.generators`, with Gemini and Deepgram
+replaced by latency-injectable stubs:
+
+- analyze_word_timings       Deepgram word timing analysis
+- build_rag_context          RAG context from DOM events
+- process_dom_events         frontend instruction conversion
+- request_parsing            AudioProcessRequest validation from JSON bytes
+- audio_full_process         POST /audio-full-process end to end (stubbed backends)
+
+Results (best/median/mean seconds, throughput, optional peak memory) are
+written to benchmarks/results/suite_<timestamp>.json together with the git
+commit, and can be compared against an earlier run with --compare.
+
+Usage:
+    python -m benchmarks.suite --sizes 1000,10000,100000
+    python -m benchmarks.suite --only request_parsing --sizes 1000000 --repeat 1
+    python -m benchmarks.suite --gemini-latency 0.8 --tts-latency 0.4 --compare benchmarks/results/suite_1700000000.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.generators import generate_audio_request_dict, generate_session, generate_words
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+BENCHMARKS = [
+    "analyze_word_timings",
+    "build_rag_context",
+    "process_dom_events",
+    "request_parsing",
+    "audio_full_process",
+]
+
+
+def _prepare(name: str, size: int, args: argparse.Namespace, recordings_path: str) -> Callable[[], Any]:
+    """Build the inputs for one benchmark/size and return the callable to time."""
+    if name == "analyze_word_timings":
+        from app.services.script_generation_service import analyze_word_timings
+
+        words = generate_words(size, args.seed)
+        return lambda: analyze_word_timings(words)
+
+    if name == "build_rag_context":
+        from app.services.rag_service import build_rag_context_from_events
+
+        session = generate_session(size, args.seed)
+        return lambda: build_rag_context_from_events(session)
+
+    if name == "process_dom_events":
+        from app.services.dom_event_service import process_dom_events
+
+        session = generate_session(size, args.seed)
+        return lambda: process_dom_events(session)
+
+    if name == "request_parsing":
+        from app.models.request_models import AudioProcessRequest
+
+        body = json.dumps(generate_audio_request_dict(size, size, args.seed, recordings_path)).encode("utf-8")
+        return lambda: AudioProcessRequest.model_validate_json(body)
+
+    if name == "audio_full_process":
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        client = TestClient(app)
+        body = json.dumps(generate_audio_request_dict(size, size, args.seed, recordings_path)).encode("utf-8")
+
+        def run() -> None:
+            response = client.post(
+                "/audio-full-process", content=body, headers={"content-type": "application/json"}
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"/audio-full-process returned {response.status_code}: {response.text[:200]}")
+
+        return run
+
+    raise ValueError(f"Unknown benchmark: {name}")
+
+
+def _measure(fn: Callable[[], Any], repeat: int, memory: bool) -> Dict[str, Any]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        "best_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "mean_seconds": statistics.fmean(timings),
+        "repeat": repeat,
+    }
+
+    if memory:
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_memory_bytes"] = peak
+
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results: List[Dict[str, Any]], previous_path: str) -> None:
+    previous = {
+        (r["benchmark"], r["size"]): r
+        for r in json.loads(Path(previous_path).read_text())["results"]
+    }
+    print(f"\n[Bench Suite] Compared with {previous_path} (median, >1.0x = slower now):")
+    for result in results:
+        before = previous.get((result["benchmark"], result["size"]))
+        if not before:
+            continue
+        ratio = result["median_seconds"] / before["median_seconds"]
+        flag = "  ⚠️  regression" if ratio > 1.1 else ""
+        print(f"[Bench Suite]   {result['benchmark']:>22} @ {result['size']:>8}: {ratio:5.2f}x{flag}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated event/word counts")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="Comma-separated benchmark names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="Stub Gemini latency (seconds)")
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="Stub Deepgram latency (seconds)")
+    parser.add_argument("--memory", action="store_true", help="Also record peak traced memory (slower)")
+    parser.add_argument("--compare", help="Earlier suite result file to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    names = [n for n in args.only.split(",") if n]
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark '{name}' (choose from {', '.join(BENCHMARKS)})")
+
+    from benchmarks.stubs import stub_backends
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="productai_bench_") as recordings_path, \
+            stub_backends(args.gemini_latency, args.tts_latency):
+        for name in names:
+            for size in sizes:
+                # The services log every step; keep it out of the measurement
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    fn = _prepare(name, size, args, recordings_path)
+                    fn()  # warm-up
+                    result = _measure(fn, args.repeat, args.memory)
+
+                result = {"benchmark": name, "size": size, **result,
+                          "items_per_second": size / result["median_seconds"]}
+                results.append(result)
+
+                memory = (f", peak {result['peak_memory_bytes'] / 1024 / 1024:.1f} MB"
+                          if "peak_memory_bytes" in result else "")
+                print(f"[Bench Suite] {name:>22} @ {size:>8}: median {result['median_seconds'] * 1000:10.2f} ms, "
+                      f"{result['items_per_second']:>12,.0f} items/s{memory}")
+
+    if args.compare:
+        _compare(results, args.compare)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = RESULTS_DIR / f"suite_{int(time.time())}.json"
+    output.write_text(json.dumps({
+        "timestamp": time.time(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "gemini_latency": args.gemini_latency,
+            "tts_latency": args.tts_latency,
+        },
+        "results": results,
+    }, indent=2))
+    print(f"[Bench Suite] Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Local stand-ins for Gemini and Deepgram TTS, for load testing.
+
+Each fake speaks just enough of the real HTTP API for the services
+(Gemini REST `models/<model>:generateContent` and `:countTokens`, Deepgram
+`/v1/speak`) and behaves according to a profile:
+
+- latency_ms / latency_sigma   log-normal latency around the median
+- error_rate                   fraction of requests answered with a 500
+- throttle_rps                 requests above this rate get a 429
+- prefill_ms_per_1k_tokens     extra Gemini latency per 1k uncached prompt tokens
+
+The Gemini fake also keeps `cachedContents` (create/get/update/delete) so
+context caching can be exercised: tokens served from a cached content don't
+add prefill latency and are reported as `cachedContentTokenCount`. Like the
+real API, it refuses to cache fewer than --min-cache-tokens tokens.
+
+Point the service at them with:
+    GEMINI_API_ENDPOINT=http://127.0.0.1:9101
+    DEEPGRAM_SPEAK_URL=http://127.0.0.1:9102/v1/speak
+
+Usage:
+    python -m loadtest.fake_providers --profile realistic
+    python -m loadtest.fake_providers --profile throttled --gemini-port 9101 --deepgram-port 9102
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from typing import Any, Dict, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "instant": {
+        "gemini": {"latency_ms": 0, "latency_sigma": 0.0, "error_rate": 0.0, "throttle_rps": None,
+                   "prefill_ms_per_1k_tokens": 0},
+        "deepgram": {"latency_ms": 0, "latency_sigma": 0.0, "error_rate": 0.0, "throttle_rps": None},
+    },
+    "realistic": {
+        "gemini": {"latency_ms": 1200, "latency_sigma": 0.35, "error_rate": 0.005, "throttle_rps": None,
+                   "prefill_ms_per_1k_tokens": 30},
+        "deepgram": {"latency_ms": 400, "latency_sigma": 0.3, "error_rate": 0.002, "throttle_rps": None},
+    },
+    "flaky": {
+        "gemini": {"latency_ms": 1200, "latency_sigma": 0.6, "error_rate": 0.05, "throttle_rps": None,
+                   "prefill_ms_per_1k_tokens": 30},
+        "deepgram": {"latency_ms": 400, "latency_sigma": 0.5, "error_rate": 0.03, "throttle_rps": None},
+    },
+    "throttled": {
+        "gemini": {"latency_ms": 1200, "latency_sigma": 0.35, "error_rate": 0.0, "throttle_rps": 20,
+                   "prefill_ms_per_1k_tokens": 30},
+        "deepgram": {"latency_ms": 400, "latency_sigma": 0.3, "error_rate": 0.0, "throttle_rps": 50},
+    },
+}
+
+FAKE_SCRIPT = (
+    "Here we open the dashboard and click Settings. Then you can see usage for the last "
+    "seven days. This button exports the report. Now let's filter by project."
+)
+
+# 32 kbps MP3 and 24 kHz 16-bit PCM, at ~15 spoken characters per second
+_MP3_BYTES_PER_SECOND = 4000
+_PCM_BYTES_PER_SECOND = 48000
+_CHARS_PER_SECOND = 15
+# Rough tokenizer: ~4 characters per token
+_CHARS_PER_TOKEN = 4
+
+
+class ProviderBehavior:
+    """Latency, error and throttle behavior for one fake provider."""
+
+    def __init__(self, name: str, latency_ms: float, latency_sigma: float,
+                 error_rate: float, throttle_rps: Optional[float], prefill_ms_per_1k_tokens: float = 0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self.prefill_ms_per_1k_tokens = prefill_ms_per_1k_tokens
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        # Token bucket holding one second of burst
+        self._tokens = throttle_rps or 0.0
+        self._refilled_at = time.monotonic()
+
+    def _take_token(self) -> bool:
+        if not self.throttle_rps:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.throttle_rps, self._tokens + (now - self._refilled_at) * self.throttle_rps)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def admit(self, uncached_tokens: int = 0) -> Optional[Response]:
+        """Apply the profile. Returns an error response to send instead, if any."""
+        self.requests += 1
+
+        if not self._take_token():
+            self.throttled += 1
+            return JSONResponse({"error": {"code": 429, "message": "Resource exhausted (fake)"}},
+                                status_code=429, headers={"Retry-After": "1"})
+
+        if self.latency_ms:
+            jitter = math.exp(random.gauss(0, self.latency_sigma)) if self.latency_sigma else 1.0
+            await asyncio.sleep(self.latency_ms * jitter / 1000)
+        if self.prefill_ms_per_1k_tokens and uncached_tokens:
+            await asyncio.sleep(self.prefill_ms_per_1k_tokens * uncached_tokens / 1000 / 1000)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse({"error": {"code": 500, "message": "Internal error (fake)"}}, status_code=500)
+
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "errors": self.errors, "throttled": self.throttled}
+
+
+def _count_tokens(contents: Any) -> int:
+    """Approximate token count of a content, a list of contents or a string."""
+    if isinstance(contents, str):
+        return len(contents) // _CHARS_PER_TOKEN
+    if isinstance(contents, dict):
+        return sum(len(part.get("text", "")) for part in contents.get("parts", [])) // _CHARS_PER_TOKEN
+    return sum(_count_tokens(content) for content in contents or [])
+
+
+def _gemini_error(code: int, status: str, message: str) -> JSONResponse:
+    return JSONResponse({"error": {"code": code, "status": status, "message": message}}, status_code=code)
+
+
+def create_gemini_app(behavior: ProviderBehavior, min_cache_tokens: int = 1024) -> Starlette:
+    caches: Dict[str, Dict[str, Any]] = {}
+    usage = {"prompt_tokens": 0, "cached_tokens": 0, "caches_created": 0}
+
+    def cache_resource(name: str) -> Dict[str, Any]:
+        cache = caches[name]
+        expire = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(cache["expires_at"]))
+        return {"name": name, "model": cache["model"], "createTime": cache["created"],
+                "updateTime": expire, "expireTime": expire,
+                "usageMetadata": {"totalTokenCount": cache["tokens"]}}
+
+    def live_cache(name: str) -> Optional[Dict[str, Any]]:
+        cache = caches.get(name)
+        if cache is not None and cache["expires_at"] < time.time():
+            del caches[name]
+            cache = None
+        return cache
+
+    async def create_cache(request: Request) -> Response:
+        body = await request.json()
+        tokens = _count_tokens(body.get("systemInstruction")) + _count_tokens(body.get("contents"))
+        if tokens < min_cache_tokens:
+            return _gemini_error(400, "INVALID_ARGUMENT", f"Cached content is too small. total_token_count={tokens}, "
+                                                          f"min_total_token_count={min_cache_tokens}")
+        name = f"cachedContents/fake{usage['caches_created']}"
+        usage["caches_created"] += 1
+        caches[name] = {
+            "model": body.get("model"),
+            "tokens": tokens,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "expires_at": time.time() + float(str(body.get("ttl", "3600s")).rstrip("s")),
+        }
+        return JSONResponse(cache_resource(name))
+
+    async def cached_content(request: Request) -> Response:
+        name = f"cachedContents/{request.path_params['cache_id']}"
+        if live_cache(name) is None:
+            return _gemini_error(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied)")
+        if request.method == "DELETE":
+            del caches[name]
+            return JSONResponse({})
+        if request.method == "PATCH":
+            body = await request.json()
+            caches[name]["expires_at"] = time.time() + float(str(body.get("ttl", "3600s")).rstrip("s"))
+        return JSONResponse(cache_resource(name))
+
+    async def generate_content(request: Request) -> Response:
+        body = await request.json()
+        if request.path_params["path"].endswith(":countTokens"):
+            # Used by the service's startup warm-up
+            return JSONResponse({"totalTokens": _count_tokens(body.get("contents"))})
+        if not request.path_params["path"].endswith(":generateContent"):
+            return _gemini_error(404, "NOT_FOUND", "Not found")
+
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            cache = live_cache(body["cachedContent"])
+            if cache is None:
+                return _gemini_error(403, "PERMISSION_DENIED", "CachedContent not found (or permission denied)")
+            cached_tokens = cache["tokens"]
+
+        uncached_tokens = _count_tokens(body.get("systemInstruction")) + _count_tokens(body.get("contents"))
+        rejection = await behavior.admit(uncached_tokens)
+        if rejection is not None:
+            return rejection
+
+        prompt_tokens = cached_tokens + uncached_tokens
+        output_tokens = len(FAKE_SCRIPT) // _CHARS_PER_TOKEN
+        usage["prompt_tokens"] += prompt_tokens
+        usage["cached_tokens"] += cached_tokens
+        return JSONResponse({
+            "candidates": [{
+                "content": {"parts": [{"text": FAKE_SCRIPT}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "cachedContentTokenCount": cached_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+        })
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse({**behavior.stats(), **usage, "live_caches": len(caches)})
+
+    return Starlette(routes=[
+        Route("/_stats", stats),
+        Route("/{version}/cachedContents", create_cache, methods=["POST"]),
+        Route("/{version}/cachedContents/{cache_id}", cached_content, methods=["GET", "PATCH", "DELETE"]),
+        Route("/{path:path}", generate_content, methods=["POST"]),
+    ])
+
+
+def create_deepgram_app(behavior: ProviderBehavior) -> Starlette:
+    async def speak(request: Request) -> Response:
+        body = await request.json()
+        rejection = await behavior.admit()
+        if rejection is not None:
+            return rejection
+
+        seconds = max(len(body.get("text", "")) / _CHARS_PER_SECOND, 0.5)
+        if request.query_params.get("encoding") == "linear16":
+            size = int(seconds * _PCM_BYTES_PER_SECOND) // 4 * 4
+            return Response(b"\x00\x04\x00\xfc" * (size // 4), media_type="application/octet-stream")
+        return Response(b"\xff\xf3" * int(seconds * _MP3_BYTES_PER_SECOND / 2), media_type="audio/mpeg")
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse(behavior.stats())
+
+    return Starlette(routes=[
+        Route("/_stats", stats),
+        Route("/v1/speak", speak, methods=["POST"]),
+    ])
+
+
+async def serve(profile: Dict[str, Dict[str, Any]], host: str, gemini_port: int, deepgram_port: int,
+                min_cache_tokens: int = 1024) -> None:
+    gemini = ProviderBehavior("gemini", **profile["gemini"])
+    deepgram = ProviderBehavior("deepgram", **profile["deepgram"])
+
+    servers = [
+        uvicorn.Server(uvicorn.Config(create_gemini_app(gemini, min_cache_tokens), host=host, port=gemini_port,
+                                      log_level="warning", backlog=4096)),
+        uvicorn.Server(uvicorn.Config(create_deepgram_app(deepgram), host=host, port=deepgram_port,
+                                      log_level="warning", backlog=4096)),
+    ]
+    print(f"[Fake Providers] Gemini on http://{host}:{gemini_port}, Deepgram on http://{host}:{deepgram_port}/v1/speak")
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", default="realistic", choices=sorted(PROFILES))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--gemini-port", type=int, default=9101)
+    parser.add_argument("--deepgram-port", type=int, default=9102)
+    parser.add_argument("--gemini-latency-ms", type=float, help="Override the profile's Gemini median latency")
+    parser.add_argument("--deepgram-latency-ms", type=float, help="Override the profile's Deepgram median latency")
+    parser.add_argument("--error-rate", type=float, help="Override both providers' error rate")
+    parser.add_argument("--min-cache-tokens", type=int, default=1024,
+                        help="Smallest Gemini cached content accepted (the real API's minimum is 1024+)")
+    args = parser.parse_args()
+
+    profile = {name: dict(settings) for name, settings in PROFILES[args.profile].items()}
+    if args.gemini_latency_ms is not None:
+        profile["gemini"]["latency_ms"] = args.gemini_latency_ms
+    if args.deepgram_latency_ms is not None:
+        profile["deepgram"]["latency_ms"] = args.deepgram_latency_ms
+    if args.error_rate is not None:
+        profile["gemini"]["error_rate"] = profile["deepgram"]["error_rate"] = args.error_rate
+
+    asyncio.run(serve(profile, args.host, args.gemini_port, args.deepgram_port, args.min_cache_tokens))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Load test driver for /audio-full-process and /process-recording.
+
+Sends an open-loop request stream at a fixed arrival rate (requests are
+issued on schedule whether or not earlier ones finished, so queueing inside
+the service shows up as latency instead of being hidden by the client).
+
+Payloads come from a capture file, or are synthesized. A capture file is
+JSONL with one request per line, either {"path": ..., "body": ...} or a bare
+AudioProcessRequest / RecordingSession body; capture-mode logs (CAPTURE_DIR,
+.jsonl.gz) can be replayed directly. Captured bodies carry a placeholder
+recordingsPath, so pass --recordings-path for them.
+
+With --spawn, the fake providers and `python -m app.serve` are started
+locally (pointed at the fakes), so the whole run is self-contained.
+
+Reports p50/p95/p99/max latency and throughput per endpoint, error counts
+by status, and peak/mean RSS per server worker process. The report is
+saved under loadtest/results/.
+
+Usage:
+    python -m loadtest.run --spawn --workers 4 --rps 200 --duration 60
+    python -m loadtest.run --spawn --profile throttled --mix audio-full-process=1,process-recording=3
+    python -m loadtest.run --target http://localhost:8000 --server-pid 1234 --captures captures.jsonl
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+ENDPOINTS = {
+    "audio-full-process": "/audio-full-process",
+    "process-recording": "/process-recording",
+}
+
+
+def load_captures(path: str, recordings_path: Optional[str] = None) -> List[Tuple[str, bytes]]:
+    """Read (path, JSON body bytes) pairs from a capture file (.jsonl or .jsonl.gz)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    requests_ = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "path" in record and "body" in record:
+                body = record["body"]
+                if recordings_path and "recordingsPath" in body:
+                    body = {**body, "recordingsPath": recordings_path}
+                requests_.append((record["path"], json.dumps(body).encode("utf-8")))
+            elif "recordingsPath" in record:
+                requests_.append(("/audio-full-process", json.dumps(record).encode("utf-8")))
+            elif "events" in record:
+                requests_.append(("/process-recording", json.dumps(record).encode("utf-8")))
+    return requests_
+
+
+def synthesize_requests(mix: Dict[str, float], variants: int, events: int, words: int,
+                        recordings_path: str) -> List[Tuple[str, bytes]]:
+    """Synthetic payloads, `variants` distinct bodies per endpoint, repeated by mix weight."""
+    from benchmarks.generators import generate_audio_request_dict, generate_session_dict
+
+    requests_ = []
+    for name, weight in mix.items():
+        for seed in range(variants):
+            if name == "audio-full-process":
+                body = generate_audio_request_dict(events, words, seed, recordings_path)
+            else:
+                body = generate_session_dict(events, seed)
+            requests_.extend([(ENDPOINTS[name], json.dumps(body).encode("utf-8"))] * max(1, int(weight * 10)))
+    return requests_
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _descendant_pids(pid: int) -> List[int]:
+    """pid and all its descendants (Linux /proc)."""
+    pids = [pid]
+    for current in pids:
+        try:
+            children = Path(f"/proc/{current}/task/{current}/children").read_text().split()
+        except OSError:
+            continue
+        pids.extend(int(child) for child in children)
+    return pids
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def sample_memory(server_pid: int, samples: Dict[int, List[int]], interval: float = 0.5) -> None:
+    while True:
+        for pid in _descendant_pids(server_pid):
+            rss = _rss_bytes(pid)
+            if rss is not None:
+                samples[pid].append(rss)
+        await asyncio.sleep(interval)
+
+
+async def drive(target: str, requests_: List[Tuple[str, bytes]], rps: float, duration: float,
+                max_in_flight: int, poisson: bool, timeout: float) -> List[Dict[str, Any]]:
+    """Fire requests on an open-loop schedule and record the outcome of each."""
+    results: List[Dict[str, Any]] = []
+    in_flight = asyncio.Semaphore(max_in_flight)
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+
+        async def send(path: str, body: bytes, scheduled: float) -> None:
+            async with in_flight:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, content=body, headers={"content-type": "application/json"})
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                end = time.perf_counter()
+            results.append({
+                "path": path,
+                "status": status,
+                "latency": end - scheduled,
+                "service_time": end - start,
+                "finished": end,
+            })
+
+        tasks = []
+        begin = time.perf_counter()
+        next_at = begin
+        index = 0
+        while next_at - begin < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            path, body = requests_[index % len(requests_)]
+            tasks.append(asyncio.create_task(send(path, body, next_at)))
+            index += 1
+            next_at += random.expovariate(rps) if poisson else 1 / rps
+
+        await asyncio.gather(*tasks)
+
+    return results
+
+
+def build_report(results: List[Dict[str, Any]], wall_seconds: float,
+                 memory: Dict[int, List[int]], server_pid: Optional[int]) -> Dict[str, Any]:
+    by_path: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for result in results:
+        by_path[result["path"]].append(result)
+    by_path["all"] = results
+
+    endpoints = {}
+    for path, items in by_path.items():
+        ok = [r["latency"] for r in items if r["status"] == 200]
+        statuses: Dict[str, int] = defaultdict(int)
+        for r in items:
+            statuses[str(r["status"])] += 1
+        endpoints[path] = {
+            "requests": len(items),
+            "ok": len(ok),
+            "statuses": dict(statuses),
+            "throughput_rps": len(ok) / wall_seconds if wall_seconds else 0.0,
+            "latency_p50": _percentile(ok, 50),
+            "latency_p95": _percentile(ok, 95),
+            "latency_p99": _percentile(ok, 99),
+            "latency_max": max(ok) if ok else 0.0,
+            "latency_mean": statistics.fmean(ok) if ok else 0.0,
+        }
+
+    workers = {
+        str(pid): {
+            "role": "supervisor" if pid == server_pid else "worker",
+            "rss_peak_mb": max(values) / 1024 / 1024,
+            "rss_mean_mb": statistics.fmean(values) / 1024 / 1024,
+        }
+        for pid, values in memory.items() if values
+    }
+    return {"wall_seconds": wall_seconds, "endpoints": endpoints, "memory": workers}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n[Load Test] ===== RESULTS ({report['wall_seconds']:.1f}s) =====")
+    for path, stats in report["endpoints"].items():
+        print(f"[Load Test] {path:>20}: {stats['ok']}/{stats['requests']} ok, "
+              f"{stats['throughput_rps']:.1f} req/s, "
+              f"p50 {stats['latency_p50'] * 1000:.0f} ms, p95 {stats['latency_p95'] * 1000:.0f} ms, "
+              f"p99 {stats['latency_p99'] * 1000:.0f} ms, max {stats['latency_max'] * 1000:.0f} ms")
+        errors = {status: n for status, n in stats["statuses"].items() if status != "200"}
+        if errors:
+            print(f"[Load Test] {'':>20}  errors: {errors}")
+    for pid, stats in report["memory"].items():
+        print(f"[Load Test] {stats['role']:>10} pid {pid}: RSS peak {stats['rss_peak_mb']:.0f} MB, "
+              f"mean {stats['rss_mean_mb']:.0f} MB")
+
+
+async def wait_until_up(target: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=target) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/openapi.json")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"{target} did not come up within {timeout:.0f}s")
+
+
+def spawn_stack(args: argparse.Namespace, work_dir: str) -> List[subprocess.Popen]:
+    """Start the fake providers and the multi-worker service pointed at them."""
+    providers = subprocess.Popen([
+        sys.executable, "-m", "loadtest.fake_providers", "--profile", args.profile,
+        "--gemini-port", str(args.gemini_port), "--deepgram-port", str(args.deepgram_port),
+    ])
+
+    env = {
+        **os.environ,
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "loadtest"),
+        "DEEPGRAM_API_KEY": os.environ.get("DEEPGRAM_API_KEY", "loadtest"),
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{args.gemini_port}",
+        "DEEPGRAM_SPEAK_URL": f"http://127.0.0.1:{args.deepgram_port}/v1/speak",
+        "WEB_CONCURRENCY": str(args.workers),
+        "HOST": "127.0.0.1",
+        "PORT": str(args.port),
+        "SHARED_CACHE_PATH": os.path.join(work_dir, "cache.sqlite3"),
+        "UPLOAD_SPOOL_DIR": os.path.join(work_dir, "uploads"),
+    }
+    if not args.with_caches:
+        # Replayed payloads would otherwise be served from cache after the first hit
+        env["SHARED_CACHE_ENABLED"] = "0"
+        env["SCRIPT_TEMPLATES_ENABLED"] = "0"
+
+    server = subprocess.Popen([sys.executable, "-m", "app.serve"], env=env, stdout=subprocess.DEVNULL)
+    return [providers, server]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="productai_loadtest_") as work_dir:
+        recordings_path = args.recordings_path or os.path.join(work_dir, "recordings")
+        processes: List[subprocess.Popen] = []
+        server_pid = args.server_pid
+        target = args.target
+
+        if args.spawn:
+            processes = spawn_stack(args, work_dir)
+            server_pid = processes[1].pid
+            target = f"http://127.0.0.1:{args.port}"
+
+        try:
+            await wait_until_up(target)
+
+            if args.captures:
+                requests_ = load_captures(args.captures, recordings_path)
+            else:
+                requests_ = synthesize_requests(args.mix, args.variants, args.events, args.words, recordings_path)
+            random.Random(0).shuffle(requests_)
+            print(f"[Load Test] {len(requests_)} payload(s), {args.rps} req/s for {args.duration}s against {target}")
+
+            memory: Dict[int, List[int]] = defaultdict(list)
+            sampler = asyncio.create_task(sample_memory(server_pid, memory)) if server_pid else None
+
+            start = time.perf_counter()
+            results = await drive(target, requests_, args.rps, args.duration,
+                                  args.max_in_flight, args.poisson, args.timeout)
+            wall_seconds = time.perf_counter() - start
+
+            if sampler:
+                sampler.cancel()
+
+            report = build_report(results, wall_seconds, memory, server_pid)
+            report["config"] = {
+                "target": target, "rps": args.rps, "duration": args.duration,
+                "workers": args.workers if args.spawn else None,
+                "profile": args.profile if args.spawn else None,
+                "captures": args.captures, "poisson": args.poisson,
+            }
+            return report
+
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="Service URL (ignored with --spawn)")
+    parser.add_argument("--server-pid", type=int, help="Service supervisor pid, for per-worker memory")
+    parser.add_argument("--spawn", action="store_true", help="Start fake providers + app.serve locally")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profile", default="realistic", help="Fake provider profile (see loadtest.fake_providers)")
+    parser.add_argument("--gemini-port", type=int, default=9101)
+    parser.add_argument("--deepgram-port", type=int, default=9102)
+    parser.add_argument("--with-caches", action="store_true", help="Keep shared cache and script templates on")
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of a fixed interval")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--captures", help="JSONL capture file to replay")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("audio-full-process=1,process-recording=1"))
+    parser.add_argument("--variants", type=int, default=20, help="Distinct synthetic payloads per endpoint")
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--recordings-path", help="recordingsPath for synthetic requests")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = RESULTS_DIR / f"loadtest_{int(time.time())}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"[Load Test] Report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from app.models.dom_event_models import InteractionEvent
+from app.services.dom_event_service import STEP_THRESHOLD_MS
+from app.services.event_coalescing_service import coalesce_events
+from app.services.rag_service import _group_events_into_steps
+
+METADATA = {"url": "https://app.example.com", "viewport": {"width": 1280, "height": 720}}
+FIELD = {"tag": "INPUT", "selector": "#search", "bbox": {"x": 0, "y": 0, "width": 10, "height": 10}}
+
+
+def _event(timestamp, event_type, **fields):
+    return InteractionEvent(timestamp=timestamp, type=event_type, metadata=METADATA, **fields)
+
+
+def test_scrolls_close_together_are_merged():
+    events = [_event(0, "scroll"), _event(500, "scroll"), _event(1200, "scroll")]
+
+    coalesced, stats = coalesce_events(events)
+
+    assert len(coalesced) == 1
+    assert coalesced[0].endTimestamp == 1200
+    assert stats["scrolls_merged"] == 2
+
+
+def test_scrolls_across_a_gap_stay_separate_steps():
+    gap = STEP_THRESHOLD_MS + 28000
+    events = [_event(0, "scroll"), _event(300, "scroll"), _event(300 + gap, "scroll")]
+
+    coalesced, stats = coalesce_events(events)
+
+    assert [event.timestamp for event in coalesced] == [0, 300 + gap]
+    assert coalesced[0].endTimestamp == 300
+    assert stats["scrolls_merged"] == 1
+    assert len(_group_events_into_steps(coalesced)) == len(_group_events_into_steps(events)) == 2
+
+
+def test_keystrokes_across_a_gap_are_not_collapsed():
+    events = [
+        _event(0, "type", target=FIELD, value="h"),
+        _event(200, "type", target=FIELD, value="hi"),
+        _event(200 + STEP_THRESHOLD_MS + 1, "type", target=FIELD, value="hi there"),
+    ]
+
+    coalesced, stats = coalesce_events(events)
+
+    assert [event.value for event in coalesced] == ["hi", "hi there"]
+    assert stats["keystrokes_collapsed"] == 1
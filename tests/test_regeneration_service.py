@@ -0,0 +1,79 @@
+from app.models.dom_event_models import InteractionEvent, RecordingSession
+from app.models.request_models import NarrationRegenerationRequest, RecordingTrim
+from app.services import regeneration_service, synced_narration_service
+from app.services.regeneration_service import align_transcript, regenerate_narration
+
+METADATA = {"url": "https://app.example.com", "viewport": {"width": 1280, "height": 720}}
+BUTTON = {"tag": "BUTTON", "selector": "#next", "text": "Next", "bbox": {"x": 0, "y": 0, "width": 10, "height": 10}}
+
+
+def _word(text, start):
+    return {"word": text.lower(), "punctuated_word": text, "start": start, "end": start + 0.4}
+
+
+def _session():
+    # Two steps: a click at 0s and one at 10s
+    events = [
+        InteractionEvent(timestamp=timestamp, type="click", target=BUTTON, metadata=METADATA)
+        for timestamp in (0, 10000)
+    ]
+    return RecordingSession(
+        sessionId="regeneration-test", startTime=0, endTime=20000,
+        url=METADATA["url"], viewport=METADATA["viewport"], events=events,
+    )
+
+
+def _fake_narrate(step, transcript, total_steps):
+    return {**synced_narration_service._step_result(step, transcript), "narration": f"Narrated: {transcript}."}
+
+
+def test_align_transcript_keeps_timings_of_unchanged_words():
+    words = [_word("alpha", 1.0), _word("beta", 11.0), _word("gamma", 12.0)]
+
+    aligned = align_transcript("alpha BETTER gamma delta", words)
+
+    assert [word["punctuated_word"] for word in aligned] == ["alpha", "BETTER", "gamma", "delta"]
+    assert aligned[0] is words[0] and aligned[2] is words[2]
+    assert (aligned[1]["start"], aligned[1]["end"]) == (11.0, 11.4)
+    assert aligned[3]["start"] == aligned[3]["end"] == 12.4
+
+
+def test_transcript_edit_without_new_words_regenerates_the_edited_step(monkeypatch):
+    monkeypatch.setattr(synced_narration_service, "_narrate_step", _fake_narrate)
+    monkeypatch.setattr(regeneration_service, "remember_narration", lambda *args: None)
+    words = [_word("alpha", 1.0), _word("beta", 11.0), _word("gamma", 12.0)]
+    session = _session()
+    previous = synced_narration_service.generate_concurrent_step_narration("alpha beta gamma", session, words)
+
+    result = regenerate_narration(NarrationRegenerationRequest(
+        raw_text="alpha BETTER gamma", session=session, words=words, previous_steps=previous["steps"]
+    ))
+
+    assert [step["transcript"] for step in result["steps"]] == ["alpha", "BETTER gamma"]
+    assert result["steps"][0].get("reused") is True
+    assert result["regeneration"]["regenerated_steps"] == 1
+
+
+def test_session_ref_edit_aligns_onto_stored_words_and_stores_the_result(monkeypatch):
+    monkeypatch.setattr(synced_narration_service, "_narrate_step", _fake_narrate)
+    stored_words = [_word("alpha", 1.0), _word("beta", 11.0)]
+    previous = synced_narration_service.generate_concurrent_step_narration("alpha beta", _session(), stored_words)
+    monkeypatch.setattr(regeneration_service, "load_session", lambda session_id: {
+        "session": _session(), "transcript": "alpha beta",
+        "deepgram": {"words": stored_words}, "steps": previous["steps"],
+    })
+    remembered = []
+    monkeypatch.setattr(regeneration_service, "remember_narration", lambda *args: remembered.append(args))
+
+    result = regenerate_narration(NarrationRegenerationRequest(
+        sessionRef="regeneration-test", raw_text="alpha gamma", trim=RecordingTrim(start_ms=15000, end_ms=16000)
+    ))
+
+    assert [step["transcript"] for step in result["steps"]] == ["alpha", "gamma"]
+    assert result["regeneration"]["regenerated_steps"] == 1
+
+    raw_text, session, words, steps = remembered[0]
+    assert raw_text == "alpha gamma"
+    assert [(word["punctuated_word"], word["start"]) for word in words] == [("alpha", 1.0), ("gamma", 11.0)]
+    assert session.endTime == 19000
+    assert steps == result["steps"]
@@ -0,0 +1,28 @@
+from app.services import script_template_service
+from app.services.script_template_service import find_script_template, normalize_transcript
+
+TRANSCRIPT = " ".join(f"word{i}" for i in range(200))
+
+
+def _stored(monkeypatch, transcript):
+    monkeypatch.setattr(script_template_service, "flow_fingerprint", lambda session: "flow")
+    monkeypatch.setattr(script_template_service, "cache_get_json", lambda namespace, key: {
+        "script": "Stored script.", "transcript_words": normalize_transcript(transcript),
+    })
+
+
+def test_identical_transcript_reuses_the_script(monkeypatch):
+    _stored(monkeypatch, TRANSCRIPT)
+
+    template = find_script_template(None, f"Um, {TRANSCRIPT}.")
+
+    assert template["reuse"] == "exact"
+
+
+def test_small_edit_is_adapted_not_reused(monkeypatch):
+    _stored(monkeypatch, TRANSCRIPT)
+
+    template = find_script_template(None, TRANSCRIPT.replace("word100", "pricing"))
+
+    assert template["similarity"] > 0.99
+    assert template["reuse"] == "adapt"